@@ -0,0 +1,276 @@
+"""
+Benchmarks of the statement parsers on generated statements
+
+Every benchmark runs on statements from statement_generator at each
+requested size, reports rows/s and peak memory, and the whole run is
+written as JSON so two runs (before and after a change) can be compared:
+
+    python benchmarks/run_benchmarks.py --sizes 1k,100k --output before.json
+    python benchmarks/run_benchmarks.py --sizes 1k,100k --compare before.json
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'parsers'))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from otp_parser import OTPParser
+from otp_parser_enhanced import OTPPDFParser
+from parser_factory import ParserFactory
+from statement_generator import GeneratorConfig, generate_rows, generate_statement
+
+
+RESULTS_VERSION = 1
+DEFAULT_SIZES = '1k,100k'
+DEFAULT_REPEAT = 3
+SIZE_SUFFIXES = {'k': 1_000, 'm': 1_000_000}
+
+# Share of a statement already imported before merge_statements runs
+PARTIAL_SHARE = 0.6
+# Lines per page when the OTP PDF text is split into pages for parse_pages
+PDF_PAGE_LINES = 60
+
+
+@dataclass
+class BenchmarkResult:
+    """Measurements of one benchmark at one size"""
+    name: str
+    rows: int
+    seconds: float  # Best of the timed repeats
+    rows_per_second: float
+    peak_memory_bytes: Optional[int] = None  # tracemalloc peak of a separate run
+
+
+class Statements:
+    """Generated statements of one size, created on first use"""
+    
+    def __init__(self, directory: str, config: GeneratorConfig):
+        self.directory = directory
+        self.config = config
+        self._rows = None
+        self._parsed = None
+    
+    def path(self, statement_format: str) -> str:
+        if self._rows is None:
+            self._rows = generate_rows(self.config)
+        return str(generate_statement(self.directory, statement_format, self.config, self._rows))
+    
+    def transactions(self) -> list:
+        """Transactions of the OTP CSV statement, input of the list benchmarks"""
+        if self._parsed is None:
+            self._parsed = OTPParser().parse(self.path('otp_csv'))
+        return self._parsed
+
+
+def bench_parse_statement(statement_format: str) -> Callable[[Statements], Callable[[], Any]]:
+    def setup(statements: Statements) -> Callable[[], Any]:
+        path = statements.path(statement_format)
+        # A fresh factory per run, so detection isn't served from its cache
+        return lambda: ParserFactory().parse_statement(path)
+    return setup
+
+
+def bench_parse_pdf_content(statements: Statements) -> Callable[[], Any]:
+    with open(statements.path('otp_pdf_text'), encoding='utf-8') as f:
+        content = f.read()
+    return lambda: OTPPDFParser().parse_pdf_content(content)
+
+
+def bench_parse_pages(statements: Statements) -> Callable[[], Any]:
+    with open(statements.path('otp_pdf_text'), encoding='utf-8') as f:
+        lines = f.read().split('\n')
+    pages = ['\n'.join(lines[start:start + PDF_PAGE_LINES]) for start in range(0, len(lines), PDF_PAGE_LINES)]
+    # Default worker count: a process pool on multi-core machines, the statement is long
+    return lambda: list(OTPPDFParser().parse_pages(pages))
+
+
+def bench_detect_duplicates(statements: Statements) -> Callable[[], Any]:
+    transactions = statements.transactions()
+    parser = OTPParser()
+    return lambda: parser.detect_duplicates(transactions)
+
+
+def bench_merge_statements(statements: Statements) -> Callable[[], Any]:
+    # A partial statement merged with the full one covering it
+    transactions = statements.transactions()
+    partial = transactions[:int(len(transactions) * PARTIAL_SHARE)]
+    parser = OTPParser()
+    return lambda: parser.merge_statements(list(partial), transactions)
+
+
+def bench_get_summary(statements: Statements) -> Callable[[], Any]:
+    transactions = statements.transactions()
+    parser = OTPParser()
+    return lambda: parser.get_summary(transactions)
+
+
+# Benchmark name -> setup building the timed callable for a size
+BENCHMARKS: Dict[str, Callable[[Statements], Callable[[], Any]]] = {
+    'parse_statement[otp_csv]': bench_parse_statement('otp_csv'),
+    'parse_statement[otp_fixed_width]': bench_parse_statement('otp_fixed_width'),
+    'parse_statement[revolut_csv]': bench_parse_statement('revolut_csv'),
+    'parse_pdf_content': bench_parse_pdf_content,
+    'parse_pages': bench_parse_pages,
+    'detect_duplicates': bench_detect_duplicates,
+    'merge_statements': bench_merge_statements,
+    'get_summary': bench_get_summary,
+}
+
+
+def parse_size(text: str) -> int:
+    """Parse a row count like 1000, 1k or 1m"""
+    text = text.strip().lower()
+    multiplier = SIZE_SUFFIXES.get(text[-1:], 1)
+    number = text[:-1] if multiplier > 1 else text
+    return int(float(number) * multiplier)
+
+
+def measure(name: str, rows: int, run: Callable[[], Any], repeat: int, memory: bool) -> BenchmarkResult:
+    """Time run repeat times, then measure its peak memory in one more run"""
+    best = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        # The parsers print progress, which is not what is measured
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - start)
+    
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    
+    return BenchmarkResult(name, rows, best, rows / best if best else float('inf'), peak)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes: List[int], names: List[str], config: GeneratorConfig, data_dir: str,
+                   repeat: int = DEFAULT_REPEAT, memory: bool = True) -> Dict[str, Any]:
+    """
+    Run benchmarks at every size
+    
+    Args:
+        sizes: Statement sizes in rows
+        names: Benchmarks to run, keys of BENCHMARKS
+        config: Generator settings, rows is replaced by each size
+        data_dir: Where generated statements are kept between runs
+        repeat: Timed runs per benchmark, the best one is reported
+        memory: Whether to measure peak memory in an extra run
+    
+    Returns:
+        JSON-serializable results with the environment they were taken in
+    """
+    results = []
+    for rows in sizes:
+        statements = Statements(data_dir, GeneratorConfig(
+            rows, config.seed, config.duplicate_rate, config.repeat_merchant_rate, config.start))
+        for name in names:
+            result = measure(name, rows, BENCHMARKS[name](statements), repeat, memory)
+            print(format_result(result), flush=True)
+            results.append(asdict(result))
+    
+    return {
+        'version': RESULTS_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'generator': {
+            'seed': config.seed,
+            'duplicate_rate': config.duplicate_rate,
+            'repeat_merchant_rate': config.repeat_merchant_rate,
+        },
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def format_result(result: BenchmarkResult) -> str:
+    memory = f"{result.peak_memory_bytes / 2**20:9.1f} MiB" if result.peak_memory_bytes is not None else ''
+    return f"{result.name:<34} {result.rows:>9,} rows {result.rows_per_second:>13,.0f} rows/s {memory}"
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """Lines with the speedup of every benchmark present in both runs"""
+    before = {(result['name'], result['rows']): result for result in baseline['results']}
+    lines = []
+    for result in current['results']:
+        old = before.get((result['name'], result['rows']))
+        if old is None:
+            continue
+        speedup = result['rows_per_second'] / old['rows_per_second']
+        line = f"{result['name']:<34} {result['rows']:>9,} rows {speedup:6.2f}x"
+        if result['peak_memory_bytes'] and old['peak_memory_bytes']:
+            line += f" memory {result['peak_memory_bytes'] / old['peak_memory_bytes']:6.2f}x"
+        lines.append(line)
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    arg_parser = argparse.ArgumentParser(description='Benchmark the statement parsers')
+    arg_parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                            help='comma separated row counts, e.g. 1k,100k,1m')
+    arg_parser.add_argument('--benchmark', action='append', choices=sorted(BENCHMARKS),
+                            help='benchmark to run (repeatable), all by default')
+    arg_parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    arg_parser.add_argument('--no-memory', action='store_true', help='skip the peak memory run')
+    arg_parser.add_argument('--seed', type=int, default=GeneratorConfig.seed)
+    arg_parser.add_argument('--duplicate-rate', type=float, default=GeneratorConfig.duplicate_rate)
+    arg_parser.add_argument('--repeat-merchant-rate', type=float, default=GeneratorConfig.repeat_merchant_rate)
+    arg_parser.add_argument('--data-dir', default=str(Path(tempfile.gettempdir()) / 'expense-tracker-benchmarks'),
+                            help='where generated statements are cached')
+    arg_parser.add_argument('--output', help='write the results as JSON to this file')
+    arg_parser.add_argument('--compare', help='results JSON of an earlier run to compare with')
+    args = arg_parser.parse_args(argv)
+    
+    config = GeneratorConfig(seed=args.seed, duplicate_rate=args.duplicate_rate,
+                             repeat_merchant_rate=args.repeat_merchant_rate)
+    sizes = [parse_size(size) for size in args.sizes.split(',') if size.strip()]
+    names = args.benchmark or list(BENCHMARKS)
+    
+    results = run_benchmarks(sizes, names, config, args.data_dir, args.repeat, not args.no_memory)
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.compare} ({baseline.get('commit') or 'unknown commit'}):")
+        for line in compare(baseline, results):
+            print(line)
+    
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+"""Deterministic generator of synthetic bank statements for benchmarks"""
+import csv
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# Well-known merchants reused by the repeat-merchant share of card purchases
+MERCHANTS = [
+    'LIDL ÁRUHÁZ 0177', 'SPAR MARKET', 'TESCO HIPERMARKET', 'ALDI 0042', 'PENNY MARKET',
+    'AUCHAN SOROKSÁR', 'MOL TÖLTŐÁLLOMÁS', 'OMV 4521', 'GOOGLE *Google Play Ap', 'NETFLIX.COM',
+    'SPOTIFY', 'WOLT', 'FOODORA', 'BKK AUTOMATA', 'MÁV-START', 'DM DROGERIE', 'ROSSMANN 112',
+    'IKEA BUDAÖRS', 'OBI ÁRUHÁZ', 'MEDIA MARKT', 'COPYGURU - Nyugati', 'Revolut**9442*',
+    'CBA PRÍMA', 'COOP ABC', 'PATIKA PLUS', 'MCDONALDS 0123', 'BURGER KING', 'STARBUCKS',
+]
+CITIES = ['BUDAPEST', 'DEBRECEN', 'SZEGED', 'GYŐR', 'PÉCS', '']
+PAYERS = ['COGNIZANT TECHNOLOGY SOLUTIONS', 'KOVÁCS ANNA', 'NAV', 'MAGYAR ÁLLAMKINCSTÁR']
+CHARITIES = ['WWF Magyarország Alapítvány', 'Magyar Vöröskereszt', 'Kék Vonal Alapítvány']
+UNIQUE_PREFIXES = ['KISBOLT', 'PÉKSÉG', 'VIRÁGÜZLET', 'BÜFÉ', 'SZERVIZ', 'PIAC']
+
+# Shares of the transaction kinds, the rest are card purchases
+TRANSFER_SHARE = 0.05
+FEE_SHARE = 0.03
+DONATION_SHARE = 0.01
+EUR_SHARE = 0.1  # Card purchases made in EUR
+
+EUR_RATE = 400
+OPENING_BALANCE = 1_000_000
+
+# Statements longer than this many days get more rows per day instead
+MAX_SPAN_DAYS = 3650
+ROWS_PER_DAY = 8
+
+CARD_NUMBER = '8460878289'
+
+
+@dataclass
+class GeneratorConfig:
+    """Shape of a generated statement"""
+    rows: int = 1000
+    seed: int = 42
+    duplicate_rate: float = 0.02  # Rows repeating an earlier row of the same day
+    repeat_merchant_rate: float = 0.8  # Card purchases at a well-known merchant
+    start: datetime = datetime(2020, 1, 1)
+
+
+@dataclass
+class StatementRow:
+    """A generated transaction, rendered differently by each format"""
+    date: datetime
+    kind: str  # card, transfer, fee or donation
+    counterparty: str
+    amount: int  # HUF
+    balance: int
+    transaction_id: int
+    eur_amount: Optional[float] = None
+
+
+def generate_rows(config: GeneratorConfig) -> List[StatementRow]:
+    """
+    Generate the transactions of a statement
+    
+    The same config always gives the same rows. Rows are in date order,
+    spread over up to MAX_SPAN_DAYS days.
+    """
+    rng = random.Random(config.seed)
+    days = max(min(config.rows // ROWS_PER_DAY, MAX_SPAN_DAYS), 1)
+    rows: List[StatementRow] = []
+    balance = OPENING_BALANCE
+    unique = 0
+    
+    for index in range(config.rows):
+        date = config.start + timedelta(days=index * days // config.rows)
+        
+        # Repeat a row of the same day, like an overlapping statement export
+        same_day = [row for row in rows[-ROWS_PER_DAY:] if row.date == date]
+        if same_day and rng.random() < config.duplicate_rate:
+            source = rng.choice(same_day)
+            balance += source.amount
+            rows.append(StatementRow(date, source.kind, source.counterparty, source.amount,
+                                     balance, source.transaction_id, source.eur_amount))
+            continue
+        
+        roll = rng.random()
+        eur_amount = None
+        if roll < TRANSFER_SHARE:
+            kind, counterparty = 'transfer', rng.choice(PAYERS)
+            amount = rng.randint(50, 800) * 1000
+        elif roll < TRANSFER_SHARE + FEE_SHARE:
+            kind, counterparty = 'fee', 'OTPdirekt HAVIDÍJ*'
+            amount = -rng.choice([164, 295, 990])
+        elif roll < TRANSFER_SHARE + FEE_SHARE + DONATION_SHARE:
+            kind, counterparty = 'donation', rng.choice(CHARITIES)
+            amount = -rng.choice([1000, 2000, 5000])
+        else:
+            kind = 'card'
+            if rng.random() < config.repeat_merchant_rate:
+                counterparty = rng.choice(MERCHANTS)
+            else:
+                unique += 1
+                counterparty = f"{rng.choice(UNIQUE_PREFIXES)} {_letters(unique)} KFT"
+            amount = -int(rng.lognormvariate(8, 1.2)) - 1
+            if rng.random() < EUR_SHARE:
+                eur_amount = round(-amount / EUR_RATE, 2)
+        
+        balance += amount
+        rows.append(StatementRow(date, kind, counterparty, amount, balance,
+                                 rng.randrange(10 ** 15, 10 ** 16), eur_amount))
+    
+    return rows
+
+
+def _letters(number: int) -> str:
+    """Spell a number in letters, digits in a PDF description read as the amount"""
+    letters = ''
+    while True:
+        number, digit = divmod(number, 26)
+        letters = chr(ord('A') + digit) + letters
+        if not number:
+            return letters
+
+
+def _hu_grouped(value: int, separator: str = '.') -> str:
+    """Format an integer with Hungarian digit grouping: -2.714, 448.599"""
+    return f"{value:,}".replace(',', separator)
+
+
+def _describe(row: StatementRow, city: str = '') -> str:
+    if row.kind == 'card':
+        return f"Kártyás vásárlás: {row.counterparty} {city}".strip()
+    if row.kind == 'transfer':
+        return f"Átutalás: {row.counterparty}"
+    if row.kind == 'donation':
+        return f"Adomány: {row.counterparty}"
+    return 'OTPdirekt havidíj'
+
+
+def _city(row: StatementRow) -> str:
+    return CITIES[row.transaction_id % len(CITIES)]
+
+
+def write_otp_csv(rows: List[StatementRow], path: str) -> None:
+    """OTP CSV export: semicolon separated, Windows-1250"""
+    with open(path, 'w', encoding='windows-1250', newline='') as f:
+        writer = csv.writer(f, delimiter=';', lineterminator='\r\n')
+        writer.writerow(['Dátum', 'Közlemény', 'Összeg', 'Egyenleg'])
+        for row in rows:
+            writer.writerow([f"{row.date:%Y.%m.%d}", _describe(row, _city(row)), row.amount, row.balance])
+
+
+def write_otp_fixed_width(rows: List[StatementRow], path: str) -> None:
+    """OTP text export: columns padded with spaces, amounts grouped with spaces"""
+    with open(path, 'w', encoding='windows-1250', newline='') as f:
+        f.write('OTP Bank számlatörténet\r\n')
+        f.write(f"{'Dátum':<12}{'Közlemény':<52}{'Összeg':>14}{'Egyenleg':>16}\r\n")
+        for row in rows:
+            description = _describe(row, _city(row))[:50]
+            f.write(f"{row.date:%Y.%m.%d}  {description:<50}  "
+                    f"{_hu_grouped(row.amount, ' '):>12}  {_hu_grouped(row.balance, ' '):>14}\r\n")
+
+
+def otp_pdf_text(rows: List[StatementRow]) -> str:
+    """Text of an OTP PDF statement, as a PDF text extractor returns it"""
+    lines = ['FORGALMAK', 'KÖNYVELÉS/ÉRTÉKNAP MEGNEVEZÉS ÖSSZEG']
+    if rows:
+        opening = rows[0].balance - rows[0].amount
+        lines.append(f"{rows[0].date:%y.%m.%d} NYITÓ EGYENLEG {_hu_grouped(opening)}")
+    
+    for row in rows:
+        day = f"{row.date:%y.%m.%d}"
+        amount = _hu_grouped(row.amount)
+        if row.kind == 'card':
+            purchased = f"{row.date - timedelta(days=row.transaction_id % 4):%y.%m.%d}"
+            lines.append(f"{day} {day} VÁSÁRLÁS KÁRTYÁVAL, {CARD_NUMBER}, {row.transaction_id}, "
+                         f"Tranzakció: {purchased}, {row.counterparty} -GOOGLE {amount}")
+            if row.eur_amount is not None:
+                eur = f"{row.eur_amount:.2f}".replace('.', ',')
+                lines.append(f"{eur}EUR {EUR_RATE}, {amount}")
+        elif row.kind == 'transfer':
+            lines.append(f"{day} {day} NAPKÖZBENI ÁTUTALÁS, F.3504, 13100007-02511420-00043484, "
+                         f"{row.counterparty}, {amount}")
+            lines.append(f"{row.date:%y/%m}Munkaber, 131000070251142000043484,")
+        elif row.kind == 'donation':
+            lines.append(f"{day} {day} ADOMÁNY, F.9004, 10800007-20000000-11822002, "
+                         f"{row.counterparty} {amount}")
+        else:
+            lines.append(f"{day} {day} {row.counterparty} {amount}")
+    
+    if rows:
+        lines.append(f"ZÁRÓ EGYENLEG {_hu_grouped(rows[-1].balance)}")
+    return '\n'.join(lines) + '\n'
+
+
+def write_otp_pdf_text(rows: List[StatementRow], path: str) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(otp_pdf_text(rows))
+
+
+def write_revolut_csv(rows: List[StatementRow], path: str) -> None:
+    """Revolut CSV export with EUR amounts"""
+    types = {'card': 'CARD_PAYMENT', 'transfer': 'TOPUP', 'fee': 'FEE', 'donation': 'TRANSFER'}
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(['Type', 'Product', 'Started Date', 'Completed Date', 'Description',
+                         'Amount', 'Fee', 'Currency', 'State', 'Balance'])
+        for row in rows:
+            started = row.date + timedelta(seconds=row.transaction_id % 86000)
+            completed = started + timedelta(seconds=row.transaction_id % 300)
+            writer.writerow([
+                types[row.kind], 'Current', f"{started:%Y-%m-%d %H:%M:%S}",
+                f"{completed:%Y-%m-%d %H:%M:%S}", row.counterparty,
+                f"{row.amount / EUR_RATE:.2f}", '0.00', 'EUR', 'COMPLETED',
+                f"{row.balance / EUR_RATE:.2f}",
+            ])
+
+
+# Format name -> (file suffix, writer)
+FORMATS: Dict[str, Tuple[str, Callable[[List[StatementRow], str], None]]] = {
+    'otp_csv': ('.csv', write_otp_csv),
+    'otp_fixed_width': ('.txt', write_otp_fixed_width),
+    'otp_pdf_text': ('.pdf.txt', write_otp_pdf_text),
+    'revolut_csv': ('.csv', write_revolut_csv),
+}
+
+
+def statement_path(directory: str, statement_format: str, config: GeneratorConfig) -> Path:
+    """File name encoding everything the content depends on"""
+    suffix = FORMATS[statement_format][0]
+    name = (f"{statement_format}-{config.rows}-s{config.seed}"
+            f"-d{config.duplicate_rate:g}-m{config.repeat_merchant_rate:g}{suffix}")
+    return Path(directory) / name
+
+
+def generate_statement(directory: str, statement_format: str, config: GeneratorConfig,
+                       rows: Optional[List[StatementRow]] = None) -> Path:
+    """
+    Write a statement file unless an identical one already exists
+    
+    Args:
+        directory: Where to write the file
+        statement_format: One of FORMATS
+        config: Generator settings
+        rows: Already generated rows for config, to share between formats
+    
+    Returns:
+        Path of the statement
+    """
+    path = statement_path(directory, statement_format, config)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        FORMATS[statement_format][1](rows if rows is not None else generate_rows(config), str(tmp_path))
+        tmp_path.replace(path)
+    return path
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('directory')
+    arg_parser.add_argument('--rows', type=int, default=1000)
+    arg_parser.add_argument('--seed', type=int, default=42)
+    arg_parser.add_argument('--duplicate-rate', type=float, default=0.02)
+    arg_parser.add_argument('--repeat-merchant-rate', type=float, default=0.8)
+    arg_parser.add_argument('--format', choices=sorted(FORMATS), action='append')
+    args = arg_parser.parse_args()
+    
+    config = GeneratorConfig(args.rows, args.seed, args.duplicate_rate, args.repeat_merchant_rate)
+    rows = generate_rows(config)
+    for statement_format in args.format or sorted(FORMATS):
+        print(generate_statement(args.directory, statement_format, config, rows))
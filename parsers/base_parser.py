@@ -1,13 +1,61 @@
 """Base parser class for bank statements"""
 from abc import ABC, abstractmethod
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
 from dataclasses import dataclass
+from bisect import bisect_right
+from pathlib import Path
 import hashlib
+import heapq
+import logging
 import re
 
+from description_fingerprint import DescriptionFingerprints, FingerprintGroups, description_similarity
+from diagnostics import Diagnostic, Diagnostics
+from format_probe import FormatProbe, probe_file
+from instrumentation import NULL_STATS
+from merchant_normalizer import MerchantNormalizer
 
-@dataclass
+
+logger = logging.getLogger(__name__)
+
+MERCHANT_CACHE_SIZE = 8192
+
+# Fuzzy duplicates need a description similarity above this
+SIMILARITY_THRESHOLD = 0.8
+
+# Common patterns for merchant extraction
+MERCHANT_PATTERNS = [
+    re.compile(r'^([A-Z][A-Z0-9\s]+?)(?:\s+\d+|\s+[A-Z]{2,})'),  # MERCHANT_NAME followed by numbers or codes
+    re.compile(r'^(.+?)\s+(?:BUDAPEST|BP\.|DEBRECEN|SZEGED)'),  # Merchant followed by city
+    re.compile(r'^(.+?)\s+\d{4}\.\d{2}\.\d{2}'),  # Merchant followed by date
+]
+
+
+def _first_words(text: str, description: str) -> Optional[str]:
+    """Return first few words as fallback"""
+    words = description.split()[:3]
+    return " ".join(words) if words else None
+
+
+MERCHANT_NORMALIZER = MerchantNormalizer(
+    extractors=MERCHANT_PATTERNS,
+    finalize=_first_words,
+    cache_size=MERCHANT_CACHE_SIZE
+)
+
+
+def extract_merchant(description: str) -> Optional[str]:
+    """Extract merchant name from transaction description (memoized)"""
+    return MERCHANT_NORMALIZER.normalize(description)
+
+
+def merchant_cache_info():
+    """Return hit/miss counters of the merchant extraction cache"""
+    return MERCHANT_NORMALIZER.cache_info()
+
+
+@dataclass(slots=True)
 class Transaction:
     """Unified transaction model"""
     date: datetime
@@ -36,27 +84,22 @@ class Transaction:
         else:
             self.transaction_type = "expense"
             
-        # Extract potential merchant from description
+        # Merchant extraction is deferred until the merchant is first read,
+        # an unset slot makes the next access go through __getattr__
         if not self.merchant:
-            self.merchant = self._extract_merchant(self.description)
+            del self.merchant
+    
+    def __getattr__(self, name: str):
+        """Extract the merchant lazily on first access"""
+        if name != 'merchant':
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        
+        self.merchant = extract_merchant(self.description)
+        return self.merchant
     
     def _extract_merchant(self, description: str) -> Optional[str]:
         """Extract merchant name from transaction description"""
-        # Common patterns for merchant extraction
-        patterns = [
-            r'^([A-Z][A-Z0-9\s]+?)(?:\s+\d+|\s+[A-Z]{2,})',  # MERCHANT_NAME followed by numbers or codes
-            r'^(.+?)\s+(?:BUDAPEST|BP\.|DEBRECEN|SZEGED)',  # Merchant followed by city
-            r'^(.+?)\s+\d{4}\.\d{2}\.\d{2}',  # Merchant followed by date
-        ]
-        
-        for pattern in patterns:
-            match = re.match(pattern, description)
-            if match:
-                return match.group(1).strip()
-        
-        # Return first few words as fallback
-        words = description.split()[:3]
-        return " ".join(words) if words else None
+        return extract_merchant(description)
     
     def matches(self, other: 'Transaction', strict: bool = False) -> bool:
         """Check if this transaction matches another (for duplicate detection)"""
@@ -65,121 +108,317 @@ class Transaction:
             return self.hash == other.hash
         else:
             # Fuzzy matching for similar transactions
-            date_match = abs((self.date - other.date).days) <= 1
-            amount_match = abs(self.amount - other.amount) < 0.01
-            desc_similarity = self._description_similarity(other.description) > 0.8
-            return date_match and amount_match and desc_similarity
+            return (abs((self.date - other.date).days) <= 1
+                    and abs(self.amount - other.amount) < 0.01
+                    and self._description_similarity(other.description) > SIMILARITY_THRESHOLD)
     
     def _description_similarity(self, other_desc: str) -> float:
         """Calculate description similarity score"""
-        # Simple word-based similarity
-        words1 = set(self.description.lower().split())
-        words2 = set(other_desc.lower().split())
+        # Word-based Jaccard similarity on memoized token sets
+        return description_similarity(self.description, other_desc)
+
+
+class TransactionIndex:
+    """Blocking index that buckets transactions by day and amount in cents
+    
+    Fuzzy matching only ever succeeds for transactions at most a day apart
+    with amounts within a cent, so candidates are looked up in the
+    neighbouring (day, cents) buckets instead of scanning the whole list.
+    Buckets that grow past GROUP_BUCKET_SIZE (a recurring fee, many equal
+    card payments on one day) also group their rows by description
+    fingerprint, so the description check runs once per distinct
+    description and rows that can't match are never candidates.
+    ``Transaction.matches`` is still the final check. Fingerprints are
+    interned per index, so their word IDs go away with it.
+    """
+    
+    # timedelta.days floors, so a ``matches`` day difference of 1 can span
+    # two calendar days once times of day are involved
+    DAY_WINDOW = 2
+    CENT_WINDOW = 1
+    GROUP_BUCKET_SIZE = 32
+    
+    def __init__(self, transactions: Optional[Iterable[Transaction]] = None):
+        self.transactions: List[Transaction] = []
+        self.hashes = set()
+        self.buckets: Dict[Tuple[int, int], List[int]] = {}
+        # Rows grouped by description, for the buckets past GROUP_BUCKET_SIZE
+        self.groups: Dict[Tuple[int, int], FingerprintGroups] = {}
+        self.fingerprints = DescriptionFingerprints()
         
-        if not words1 or not words2:
-            return 0.0
-            
-        intersection = words1.intersection(words2)
-        union = words1.union(words2)
+        for trans in transactions or []:
+            self.add(trans)
+    
+    def __len__(self) -> int:
+        return len(self.transactions)
+    
+    @staticmethod
+    def block_key(trans: Transaction) -> Tuple[int, int]:
+        """Return the (day ordinal, amount in cents) bucket of a transaction"""
+        return trans.date.toordinal(), int(round(trans.amount * 100))
+    
+    def add(self, trans: Transaction) -> int:
+        """Add transaction to the index and return its position"""
+        position = len(self.transactions)
+        self.transactions.append(trans)
+        self.hashes.add(trans.hash)
+        key = self.block_key(trans)
+        bucket = self.buckets.setdefault(key, [])
+        bucket.append(position)
+        
+        groups = self.groups.get(key)
+        if groups is not None:
+            groups.add(self.fingerprints.tokens(trans.description), position)
+        elif len(bucket) > self.GROUP_BUCKET_SIZE:
+            groups = self.groups[key] = FingerprintGroups(SIMILARITY_THRESHOLD)
+            for indexed in bucket:
+                groups.add(self.fingerprints.tokens(self.transactions[indexed].description), indexed)
+        return position
+    
+    def candidates(self, trans: Transaction) -> List[int]:
+        """Return sorted positions of transactions that may fuzzy-match"""
+        day, cents = self.block_key(trans)
+        positions = []
+        tokens = None
+        
+        for day_offset in range(-self.DAY_WINDOW, self.DAY_WINDOW + 1):
+            for cent_offset in range(-self.CENT_WINDOW, self.CENT_WINDOW + 1):
+                key = (day + day_offset, cents + cent_offset)
+                groups = self.groups.get(key)
+                if groups is not None:
+                    if tokens is None:
+                        tokens = self.fingerprints.tokens(trans.description)
+                    for group in groups.similar(tokens):
+                        positions.extend(group)
+                    continue
+                
+                bucket = self.buckets.get(key)
+                if bucket:
+                    positions.extend(bucket)
+        
+        positions.sort()
+        return positions
+    
+    def find_match(self, trans: Transaction) -> Optional[Transaction]:
+        """Return an indexed transaction that duplicates trans, if any"""
+        for position in self.candidates(trans):
+            other = self.transactions[position]
+            if trans.matches(other, strict=False):
+                return other
         
-        return len(intersection) / len(union) if union else 0.0
+        return None
+    
+    def contains(self, trans: Transaction) -> bool:
+        """Check whether trans is already indexed, by hash or fuzzy match"""
+        return trans.hash in self.hashes or self.find_match(trans) is not None
+
+
+def _date_key(trans: Transaction) -> datetime:
+    return trans.date
+
+
+class TransactionHistory:
+    """Date-ordered transaction history with a reusable merge index
+    
+    The history keeps its transactions sorted by date together with a
+    TransactionIndex over them, so merging a new statement only costs
+    index lookups and sorted inserts for the new rows. Callers importing
+    statement after statement hold on to a history and pass it to
+    ``BaseParser.merge_statements`` to reuse the index; its transactions
+    must then only be changed through merge.
+    """
+    
+    def __init__(self, transactions: Optional[List[Transaction]] = None):
+        self.transactions: List[Transaction] = sorted(transactions or [], key=_date_key)
+        self.index = TransactionIndex(self.transactions)
+    
+    def merge(self, new: List[Transaction]) -> List[Transaction]:
+        """Merge new transactions in date order and return the ones added
+        
+        New transactions are only checked against the history as it was
+        before the merge, like the original list-based merge.
+        """
+        added = [trans for trans in new if not self.index.contains(trans)]
+        
+        for trans in added:
+            self.index.add(trans)
+        
+        self._insert_sorted(sorted(added, key=_date_key))
+        return added
+    
+    def _insert_sorted(self, added: List[Transaction]) -> None:
+        """Insert date-sorted transactions after existing ones with equal dates"""
+        if not added:
+            return
+        
+        transactions = self.transactions
+        
+        if not transactions or added[0].date >= transactions[-1].date:
+            transactions.extend(added)
+        elif len(added) * 8 > len(transactions):
+            # Large batch: a single linear merge beats repeated inserts
+            transactions[:] = list(heapq.merge(transactions, added, key=_date_key))
+        else:
+            position = 0
+            for trans in added:
+                position = bisect_right(transactions, trans.date, lo=position, key=_date_key)
+                transactions.insert(position, trans)
+                position += 1
 
 
 class BaseParser(ABC):
     """Abstract base class for bank statement parsers"""
     
+    # Header signature: accepted extensions and words, any of which has to
+    # appear in the first line of the file
+    FILE_EXTENSIONS: Tuple[str, ...] = ()
+    HEADER_SIGNATURES: Tuple[str, ...] = ()
+    HEADER_IGNORE_CASE = False
+    
+    # Bump when parsing output changes, invalidates cached parse results
+    # (2: amounts parsed by the format-sniffing AmountConverter)
+    VERSION = 2
+    
     def __init__(self, bank_name: str):
         self.bank_name = bank_name
         self.transactions: List[Transaction] = []
         self.metadata: Dict[str, Any] = {}
+        # Replaced by ParserFactory when instrumentation is enabled
+        self.stats = NULL_STATS
+        # Problems of the latest parse, passed to the hook while sampled
+        self.diagnostics = Diagnostics()
+        self.diagnostics_hook: Optional[Callable[[Diagnostic], None]] = None
         
     @abstractmethod
-    def parse(self, file_path: str, encoding: str = 'utf-8') -> List[Transaction]:
-        """Parse bank statement file and return list of transactions"""
+    def iter_parse(self, file_path: str, encoding: Optional[str] = None) -> Iterator[Transaction]:
+        """Yield transactions from bank statement file one at a time"""
         pass
     
-    @abstractmethod
+    def parse(self, file_path: str, encoding: Optional[str] = None) -> List[Transaction]:
+        """Parse bank statement file and return list of transactions"""
+        self.transactions = list(self.iter_parse(file_path, encoding))
+        return self.transactions
+    
+    def _start_diagnostics(self, file_path: str) -> Diagnostics:
+        """Start collecting the problems of a parse of file_path"""
+        self.diagnostics = Diagnostics(file_path, hook=self.diagnostics_hook)
+        return self.diagnostics
+    
+    def _decode_rows(self,
+                     rows: Iterable[Any],
+                     decode: Callable[[Any], Optional[Transaction]],
+                     stage: str = 'decode') -> Iterator[Transaction]:
+        """Decode rows into transactions, counting rows in and rejected rows of the stage"""
+        read = kept = 0
+        try:
+            for row in rows:
+                read += 1
+                transaction = decode(row)
+                if transaction:
+                    kept += 1
+                    yield transaction
+        finally:
+            self.stats.count(stage, rows_in=read, rejected=read - kept)
+    
     def validate_format(self, file_path: str) -> bool:
         """Validate if the file format is supported by this parser"""
-        pass
+        if Path(file_path).suffix.lower() not in self.FILE_EXTENSIONS:
+            return False
+        
+        try:
+            return self.matches_header(probe_file(file_path))
+        except OSError:
+            return False
+    
+    def matches_header(self, probe: FormatProbe) -> bool:
+        """Check the already-read start of a file against the header signature"""
+        if probe.suffix not in self.FILE_EXTENSIONS:
+            return False
+        
+        first_line = probe.first_line.lower() if self.HEADER_IGNORE_CASE else probe.first_line
+        return any(signature in first_line for signature in self.HEADER_SIGNATURES)
     
     def detect_duplicates(self, transactions: List[Transaction]) -> List[List[Transaction]]:
         """Detect duplicate transactions within the list"""
         duplicates = []
         seen = set()
         
-        for i, trans in enumerate(transactions):
-            if trans.hash not in seen:
-                seen.add(trans.hash)
-                # Check for fuzzy matches
-                fuzzy_matches = []
-                for j, other in enumerate(transactions[i+1:], i+1):
-                    if trans.matches(other, strict=False):
-                        fuzzy_matches.append(other)
-                
-                if fuzzy_matches:
-                    duplicates.append([trans] + fuzzy_matches)
+        with self.stats.stage('dedupe') as span:
+            index = TransactionIndex(transactions)
+            
+            for i, trans in enumerate(transactions):
+                if trans.hash not in seen:
+                    seen.add(trans.hash)
+                    # Check for fuzzy matches among later transactions in the same blocks
+                    fuzzy_matches = []
+                    for j in index.candidates(trans):
+                        if j > i and trans.matches(index.transactions[j], strict=False):
+                            fuzzy_matches.append(index.transactions[j])
+                    
+                    if fuzzy_matches:
+                        duplicates.append([trans] + fuzzy_matches)
+            
+            span.rows_in = len(transactions)
+            span.rows_out = len(duplicates)
         
         return duplicates
     
     def merge_statements(self, 
                         existing: List[Transaction], 
                         new: List[Transaction]) -> List[Transaction]:
-        """Merge new transactions with existing ones, avoiding duplicates"""
-        # Create hash set of existing transactions
-        existing_hashes = {t.hash for t in existing}
-        
-        # Add only non-duplicate transactions
-        merged = existing.copy()
-        added_count = 0
-        
-        for trans in new:
-            if trans.hash not in existing_hashes:
-                # Check for fuzzy matches
-                is_duplicate = False
-                for existing_trans in existing:
-                    if trans.matches(existing_trans, strict=False):
-                        is_duplicate = True
-                        break
-                
-                if not is_duplicate:
-                    merged.append(trans)
-                    added_count += 1
+        """Merge new transactions with existing ones, avoiding duplicates
         
-        # Sort by date
-        merged.sort(key=lambda t: t.date)
+        A list is left untouched and a new merged list returned. A
+        TransactionHistory as ``existing`` is merged into in place, reusing
+        its lookup index so repeated imports cost O(new * log existing),
+        and its transactions are returned. A TransactionStore is merged
+        into and returned.
+        """
+        # Imported here because the store builds on this module
+        from transaction_store import TransactionStore
         
-        print(f"Merged {added_count} new transactions (skipped {len(new) - added_count} duplicates)")
+        with self.stats.stage('merge') as span:
+            if isinstance(existing, (TransactionStore, TransactionHistory)):
+                history = existing
+            else:
+                history = TransactionHistory(existing)
+            added = history.merge(new)
+            span.rows_in = len(new)
+            span.rows_out = len(added)
+            span.rejected = len(new) - len(added)
         
-        return merged
+        logger.info("Merged %d new transactions (skipped %d duplicates)", len(added), len(new) - len(added))
+        
+        return history if isinstance(history, TransactionStore) else history.transactions
     
     def get_date_range(self, transactions: List[Transaction]) -> tuple:
         """Get the date range of transactions"""
+        from transaction_store import TransactionStore
+        
+        if isinstance(transactions, TransactionStore):
+            return transactions.bounds()
+        
         if not transactions:
             return None, None
         
         dates = [t.date for t in transactions]
         return min(dates), max(dates)
     
-    def get_summary(self, transactions: List[Transaction]) -> Dict[str, Any]:
-        """Get summary statistics of transactions"""
-        if not transactions:
+    def get_summary(self, transactions: List[Transaction], include_duplicates: bool = False) -> Dict[str, Any]:
+        """Get summary statistics of transactions
+        
+        Works on a list of transactions, a TransactionStore or a TransactionBatch. Duplicate
+        counting is opt-in since it needs the duplicate index.
+        """
+        # Imported here because the summary engine builds on this module
+        from summary_engine import summarize
+        
+        if not len(transactions):
             return {}
         
-        total_income = sum(t.amount for t in transactions if t.amount > 0)
-        total_expense = sum(t.amount for t in transactions if t.amount < 0)
-        
-        start_date, end_date = self.get_date_range(transactions)
-        
-        return {
-            'bank': self.bank_name,
-            'total_transactions': len(transactions),
-            'total_income': total_income,
-            'total_expense': abs(total_expense),
-            'net_flow': total_income + total_expense,
-            'date_range': {
-                'start': start_date.isoformat() if start_date else None,
-                'end': end_date.isoformat() if end_date else None
-            },
-            'duplicates_found': len(self.detect_duplicates(transactions))
-        }
\ No newline at end of file
+        summary = summarize(transactions, bank=self.bank_name)
+        
+        if include_duplicates:
+            summary['duplicates_found'] = len(self.detect_duplicates(transactions))
+        
+        return summary
@@ -0,0 +1,99 @@
+"""Byte-level line and field scanning for delimited statement text"""
+import codecs
+import re
+from functools import lru_cache
+from typing import Iterator, List, Optional
+
+# Universal newlines, like text mode open()
+LINE_END = re.compile(rb'\r\n?|\n')
+
+# Every whitespace character (str.isspace, re's \s) is below U+3001
+WHITESPACE = [chr(code) for code in range(0x3001) if chr(code).isspace()]
+
+UTF8_CODECS = ('utf-8', 'utf-8-sig')
+
+
+class ByteSyntax:
+    """
+    Whitespace handling of a text encoding, expressed on raw bytes
+    
+    Stripping and splitting on runs of whitespace give the same fields as
+    doing it on the decoded text, so lines never have to be decoded as a
+    whole, only the fields that are kept.
+    """
+    
+    def __init__(self, encoding: str, whitespace: bytes, multi_byte_whitespace: List[bytes], bom: bytes = b''):
+        self.encoding = encoding
+        self.bom = bom
+        self.whitespace = whitespace
+        
+        single = b'[' + b''.join(re.escape(bytes([byte])) for byte in whitespace) + b']'
+        if multi_byte_whitespace:
+            space = b'(?:' + b'|'.join([single] + [re.escape(seq) for seq in multi_byte_whitespace]) + b')'
+        else:
+            space = single
+        self.has_multi_byte_whitespace = bool(multi_byte_whitespace)
+        self._leading = re.compile(b'\\A' + space + b'+')
+        self._trailing = re.compile(space + b'+\\Z')
+        self._runs = re.compile(space + b'{2,}')
+    
+    def strip(self, line: bytes) -> bytes:
+        line = line.strip(self.whitespace)
+        if self.has_multi_byte_whitespace and line and (line[0] >= 0x80 or line[-1] >= 0x80):
+            line = self._trailing.sub(b'', self._leading.sub(b'', line))
+        return line
+    
+    def split_runs(self, line: bytes) -> List[bytes]:
+        """Split at runs of two or more whitespace characters"""
+        return self._runs.split(line)
+
+
+@lru_cache(maxsize=32)
+def byte_syntax(encoding: str) -> Optional[ByteSyntax]:
+    """
+    Return the byte syntax of an encoding
+    
+    Supported are UTF-8 and single-byte codecs that are ASCII compatible
+    (Windows-1250, ISO-8859-2...). Returns None for anything else, for
+    example UTF-16, which has to be scanned as decoded text.
+    """
+    name = codecs.lookup(encoding).name
+    
+    if name in UTF8_CODECS:
+        whitespace = bytes(ord(char) for char in WHITESPACE if ord(char) < 0x80)
+        multi_byte = [char.encode('utf-8') for char in WHITESPACE if ord(char) >= 0x80]
+        return ByteSyntax('utf-8', whitespace, multi_byte, codecs.BOM_UTF8 if name == 'utf-8-sig' else b'')
+    
+    whitespace = bytearray()
+    for byte in range(256):
+        try:
+            char = bytes([byte]).decode(name)
+        except UnicodeDecodeError:
+            continue
+        if len(char) != 1 or (byte < 0x80 and char != chr(byte)):
+            return None
+        if char.isspace():
+            whitespace.append(byte)
+    
+    # Multi-byte codecs (Shift JIS, GBK...) decode byte pairs to one character
+    try:
+        if len(b'\xc3\xa1'.decode(name)) != 2:
+            return None
+    except UnicodeDecodeError:
+        return None
+    
+    return ByteSyntax(name, bytes(whitespace), [])
+
+
+def iter_lines(data, start: int = 0) -> Iterator[bytes]:
+    """Yield the lines of a bytes-like buffer (mmap, bytes) without line ends"""
+    end = len(data)
+    position = start
+    search = LINE_END.search
+    while position < end:
+        match = search(data, position)
+        if match is None:
+            yield data[position:end]
+            return
+        yield data[position:match.start()]
+        position = match.end()
@@ -0,0 +1,243 @@
+"""Compiled multi-pattern category matcher for merchant names"""
+from collections import deque
+from dataclasses import dataclass
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+MATCH_CACHE_SIZE = 8192
+
+# User-defined category_rules outrank the built-in mapping
+BUILTIN_PRIORITY = 0
+USER_RULE_PRIORITY = 1
+
+
+@dataclass
+class CategoryRule:
+    """Substring rule that assigns a category to matching merchants"""
+    pattern: str
+    category: str
+    priority: int = BUILTIN_PRIORITY
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    
+    def applies_on(self, when: Optional[date]) -> bool:
+        """Check the rule's optional validity period"""
+        if when is None:
+            return True
+        if isinstance(when, datetime):
+            when = when.date()
+        if self.start_date and when < self.start_date:
+            return False
+        if self.end_date and when > self.end_date:
+            return False
+        return True
+
+
+class CategoryMatcher:
+    """
+    Aho-Corasick automaton over category rule patterns
+    
+    All patterns are matched case-insensitively as substrings in a single
+    scan of the merchant name, so the cost of a lookup depends on the
+    length of the name and not on the number of rules. When several rules
+    match, the one with the highest priority wins and ties go to the rule
+    added first. Results are memoized per merchant name.
+    """
+    
+    def __init__(self, rules: Iterable[Tuple[str, str]] = (), default: Optional[str] = None):
+        self.default = default
+        self.rules: List[CategoryRule] = []
+        self._compiled = False
+        self._has_dated_rules = False
+        
+        for pattern, category in rules:
+            self.add_rule(pattern, category)
+    
+    def add_rule(self, pattern: str, category: str, priority: int = BUILTIN_PRIORITY,
+                 start_date: Optional[date] = None, end_date: Optional[date] = None) -> None:
+        """Add a substring rule, the automaton is rebuilt on next use"""
+        if not pattern:
+            return
+        self.rules.append(CategoryRule(pattern, category, priority, start_date, end_date))
+        self._compiled = False
+    
+    def add_user_rules(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """
+        Add rows of the category_rules table
+        
+        Rows are ordered like the auto_categorize_transaction trigger
+        (priority DESC, created_at DESC) and rank above the built-in rules.
+        
+        Args:
+            rows: Dicts with merchant_pattern, category (or category_id) and
+                optional priority, created_at, start_date and end_date
+        """
+        rows = sorted(rows, key=lambda row: str(row.get('created_at') or ''), reverse=True)
+        rows.sort(key=lambda row: row.get('priority') or 0, reverse=True)
+        
+        for row in rows:
+            self.add_rule(
+                row['merchant_pattern'],
+                row.get('category') or row.get('category_id'),
+                priority=USER_RULE_PRIORITY,
+                start_date=_to_date(row.get('start_date')),
+                end_date=_to_date(row.get('end_date'))
+            )
+    
+    def compile(self) -> None:
+        """Build the automaton (goto, fail and output functions)"""
+        # Rank 0 is the rule that wins over every other rule
+        ranked = sorted(range(len(self.rules)), key=lambda i: (-self.rules[i].priority, i))
+        self._ranked_rules = [self.rules[i] for i in ranked]
+        self._has_dated_rules = any(rule.start_date or rule.end_date for rule in self.rules)
+        
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[int]] = [[]]
+        
+        for rank, rule in enumerate(self._ranked_rules):
+            state = 0
+            for char in rule.pattern.upper():
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append(rank)
+        
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                # States are visited breadth-first, so the fail state's
+                # outputs are already complete
+                outputs[next_state] = sorted(set(outputs[next_state]) | set(outputs[fail[next_state]]))
+        
+        self._goto = goto
+        self._fail = fail
+        self._outputs = outputs
+        self._best = [ranks[0] if ranks else None for ranks in outputs]
+        self._match_cached = lru_cache(maxsize=MATCH_CACHE_SIZE)(self._scan)
+        self._compiled = True
+    
+    def _scan(self, text: str) -> Tuple[int, ...]:
+        """Return the sorted ranks of all rules whose pattern occurs in text"""
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        best = self._best
+        found = set()
+        state = 0
+        
+        for char in text.upper():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if best[state] is not None:
+                found.update(outputs[state])
+                if not self._has_dated_rules and best[state] == 0:
+                    break
+        
+        return tuple(sorted(found))
+    
+    def match(self, text: Optional[str], when: Optional[date] = None) -> Optional[str]:
+        """
+        Return the category of the best rule matching text
+        
+        Args:
+            text: Merchant name or description
+            when: Transaction date, checked against dated user rules
+        
+        Returns:
+            Category of the winning rule or the default category
+        """
+        if not self._compiled:
+            self.compile()
+        if not text:
+            return self.default
+        
+        for rank in self._match_cached(text):
+            rule = self._ranked_rules[rank]
+            if not self._has_dated_rules or rule.applies_on(when):
+                return rule.category
+        
+        return self.default
+    
+    def categorize(self, transactions, overwrite: bool = False) -> List[Optional[str]]:
+        """
+        Assign categories to a batch of transactions
+        
+        For a TransactionBatch each distinct merchant is matched once and
+        the category column is rebuilt from the merchant codes. Other
+        sequences get their category attribute set per item, through
+        set_category for a TransactionStore so its zone maps stay valid.
+        
+        Args:
+            transactions: TransactionBatch, TransactionStore or sequence of transactions
+            overwrite: Replace categories that are already set
+        
+        Returns:
+            Category of every transaction, in order
+        """
+        if not self._compiled:
+            self.compile()
+        
+        # Columnar TransactionBatch: match each distinct merchant once
+        is_batch = hasattr(transactions, 'merchants') and hasattr(transactions, 'categories')
+        if is_batch and not self._has_dated_rules:
+            return self._categorize_batch(transactions, overwrite)
+        
+        set_category = getattr(transactions, 'set_category', None)
+        categories = []
+        for trans in transactions:
+            category = trans.category
+            if overwrite or not category:
+                category = self.match(trans.merchant or trans.description, getattr(trans, 'date', None))
+                if set_category is not None:
+                    set_category(trans, category)
+                else:
+                    trans.category = category
+            categories.append(category)
+        return categories
+    
+    def _categorize_batch(self, batch, overwrite: bool) -> List[Optional[str]]:
+        merchants = batch.merchants
+        descriptions = batch.descriptions
+        # Rows without a merchant are matched on their description, like in the list path
+        by_merchant = [self.match(merchant) if merchant else None for merchant in merchants.values]
+        by_description: Dict[int, Optional[str]] = {}
+        old_categories = batch.categories
+        # Fresh dictionary column of the same type as the batch uses
+        new_categories = type(old_categories)()
+        
+        for index, code in enumerate(merchants.codes):
+            category = old_categories[index]
+            if overwrite or not category:
+                if merchants.values[code]:
+                    category = by_merchant[code]
+                else:
+                    description = descriptions.codes[index]
+                    if description not in by_description:
+                        by_description[description] = self.match(descriptions.values[description])
+                    category = by_description[description]
+            new_categories.append(category)
+        
+        batch.categories = new_categories
+        return [new_categories[index] for index in range(len(new_categories))]
+
+
+def _to_date(value) -> Optional[date]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
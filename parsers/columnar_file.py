@@ -0,0 +1,316 @@
+"""Binary columnar file format for transaction histories"""
+import json
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from base_parser import Transaction
+from transaction_batch import DictionaryColumn, HashColumn, TransactionBatch
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, zlib is always available
+    zstandard = None
+
+
+MAGIC = b'TXNCOL01'
+# 2: raw_data rows stored as [key, value] pairs, keeping None (restkey) keys
+FORMAT_VERSION = 2
+ALIGNMENT = 8
+TRAILER = struct.Struct('<Q8s')  # Footer length, magic
+
+COMPRESSIONS = (None, 'zlib', 'zstd')
+
+ARRAY_COLUMNS = ('dates', 'times', 'amounts', 'balances')
+DICTIONARY_COLUMNS = ('descriptions', 'currencies', 'categories', 'merchants',
+                      'transaction_types', 'banks', 'account_numbers')
+
+
+def _compress(data: bytes, compression: Optional[str]) -> bytes:
+    if compression == 'zlib':
+        return zlib.compress(data, 6)
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor().compress(data)
+    return data
+
+
+def _decompress(data, compression: Optional[str], size: int) -> bytes:
+    if compression == 'zlib':
+        return zlib.decompress(data)
+    if compression == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(data, max_output_size=size)
+    return bytes(data)
+
+
+def _json_bytes(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _typecode(column: Union[array, memoryview]) -> str:
+    return column.typecode if isinstance(column, array) else column.format
+
+
+def _owned(column: Union[array, memoryview]) -> array:
+    """An array owning a copy of a mapped column, arrays are returned as is"""
+    if isinstance(column, array):
+        return column
+    owned = array(column.format)
+    owned.frombytes(column.cast('B'))
+    return owned
+
+
+def save_batch(batch: TransactionBatch, path: str, compression: Optional[str] = None) -> None:
+    """
+    Write a batch to a columnar file
+    
+    Layout: magic, the column blocks (each aligned to 8 bytes), a JSON
+    footer with the offset, size and type of every column, then the
+    footer length and the magic again. Fixed-width columns are the raw
+    array bytes; dictionary columns store their codes as an int32 array
+    and their distinct values as JSON. raw_data rows are JSON lists of
+    [key, value] pairs, since csv.DictReader rows can have a None key.
+    
+    Args:
+        batch: TransactionBatch to save
+        path: Destination file
+        compression: None, 'zlib' or 'zstd' (needs the zstandard package),
+            applied to every column block
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {compression}")
+    if compression == 'zstd' and zstandard is None:
+        raise ValueError("zstd compression needs the zstandard package")
+    
+    blocks: Dict[str, Dict[str, Any]] = {}
+    footer = {
+        'version': FORMAT_VERSION,
+        'rows': len(batch),
+        'byteorder': sys.byteorder,
+        'amounts_in_cents': batch.amounts_in_cents,
+        'compression': compression,
+        'columns': blocks,
+    }
+    
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        
+        def write_block(name: str, data: bytes, kind: str, typecode: Optional[str] = None) -> None:
+            padding = -f.tell() % ALIGNMENT
+            f.write(b'\0' * padding)
+            stored = _compress(data, compression)
+            blocks[name] = {
+                'offset': f.tell(),
+                'size': len(stored),
+                'raw_size': len(data),
+                'kind': kind,
+                'typecode': typecode,
+            }
+            f.write(stored)
+        
+        for name in ARRAY_COLUMNS:
+            column = getattr(batch, name)
+            if column is not None:
+                write_block(name, column.tobytes(), 'array', _typecode(column))
+        
+        for name in DICTIONARY_COLUMNS:
+            column: DictionaryColumn = getattr(batch, name)
+            write_block(f'{name}.codes', column.codes.tobytes(), 'array', _typecode(column.codes))
+            write_block(f'{name}.values', _json_bytes(column.values), 'json')
+        
+        if batch.hashes.strings is None:
+            write_block('hashes', bytes(batch.hashes.digests), 'bytes')
+        else:
+            write_block('hashes', _json_bytes(batch.hashes.strings), 'json')
+        
+        if batch.raw_data is not None:
+            pairs = [None if raw is None else list(raw.items()) for raw in batch.raw_data]
+            write_block('raw_data', _json_bytes(pairs), 'json')
+        
+        footer_bytes = _json_bytes(footer)
+        f.write(footer_bytes)
+        f.write(TRAILER.pack(len(footer_bytes), MAGIC))
+
+
+class MappedTransactionBatch(TransactionBatch):
+    """
+    TransactionBatch backed by a memory-mapped columnar file
+    
+    Opening only reads the footer. Each column is decoded from the map
+    the first time it is accessed, so a summary over dates and amounts
+    never pages in descriptions or raw data. In uncompressed files of the
+    machine's byte order the fixed-width columns (and dictionary codes
+    and hash digests) are not decoded at all: they are memoryviews cast
+    over the map, read straight from the page cache. They are copied
+    into arrays before the first change and when the file is closed, so
+    the batch otherwise behaves like any other.
+    """
+    
+    def __init__(self, path: str):
+        # Columns are filled in lazily by __getattr__
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._map)
+        self._views: List[memoryview] = []  # Released before the map is closed
+        self._owns_columns = False
+        
+        mapped = self._map
+        if len(mapped) < len(MAGIC) + TRAILER.size or mapped[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a columnar transaction file: {path}")
+        
+        footer_size, magic = TRAILER.unpack_from(mapped, len(mapped) - TRAILER.size)
+        if magic != MAGIC:
+            raise ValueError(f"Truncated columnar transaction file: {path}")
+        
+        footer_start = len(mapped) - TRAILER.size - footer_size
+        footer = json.loads(mapped[footer_start:footer_start + footer_size])
+        if footer['version'] > FORMAT_VERSION:
+            raise ValueError(f"Unsupported columnar file version {footer['version']}")
+        
+        self._footer = footer
+        self._blocks = footer['columns']
+        self._rows = footer['rows']
+        self.amounts_in_cents = footer['amounts_in_cents']
+        
+        if 'times' not in self._blocks:
+            self.times = None
+        if 'raw_data' not in self._blocks:
+            self.raw_data = None
+    
+    def __len__(self) -> int:
+        if 'dates' in self.__dict__:
+            return len(self.dates)
+        return self._rows
+    
+    def __getattr__(self, name: str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        
+        if name in ARRAY_COLUMNS:
+            value = self._read_array(name)
+        elif name in DICTIONARY_COLUMNS:
+            value = DictionaryColumn()
+            value.values = self._read_json(f'{name}.values')
+            value.lookup = {item: code for code, item in enumerate(value.values)}
+            value.codes = self._read_array(f'{name}.codes')
+        elif name == 'hashes':
+            value = HashColumn()
+            if self._blocks['hashes']['kind'] == 'bytes':
+                value.digests = self._view('hashes') or bytearray(self._read_block('hashes'))
+            else:
+                value.digests = None
+                value.strings = self._read_json('hashes')
+        elif name == 'raw_data':
+            value = self._read_json('raw_data')
+            if self._footer['version'] >= 2:
+                value = [None if pairs is None else dict(pairs) for pairs in value]
+        else:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        
+        setattr(self, name, value)
+        return value
+    
+    def _read_block(self, name: str) -> bytes:
+        block = self._blocks[name]
+        start = block['offset']
+        with memoryview(self._map)[start:start + block['size']] as view:
+            return _decompress(view, self._footer['compression'], block['raw_size'])
+    
+    def _view(self, name: str) -> Optional[memoryview]:
+        """Zero-copy view of an uncompressed block, None if it has to be decompressed"""
+        if self._footer['compression'] is not None:
+            return None
+        block = self._blocks[name]
+        start = block['offset']
+        view = self._buffer[start:start + block['size']]
+        self._views.append(view)
+        return view
+    
+    def _read_array(self, name: str) -> Union[array, memoryview]:
+        typecode = self._blocks[name]['typecode']
+        if self._footer['byteorder'] == sys.byteorder:
+            view = self._view(name)
+            if view is not None:
+                column = view.cast(typecode)
+                self._views.append(column)
+                return column
+        
+        column = array(typecode)
+        column.frombytes(self._read_block(name))
+        if self._footer['byteorder'] != sys.byteorder:
+            column.byteswap()
+        return column
+    
+    def _own_columns(self, loaded_only: bool = False) -> None:
+        """Replace mapped column views by arrays, for appends or before closing"""
+        for name in ARRAY_COLUMNS + DICTIONARY_COLUMNS + ('hashes',):
+            if loaded_only and name not in self.__dict__:
+                continue
+            column = getattr(self, name)
+            if name in DICTIONARY_COLUMNS:
+                column.codes = _owned(column.codes)
+            elif name == 'hashes':
+                if isinstance(column.digests, memoryview):
+                    column.digests = bytearray(column.digests)
+            elif column is not None:
+                setattr(self, name, _owned(column))
+    
+    def _ensure_owned(self) -> None:
+        if not self._owns_columns:
+            self._own_columns()
+            self._owns_columns = True
+    
+    def append(self, trans: Transaction) -> None:
+        self._ensure_owned()
+        super().append(trans)
+    
+    def set_category(self, row, category: Optional[str]) -> None:
+        self._ensure_owned()
+        super().set_category(row, category)
+    
+    def _read_json(self, name: str) -> Any:
+        return json.loads(self._read_block(name))
+    
+    def load_all(self) -> 'MappedTransactionBatch':
+        """Decode every column and release the file"""
+        for name in ARRAY_COLUMNS + DICTIONARY_COLUMNS + ('hashes', 'raw_data'):
+            getattr(self, name)
+        self.close()
+        return self
+    
+    def close(self) -> None:
+        """Copy loaded columns out of the memory map and release it, columns not loaded yet become unavailable"""
+        self._own_columns(loaded_only=True)
+        self._release()
+    
+    def _release(self) -> None:
+        # Views can't outlive the map, release them first
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._buffer.release()
+        self._map.close()
+
+
+def load_batch(path: str) -> MappedTransactionBatch:
+    """Open a columnar file, columns are read on first use"""
+    return MappedTransactionBatch(path)
+
+
+def save_transactions(transactions: Iterable[Transaction], path: str,
+                      compression: Optional[str] = None) -> None:
+    """Save transactions (with their raw_data) to a columnar file"""
+    save_batch(TransactionBatch.from_transactions(transactions, keep_raw=True), path, compression)
+
+
+def load_transactions(path: str) -> List[Transaction]:
+    """Load a columnar file back into Transaction objects"""
+    batch = load_batch(path)
+    try:
+        return batch.to_transactions()
+    finally:
+        # The batch is dropped, no need to copy its columns out of the map
+        batch._release()
@@ -0,0 +1,251 @@
+"""Memoized, format-sniffing date and amount converters shared by the parsers"""
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Pattern
+
+
+DATE_CACHE_SIZE = 4096
+
+# Last resort for dates none of the formats accept: Y.M.D anywhere in the text
+DATE_SEARCH = re.compile(r'(\d{4})[\.\-/](\d{1,2})[\.\-/](\d{1,2})')
+
+# strptime directives the fast path handles: datetime field and digit count
+FAST_DIRECTIVES = {
+    'Y': ('year', 4),
+    'm': ('month', 2),
+    'd': ('day', 2),
+    'H': ('hour', 2),
+    'M': ('minute', 2),
+    'S': ('second', 2),
+}
+
+
+def _compile_fast_format(date_format: str) -> Optional[Pattern]:
+    """
+    Compile a strptime format to a strict regex with one named group per field
+    
+    Only zero-padded numeric fields and literal separators are supported.
+    Every string the regex accepts is one strptime accepts as well, with
+    the same result, so a fast path miss just falls back to strptime.
+    Returns None for formats with other directives or whitespace.
+    """
+    pattern = []
+    position = 0
+    while position < len(date_format):
+        char = date_format[position]
+        if char == '%':
+            directive = FAST_DIRECTIVES.get(date_format[position + 1:position + 2])
+            if directive is None:
+                return None
+            field, width = directive
+            pattern.append(f'(?P<{field}>\\d{{{width}}})')
+            position += 2
+        elif char.isspace():
+            return None
+        else:
+            pattern.append(re.escape(char))
+            position += 1
+    
+    try:
+        return re.compile(''.join(pattern), re.ASCII)
+    except re.error:  # A field used twice
+        return None
+
+
+class DateConverter:
+    """
+    Parses the dates of a column, locking onto the first format that works
+    
+    Formats are tried in order with strptime until one parses a value.
+    From then on that format is tried first, through a strict regex and
+    datetime() when it is a plain numeric format, and the other formats
+    are only tried when it fails. The formats of one converter are
+    expected to be mutually exclusive (no string parses with two of
+    them), which makes the result independent of the locked format.
+    
+    Results are memoized per raw string, so a statement pays for each
+    distinct date once. Text no format accepts is searched for a
+    Y.M.D date when search is set, and gives None otherwise.
+    """
+    
+    def __init__(self,
+                 formats: Iterable[str],
+                 search: Optional[Pattern] = DATE_SEARCH,
+                 cache_size: int = DATE_CACHE_SIZE):
+        self.formats = list(formats)
+        self.search = search
+        self.format: Optional[str] = None
+        self._fast: Dict[str, Optional[Pattern]] = {
+            date_format: _compile_fast_format(date_format) for date_format in self.formats
+        }
+        self.parse = lru_cache(maxsize=cache_size)(self._parse)
+    
+    def __call__(self, text: Optional[str]) -> Optional[datetime]:
+        if not text:
+            return None
+        return self.parse(text)
+    
+    def _parse(self, text: str) -> Optional[datetime]:
+        text = text.strip()
+        
+        if self.format is not None:
+            value = self._parse_with(self.format, text)
+            if value is not None:
+                return value
+        
+        for date_format in self.formats:
+            if date_format == self.format:
+                continue
+            value = self._parse_with(date_format, text)
+            if value is not None:
+                self.format = date_format
+                return value
+        
+        if self.search is not None:
+            match = self.search.search(text)
+            if match:
+                try:
+                    year, month, day = match.groups()
+                    return datetime(int(year), int(month), int(day))
+                except ValueError:
+                    pass
+        
+        return None
+    
+    def _parse_with(self, date_format: str, text: str) -> Optional[datetime]:
+        fast = self._fast[date_format]
+        if fast is not None:
+            match = fast.fullmatch(text)
+            if match is not None:
+                fields = {'year': 1900, 'month': 1, 'day': 1}
+                for field, value in match.groupdict().items():
+                    fields[field] = int(value)
+                try:
+                    return datetime(**fields)
+                except ValueError:
+                    pass
+        
+        try:
+            return datetime.strptime(text, date_format)
+        except ValueError:
+            return None
+    
+    def cache_info(self):
+        """Return hit/miss counters of the memoized results"""
+        return self.parse.cache_info()
+
+
+@dataclass(frozen=True)
+class NumberStyle:
+    """Decimal and digit group marks of a number convention"""
+    decimal: str
+    group: str
+
+
+# Spaces (also no-break ones) are accepted as group marks in every style
+NUMBER_STYLES = {
+    'hu': NumberStyle(decimal=',', group='.'),  # 1.234,56 and 1 234,56
+    'en': NumberStyle(decimal='.', group=','),  # 1,234.56
+}
+STYLE_BY_DECIMAL = {style.decimal: style for style in NUMBER_STYLES.values()}
+STYLE_BY_GROUP = {style.group: style for style in NUMBER_STYLES.values()}
+
+# Values sniffed before an undecided converter settles on its default style
+SNIFF_VALUES = 20
+
+# Everything but digits, signs and the two marks is noise (currency, spaces)
+NON_NUMERIC = re.compile(r'[^\d\-\+\.,]')
+
+
+class AmountConverter:
+    """
+    Parses the amounts of a column, detecting its number convention
+    
+    A value is conclusive about the convention when it has both marks
+    (the last one is the decimal mark), a mark used more than once (a
+    group mark) or a single mark not followed by exactly three digits
+    (a decimal mark). The first conclusive value among the first
+    SNIFF_VALUES locks the converter onto the matching style; without
+    one it stays on the default. Conclusive values are always read as
+    they say, the locked style only decides ambiguous ones like 1.234.
+    
+    After locking, plain values (digits and an optional decimal mark of
+    the style) skip the general path. Negative amounts have a minus sign
+    anywhere or are in parentheses. Unparseable text gives 0.0.
+    """
+    
+    def __init__(self, style: str = 'hu', detect: bool = True):
+        self.default = NUMBER_STYLES[style]
+        self.style: Optional[NumberStyle] = None if detect else self.default
+        self._seen = 0
+        self._plain: Optional[Pattern] = None
+        if not detect:
+            self._lock(self.default)
+    
+    def __call__(self, text: Optional[str]) -> float:
+        if not text:
+            return 0.0
+        
+        if self._plain is not None:
+            match = self._plain.fullmatch(text)
+            if match is not None:
+                integer, fraction = match.groups()
+                return float(f"{integer}.{fraction}" if fraction else integer)
+        
+        return self._parse(text)
+    
+    def _lock(self, style: NumberStyle) -> None:
+        self.style = style
+        self._plain = re.compile(rf'\s*([-+]?\d+)(?:{re.escape(style.decimal)}(\d+))?\s*', re.ASCII)
+    
+    def _parse(self, text: str) -> float:
+        negative = '(' in text
+        cleaned = NON_NUMERIC.sub('', text)
+        if '-' in cleaned:
+            negative = True
+        cleaned = cleaned.replace('-', '').replace('+', '')
+        
+        style = self._style_of(cleaned)
+        if style is not None:
+            cleaned = cleaned.replace(style.group, '').replace(style.decimal, '.')
+        
+        try:
+            value = float(cleaned)
+        except ValueError:
+            return 0.0
+        return -value if negative else value
+    
+    def _style_of(self, cleaned: str) -> Optional[NumberStyle]:
+        """Decide the convention of a cleaned value, None if it has no marks"""
+        dot = cleaned.rfind('.')
+        comma = cleaned.rfind(',')
+        
+        if dot >= 0 and comma >= 0:
+            return self._conclusive(STYLE_BY_DECIMAL['.' if dot > comma else ','])
+        
+        if dot < 0 and comma < 0:
+            self._inconclusive()
+            return None
+        
+        mark, position = ('.', dot) if dot >= 0 else (',', comma)
+        if cleaned.count(mark) > 1:
+            return self._conclusive(STYLE_BY_GROUP[mark])
+        if len(cleaned) - position - 1 != 3:
+            return self._conclusive(STYLE_BY_DECIMAL[mark])
+        
+        # 1.234 or 1,234: the column's convention decides
+        self._inconclusive()
+        return self.style or self.default
+    
+    def _conclusive(self, style: NumberStyle) -> NumberStyle:
+        if self.style is None:
+            self._lock(style)
+        return style
+    
+    def _inconclusive(self) -> None:
+        if self.style is None:
+            self._seen += 1
+            if self._seen >= SNIFF_VALUES:
+                self._lock(self.default)
@@ -0,0 +1,123 @@
+"""Interned token sets of transaction descriptions for similarity checks"""
+import math
+from functools import lru_cache
+from typing import Dict, FrozenSet, Hashable, Iterator, List, Set, Tuple
+
+
+FINGERPRINT_CACHE_SIZE = 65536
+
+
+class DescriptionFingerprints:
+    """
+    Memoized description fingerprints for fuzzy duplicate matching
+    
+    A description's fingerprint is the set of its lower-cased words as
+    interned integer IDs, computed once per distinct description. The
+    word-based Jaccard similarity of two descriptions is then a set
+    intersection of small ints instead of two fresh splits, and equal
+    fingerprints can be grouped so a similarity is computed once per
+    distinct description rather than once per row.
+    
+    The word IDs only ever grow, so an instance is scoped to the index
+    that uses it (every TransactionIndex has its own) rather than shared
+    by the process.
+    """
+    
+    def __init__(self, cache_size: int = FINGERPRINT_CACHE_SIZE):
+        self.token_ids: Dict[str, int] = {}
+        self.tokens = lru_cache(maxsize=cache_size)(self._tokens)
+    
+    def _tokens(self, description: str) -> FrozenSet[int]:
+        token_ids = self.token_ids
+        return frozenset(token_ids.setdefault(word, len(token_ids)) for word in description.lower().split())
+    
+    def similarity(self, first: str, second: str) -> float:
+        """Jaccard similarity of the word sets of two descriptions"""
+        return jaccard(self.tokens(first), self.tokens(second))
+    
+    def cache_info(self):
+        """Return hit/miss counters of the token set cache"""
+        return self.tokens.cache_info()
+
+
+@lru_cache(maxsize=FINGERPRINT_CACHE_SIZE)
+def word_set(description: str) -> FrozenSet[str]:
+    """Lower-cased words of a description, memoized in a bounded cache"""
+    return frozenset(description.lower().split())
+
+
+def description_similarity(first: str, second: str) -> float:
+    """Jaccard similarity of the word sets of two descriptions, without an index"""
+    return jaccard(word_set(first), word_set(second))
+
+
+def jaccard(tokens1: FrozenSet[Hashable], tokens2: FrozenSet[Hashable]) -> float:
+    """Jaccard similarity of two token sets, 0.0 if either is empty"""
+    if not tokens1 or not tokens2:
+        return 0.0
+    
+    shared = len(tokens1 & tokens2)
+    return shared / (len(tokens1) + len(tokens2) - shared)
+
+
+@lru_cache(maxsize=FINGERPRINT_CACHE_SIZE)
+def prefix_tokens(tokens: FrozenSet[int], threshold: float) -> Tuple[int, ...]:
+    """
+    Tokens a set has to share with any set it is more than threshold similar to
+    
+    A set more than threshold similar to this one overlaps it in more
+    than threshold * size tokens, so with all sets ordered the same way
+    they share one of their first size - overlap + 1 tokens (prefix
+    filtering).
+    
+    Tokens are ordered by descending ID: words first seen later are
+    usually the rare, distinctive ones (a merchant name rather than the
+    "card payment" every description starts with).
+    """
+    ordered = sorted(tokens, reverse=True)
+    # The margin keeps float rounding from overstating the overlap, a
+    # smaller overlap only makes the prefix longer
+    overlap = math.floor(threshold * len(ordered) - 1e-9) + 1
+    return tuple(ordered[:len(ordered) - overlap + 1])
+
+
+class FingerprintGroups:
+    """
+    Positions grouped by description fingerprint, searchable by similarity
+    
+    similar() only computes the similarity of fingerprints that share a
+    prefix token and have compatible sizes, which is exact: every
+    fingerprint above the threshold is found.
+    """
+    
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.groups: Dict[FrozenSet[int], List[int]] = {}
+        self.by_prefix: Dict[int, List[FrozenSet[int]]] = {}
+    
+    def add(self, tokens: FrozenSet[int], position: int) -> None:
+        group = self.groups.get(tokens)
+        if group is None:
+            group = self.groups[tokens] = []
+            for token in prefix_tokens(tokens, self.threshold):
+                self.by_prefix.setdefault(token, []).append(tokens)
+        group.append(position)
+    
+    def similar(self, tokens: FrozenSet[int]) -> Iterator[List[int]]:
+        """Position groups whose fingerprint is more than threshold similar to tokens"""
+        if not tokens:
+            return
+        
+        threshold = self.threshold
+        size = len(tokens)
+        seen: Set[FrozenSet[int]] = set()
+        for token in prefix_tokens(tokens, threshold):
+            for fingerprint in self.by_prefix.get(token, ()):
+                if fingerprint in seen:
+                    continue
+                seen.add(fingerprint)
+                # The similarity is at most min / max of the sizes
+                other = len(fingerprint)
+                if min(size, other) >= threshold * max(size, other) and jaccard(tokens, fingerprint) > threshold:
+                    yield self.groups[fingerprint]
+
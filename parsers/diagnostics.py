@@ -0,0 +1,105 @@
+"""Structured collection of parse problems instead of per-row printing"""
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+
+MAX_SAMPLES = 20
+
+# Problem kinds reported by the parsers
+MISSING_DATE = 'missing_date'
+INVALID_DATE = 'invalid_date'
+ROW_ERROR = 'row_error'  # Unexpected exception while decoding a row
+EXTRA_CELLS = 'extra_cells'  # Row has more cells than the header, decoded anyway
+READ_ERROR = 'read_error'  # The file (or a format of it) could not be read
+NO_PARSER = 'no_parser'
+PARSE_ERROR = 'parse_error'
+CACHE_ERROR = 'cache_error'  # A parse result could not be stored in the parse cache
+
+
+@dataclass
+class Diagnostic:
+    """A single reported problem"""
+    kind: str
+    message: str
+    source: Optional[str] = None  # File the problem is in
+    line: Optional[int] = None
+    row: Any = None  # The offending row as read
+
+
+# Called with every sampled diagnostic
+DiagnosticHook = Callable[[Diagnostic], None]
+
+
+class Diagnostics:
+    """
+    Counts problems by kind and keeps a capped sample of them
+    
+    Reporting a problem beyond the sample cap only bumps a counter, so a
+    file with 100k broken rows costs 100k dict updates instead of 100k
+    writes to the terminal. The optional hook (see log_to) receives the
+    sampled diagnostics as they are reported.
+    """
+    
+    def __init__(self, source: Optional[str] = None, max_samples: int = MAX_SAMPLES,
+                 hook: Optional[DiagnosticHook] = None):
+        self.source = source
+        self.max_samples = max_samples
+        self.hook = hook
+        self.counts: Counter = Counter()
+        self.samples: List[Diagnostic] = []
+    
+    def report(self, kind: str, message: str, line: Optional[int] = None, row: Any = None) -> None:
+        self.counts[kind] += 1
+        if len(self.samples) < self.max_samples:
+            diagnostic = Diagnostic(kind, message, self.source, line, row)
+            self.samples.append(diagnostic)
+            if self.hook is not None:
+                self.hook(diagnostic)
+    
+    def merge(self, other: 'Diagnostics') -> None:
+        """
+        Add the counts and samples of another collector (for example of one file)
+        
+        The hook is not called, merged samples were already passed to the
+        hook of the collector they were reported to.
+        """
+        self.counts.update(other.counts)
+        room = self.max_samples - len(self.samples)
+        if room > 0:
+            self.samples.extend(other.samples[:room])
+    
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+    
+    def __bool__(self) -> bool:
+        return bool(self.counts)
+    
+    def summary(self) -> Dict[str, Any]:
+        """Counts and samples as plain data, for reports and APIs"""
+        return {
+            'total': self.total,
+            'counts': dict(self.counts),
+            'samples': [
+                {'kind': d.kind, 'message': d.message, 'source': d.source, 'line': d.line, 'row': d.row}
+                for d in self.samples
+            ],
+        }
+    
+    def __getstate__(self) -> Dict[str, Any]:
+        # Hooks (loggers, closures) stay in the process that set them
+        state = self.__dict__.copy()
+        state['hook'] = None
+        return state
+
+
+def log_to(logger: logging.Logger, level: int = logging.WARNING) -> DiagnosticHook:
+    """Hook writing sampled diagnostics to a logger"""
+    def hook(diagnostic: Diagnostic) -> None:
+        where = diagnostic.source or ''
+        if diagnostic.line is not None:
+            where = f"{where}:{diagnostic.line}"
+        logger.log(level, "%s %s: %s", where, diagnostic.kind, diagnostic.message)
+    return hook
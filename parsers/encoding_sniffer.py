@@ -0,0 +1,120 @@
+"""Byte-level encoding detection for Hungarian bank statements"""
+import codecs
+import os
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+SNIFF_BYTES = 64 * 1024
+MAX_SNIFF_BYTES = 1024 * 1024
+CACHE_SIZE = 1024
+
+DEFAULT_ENCODING = 'utf-8-sig'
+
+# Hungarian accented letters (áéíóöőúüű and capitals) have the same byte
+# values in Windows-1250 and ISO-8859-2
+HUNGARIAN_LETTER_BYTES = frozenset(b'\xe1\xe9\xed\xf3\xf6\xf5\xfa\xfc\xfb\xc1\xc9\xcd\xd3\xd6\xd5\xda\xdc\xdb')
+
+# Letters in ISO-8859-2 (Ą Ś Ź ą ś ź) that are symbols in Windows-1250
+ISO_8859_2_LETTER_BYTES = frozenset(b'\xa1\xa6\xac\xb1\xb6\xbc')
+
+_cache: 'OrderedDict[Tuple[str, int, int], str]' = OrderedDict()
+
+
+def sniff_bytes(data: bytes, complete: bool = True) -> Optional[str]:
+    """
+    Pick the codec for a statement from a prefix of its raw bytes
+    
+    Args:
+        data: Leading bytes of the file
+        complete: Whether data is the whole file (a multi-byte sequence cut
+            off at the end of a prefix is not treated as invalid)
+    
+    Returns:
+        Codec name, or None if the bytes are plain ASCII and don't decide it
+    """
+    if data.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    
+    if data.isascii():
+        return None
+    
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(data, final=complete)
+        return 'utf-8-sig'
+    except UnicodeDecodeError:
+        pass
+    
+    # Not UTF-8, so one of the single-byte Central European code pages
+    c1_bytes = iso_letters = hungarian_letters = 0
+    for byte in data:
+        if byte < 0x80:
+            continue
+        if byte < 0xa0:
+            c1_bytes += 1
+        elif byte in HUNGARIAN_LETTER_BYTES:
+            hungarian_letters += 1
+        elif byte in ISO_8859_2_LETTER_BYTES:
+            iso_letters += 1
+    
+    # 0x80-0x9f are control characters in ISO-8859-2 but letters and
+    # punctuation (Š, Ž, „, ”...) in Windows-1250
+    if c1_bytes:
+        return 'windows-1250'
+    
+    # Ą/Ś/Ź only beat ±/¶/¼ when the text doesn't read as plain Hungarian
+    if iso_letters > hungarian_letters:
+        return 'iso-8859-2'
+    
+    return 'windows-1250'
+
+
+def sniff_encoding(file_path: str) -> str:
+    """
+    Detect the encoding of a statement file from a bounded prefix
+    
+    Decisions are cached by (path, size, mtime), so asking again for an
+    unchanged file doesn't touch its contents.
+    
+    Args:
+        file_path: Path to the bank statement file
+    
+    Returns:
+        Codec name usable with open()
+    """
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+    
+    encoding = _cache.get(key)
+    if encoding is not None:
+        _cache.move_to_end(key)
+        return encoding
+    
+    encoding = DEFAULT_ENCODING
+    with open(file_path, 'rb') as f:
+        data = f.read(SNIFF_BYTES)
+        read_total = len(data)
+        while data:
+            complete = read_total >= stat.st_size
+            sniffed = sniff_bytes(data, complete)
+            if sniffed:
+                encoding = sniffed
+                break
+            
+            if complete or read_total >= MAX_SNIFF_BYTES:
+                break
+            
+            # Plain ASCII so far: keep reading until the first non-ASCII byte
+            data = f.read(SNIFF_BYTES)
+            read_total += len(data)
+    
+    _cache[key] = encoding
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    
+    return encoding
+
+
+def clear_cache() -> None:
+    """Forget all cached encoding decisions"""
+    _cache.clear()
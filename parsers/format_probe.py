@@ -0,0 +1,45 @@
+"""Single bounded read of a statement's leading bytes for format detection"""
+from dataclasses import dataclass
+from pathlib import Path
+
+from encoding_sniffer import DEFAULT_ENCODING, SNIFF_BYTES, sniff_bytes, sniff_encoding
+
+
+@dataclass
+class FormatProbe:
+    """Leading bytes of a statement file and what can be read from them"""
+    path: str
+    suffix: str  # Lower-case file extension (.csv)
+    prefix: bytes
+    encoding: str
+    first_line: str
+
+
+def probe_file(file_path: str) -> FormatProbe:
+    """
+    Read the start of a statement once and decode its header line
+    
+    Args:
+        file_path: Path to the bank statement file
+    
+    Returns:
+        FormatProbe with the prefix, its encoding and the first line
+    """
+    with open(file_path, 'rb') as f:
+        prefix = f.read(SNIFF_BYTES)
+    
+    complete = len(prefix) < SNIFF_BYTES
+    encoding = sniff_bytes(prefix, complete)
+    if encoding is None:
+        # Plain ASCII prefix: only a longer file can still change the answer
+        encoding = DEFAULT_ENCODING if complete else sniff_encoding(file_path)
+    
+    first_line = prefix.split(b'\n', 1)[0].decode(encoding, errors='replace')
+    
+    return FormatProbe(
+        path=file_path,
+        suffix=Path(file_path).suffix.lower(),
+        prefix=prefix,
+        encoding=encoding,
+        first_line=first_line
+    )
@@ -0,0 +1,227 @@
+"""Opt-in per-stage timing and counters for the parsing pipeline"""
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+@dataclass
+class StageStats:
+    """Time and row counts of a pipeline stage"""
+    calls: int = 0
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    rows_in: int = 0
+    rows_out: int = 0
+    rejected: int = 0
+    
+    def add(self, other: 'StageStats') -> None:
+        self.calls += other.calls
+        self.wall_time += other.wall_time
+        self.cpu_time += other.cpu_time
+        self.rows_in += other.rows_in
+        self.rows_out += other.rows_out
+        self.rejected += other.rejected
+
+
+@dataclass
+class CacheCounters:
+    """Hits and misses of a cache"""
+    hits: int = 0
+    misses: int = 0
+    
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+# Called with the stage name and the stats of one finished span
+StageHook = Callable[[str, StageStats], None]
+
+
+class PipelineStats:
+    """
+    Collects per-stage wall and CPU time, row counts and cache hit rates
+    
+    Stages are timed as spans (stage() around a block, timed_iter() around
+    a stream, where only the time spent producing items counts). Every
+    finished span is also passed to the hooks, which is where exporters
+    plug in. Pass an instance to ParserFactory to enable it; without one
+    the pipeline uses NULL_STATS, whose methods do nothing.
+    """
+    
+    enabled = True
+    
+    def __init__(self, hooks: Iterable[StageHook] = ()):
+        self.hooks: List[StageHook] = list(hooks)
+        self.stages: Dict[str, StageStats] = {}
+        self.caches: Dict[str, CacheCounters] = {}
+        # Caches that keep their own counters: name -> (cache_info, baseline)
+        self._tracked: Dict[str, Tuple[Callable[[], Any], Tuple[int, int]]] = {}
+    
+    def add_hook(self, hook: StageHook) -> None:
+        self.hooks.append(hook)
+    
+    def _stage(self, name: str) -> StageStats:
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = StageStats()
+        return stage
+    
+    def _finish(self, name: str, span: StageStats) -> None:
+        self._stage(name).add(span)
+        for hook in self.hooks:
+            hook(name, span)
+    
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageStats]:
+        """Time a block as one span of a stage, row counts can be set on the yielded span"""
+        span = StageStats(calls=1)
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield span
+        finally:
+            span.wall_time = time.perf_counter() - wall
+            span.cpu_time = time.process_time() - cpu
+            self._finish(name, span)
+    
+    def timed_iter(self, name: str, items: Iterable) -> Iterator:
+        """Stream items, timing only the work of producing them and counting them as rows out"""
+        span = StageStats(calls=1)
+        iterator = iter(items)
+        perf_counter = time.perf_counter
+        process_time = time.process_time
+        try:
+            while True:
+                wall = perf_counter()
+                cpu = process_time()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    span.wall_time += perf_counter() - wall
+                    span.cpu_time += process_time() - cpu
+                span.rows_out += 1
+                yield item
+        finally:
+            self._finish(name, span)
+    
+    def count(self, name: str, rows_in: int = 0, rows_out: int = 0, rejected: int = 0) -> None:
+        """Add row counts to a stage without timing anything"""
+        stage = self._stage(name)
+        stage.rows_in += rows_in
+        stage.rows_out += rows_out
+        stage.rejected += rejected
+    
+    def cache(self, name: str, hit: bool) -> None:
+        """Record a lookup of a cache"""
+        counters = self.caches.get(name)
+        if counters is None:
+            counters = self.caches[name] = CacheCounters()
+        if hit:
+            counters.hits += 1
+        else:
+            counters.misses += 1
+    
+    def track_cache(self, name: str, cache_info: Callable[[], Any]) -> None:
+        """Report a cache with its own hits/misses counters (like lru_cache's cache_info)"""
+        if name not in self._tracked:
+            info = cache_info()
+            self._tracked[name] = (cache_info, (info.hits, info.misses))
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Plain dict of all stages and caches, for exporting or merging"""
+        caches = {name: CacheCounters(counters.hits, counters.misses) for name, counters in self.caches.items()}
+        for name, (cache_info, (hits, misses)) in self._tracked.items():
+            info = cache_info()
+            counters = caches.setdefault(name, CacheCounters())
+            counters.hits += info.hits - hits
+            counters.misses += info.misses - misses
+        
+        return {
+            'stages': {name: asdict(stage) for name, stage in self.stages.items()},
+            'caches': {
+                name: {'hits': counters.hits, 'misses': counters.misses, 'hit_rate': counters.hit_rate}
+                for name, counters in caches.items()
+            },
+        }
+    
+    def merge(self, snapshot: Optional[Dict[str, Any]]) -> None:
+        """Add a snapshot taken elsewhere (a worker process) and pass its stages to the hooks"""
+        if not snapshot:
+            return
+        for name, values in snapshot['stages'].items():
+            self._finish(name, StageStats(**values))
+        for name, values in snapshot['caches'].items():
+            counters = self.caches.get(name)
+            if counters is None:
+                counters = self.caches[name] = CacheCounters()
+            counters.hits += values['hits']
+            counters.misses += values['misses']
+    
+    def reset(self) -> None:
+        self.stages.clear()
+        self.caches.clear()
+        self._tracked = {
+            name: (cache_info, (cache_info().hits, cache_info().misses))
+            for name, (cache_info, _) in self._tracked.items()
+        }
+
+
+class _NullSpan(StageStats):
+    """Span handed out by NullStats, writes to it are ignored"""
+    
+    def __setattr__(self, name: str, value: Any) -> None:
+        pass
+
+
+class _NullStage:
+    """Reusable no-op context manager"""
+    
+    span = _NullSpan()
+    
+    def __enter__(self) -> StageStats:
+        return self.span
+    
+    def __exit__(self, *exc_info) -> None:
+        return None
+
+
+class NullStats:
+    """Disabled instrumentation: same interface as PipelineStats, no work"""
+    
+    enabled = False
+    _null_stage = _NullStage()
+    
+    def add_hook(self, hook: StageHook) -> None:
+        raise ValueError("Instrumentation is disabled, pass a PipelineStats to enable it")
+    
+    def stage(self, name: str) -> _NullStage:
+        return self._null_stage
+    
+    def timed_iter(self, name: str, items: Iterable) -> Iterable:
+        return items
+    
+    def count(self, name: str, rows_in: int = 0, rows_out: int = 0, rejected: int = 0) -> None:
+        pass
+    
+    def cache(self, name: str, hit: bool) -> None:
+        pass
+    
+    def track_cache(self, name: str, cache_info: Callable[[], Any]) -> None:
+        pass
+    
+    def snapshot(self) -> Dict[str, Any]:
+        return {'stages': {}, 'caches': {}}
+    
+    def merge(self, snapshot: Optional[Dict[str, Any]]) -> None:
+        pass
+    
+    def reset(self) -> None:
+        pass
+
+
+NULL_STATS = NullStats()
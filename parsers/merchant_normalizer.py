@@ -0,0 +1,74 @@
+"""Compiled, memoized merchant name normalization"""
+import re
+from functools import lru_cache
+from typing import Callable, Iterable, Optional, Tuple, Union
+
+
+MERCHANT_CACHE_SIZE = 8192
+
+Pattern = Union[str, 're.Pattern']
+
+
+class MerchantNormalizer:
+    """
+    Rule table that turns raw transaction descriptions into merchant names
+    
+    Two kinds of rules are supported and compiled once:
+    
+    - substitutions: (pattern, replacement, flags) applied in order, each
+      to the result of the previous one, exactly like chained re.sub calls.
+      A single combined pattern is checked first and the whole table is
+      skipped when none of the rules can match.
+    - extractors: patterns tried in order with match(); the first one that
+      matches ends the lookup and its first group is the merchant.
+    
+    When no extractor matches, finalize(text, description) builds the
+    result from the substituted text. Results are memoized per raw
+    description, which is what makes repeat-heavy statements cheap.
+    """
+    
+    def __init__(self,
+                 substitutions: Iterable[Tuple[Pattern, str, int]] = (),
+                 extractors: Iterable[Pattern] = (),
+                 finalize: Optional[Callable[[str, str], Optional[str]]] = None,
+                 cache_size: int = MERCHANT_CACHE_SIZE):
+        self.substitutions = [
+            (re.compile(pattern, flags), replacement) for pattern, replacement, flags in substitutions
+        ]
+        self.extractors = [re.compile(pattern) for pattern in extractors]
+        self.finalize = finalize
+        
+        # Scoped inline flags keep each rule's own case sensitivity
+        self._any_substitution = re.compile('|'.join(
+            f"(?{'i' if pattern.flags & re.IGNORECASE else ''}:{pattern.pattern})"
+            for pattern, _ in self.substitutions
+        )) if self.substitutions else None
+        
+        self.normalize = lru_cache(maxsize=cache_size)(self._normalize)
+    
+    def _normalize(self, description: str) -> Optional[str]:
+        text = description
+        
+        # If no rule matches the input none of the substitutions changes it
+        if self._any_substitution is not None and self._any_substitution.search(text):
+            for pattern, replacement in self.substitutions:
+                text = pattern.sub(replacement, text)
+        
+        for pattern in self.extractors:
+            match = pattern.match(text)
+            if match:
+                return match.group(1).strip()
+        
+        if self.finalize is not None:
+            return self.finalize(text, description)
+        return text
+    
+    def __call__(self, description: str) -> Optional[str]:
+        return self.normalize(description)
+    
+    def cache_info(self):
+        """Return hit/miss counters of the memoized results"""
+        return self.normalize.cache_info()
+    
+    def cache_clear(self) -> None:
+        self.normalize.cache_clear()
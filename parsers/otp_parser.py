@@ -1,15 +1,43 @@
 """OTP Bank statement parser"""
 import csv
+import mmap
+import os
 import re
 from datetime import datetime
-from typing import List, Optional
-from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
 from base_parser import BaseParser, Transaction
+from byte_scanner import ByteSyntax, byte_syntax, iter_lines
+from converters import AmountConverter, DateConverter
+from diagnostics import EXTRA_CELLS, INVALID_DATE, MISSING_DATE, READ_ERROR, ROW_ERROR, Diagnostics
+from encoding_sniffer import sniff_encoding
+
+
+# Date at the start of an alternative format record, on raw bytes
+ALTERNATIVE_DATE = re.compile(rb'\d{4}[\.\-/]\d{2}[\.\-/]\d{2}')
 
 
 class OTPParser(BaseParser):
     """Parser for OTP Bank statements"""
     
+    # Common OTP CSV column names (multiple variations)
+    DATE_KEYS = ['Dátum', 'Könyvelés dátuma', 'Tranzakció dátuma', 'datum']
+    DESCRIPTION_KEYS = ['Közlemény', 'Leírás', 'Megnevezés', 'kozlemeny', 'leiras']
+    AMOUNT_KEYS = ['Összeg', 'osszeg']
+    DEBIT_KEYS = ['Terhelés', 'terheles']
+    CREDIT_KEYS = ['Jóváírás', 'jovairas']
+    BALANCE_KEYS = ['Egyenleg', 'Záró egyenleg', 'egyenleg']
+    
+    # OTP specific headers, matched case-insensitively
+    FILE_EXTENSIONS = ('.csv', '.txt')
+    HEADER_SIGNATURES = ('számla', 'dátum', 'összeg', 'egyenleg', 'közlemény')
+    HEADER_IGNORE_CASE = True
+    
+    # Hungarian amounts: 1.234,56 or 1 234,56
+    NUMBER_STYLE = 'hu'
+    
+    # Tried in order after the sniffed encoding fails to decode the file
+    FALLBACK_ENCODINGS = ('utf-8-sig', 'windows-1250', 'iso-8859-2')
+    
     def __init__(self):
         super().__init__("OTP Bank")
         self.date_formats = [
@@ -18,134 +46,284 @@ class OTPParser(BaseParser):
             '%Y/%m/%d',
             '%d.%m.%Y'
         ]
+        self.date_converter = DateConverter(self.date_formats)
         
-    def validate_format(self, file_path: str) -> bool:
-        """Check if file is valid OTP statement"""
-        path = Path(file_path)
+    def iter_parse(self, file_path: str, encoding: Optional[str] = None) -> Iterator[Transaction]:
+        """
+        Stream OTP CSV statement transactions
         
-        # Check file extension
-        if path.suffix.lower() not in ['.csv', '.txt', '.pdf']:
-            return False
+        A file that doesn't decode is read again in the next of
+        FALLBACK_ENCODINGS as long as no row was yielded. Once rows are
+        out a retry can't take them back, so the UnicodeDecodeError is
+        raised (parse() catches it and re-reads the whole file).
+        """
+        stats = self.stats
+        diagnostics = self._start_diagnostics(file_path)
+        
+        # Sniff the encoding once instead of re-parsing the file per codec
+        if not encoding:
+            with stats.stage('encoding'):
+                encoding = sniff_encoding(file_path)
+        parsed = 0
         
-        # For CSV files, check header structure
-        if path.suffix.lower() in ['.csv', '.txt']:
+        for candidate in self._encodings_from(encoding):
             try:
-                with open(file_path, 'r', encoding='utf-8-sig') as f:
-                    first_line = f.readline().lower()
-                    # Check for OTP specific headers
-                    otp_keywords = ['számla', 'dátum', 'összeg', 'egyenleg', 'közlemény']
-                    return any(keyword in first_line for keyword in otp_keywords)
-            except:
-                try:
-                    # Try Windows-1250 encoding (common for Hungarian banks)
-                    with open(file_path, 'r', encoding='windows-1250') as f:
-                        first_line = f.readline().lower()
-                        otp_keywords = ['számla', 'dátum', 'összeg', 'egyenleg', 'közlemény']
-                        return any(keyword in first_line for keyword in otp_keywords)
-                except:
-                    return False
+                with open(file_path, 'r', encoding=candidate) as f:
+                    reader = csv.reader(f, delimiter=';')
+                    fieldnames = next(reader, None)
+                    
+                    # Without a date column no row can parse, so go straight
+                    # to the alternative format
+                    if self._has_date_column(fieldnames):
+                        decode = self._build_row_decoder(fieldnames, diagnostics, lambda: reader.line_num)
+                        # Blank lines come through as empty rows
+                        rows = self._decode_rows(filter(None, reader), decode)
+                        for transaction in stats.timed_iter('decode', rows):
+                            parsed += 1
+                            yield transaction
+                encoding = candidate
+                break
+            except UnicodeDecodeError as e:
+                diagnostics.report(READ_ERROR, f"Error reading OTP statement as {candidate}: {e}")
+                if parsed:
+                    raise
+            except (OSError, csv.Error) as e:
+                diagnostics.report(READ_ERROR, f"Error reading OTP statement as {candidate}: {e}")
+                if parsed:
+                    raise
+                break
+        
+        # If CSV parsing failed, try alternative format
+        if not parsed:
+            yield from stats.timed_iter('alternative_format', self._iter_alternative_format(file_path, encoding, diagnostics))
+    
+    def parse(self, file_path: str, encoding: Optional[str] = None) -> List[Transaction]:
+        """Parse OTP statement, re-reading the whole file in a fallback encoding if decoding fails midway"""
+        if not encoding:
+            with self.stats.stage('encoding'):
+                encoding = sniff_encoding(file_path)
+        
+        encodings = self._encodings_from(encoding)
+        failures = []
+        for candidate in encodings[:-1]:
+            try:
+                transactions = super().parse(file_path, candidate)
+                break
+            except UnicodeDecodeError as e:
+                failures.append(f"Error reading OTP statement as {candidate}: {e}")
+        else:
+            transactions = super().parse(file_path, encodings[-1])
+        
+        # Every attempt starts fresh diagnostics, keep the failed ones
+        for failure in failures:
+            self.diagnostics.report(READ_ERROR, failure)
+        return transactions
+    
+    def _encodings_from(self, encoding: str) -> List[str]:
+        """encoding, then the fallbacks not tried yet"""
+        return [encoding] + [candidate for candidate in self.FALLBACK_ENCODINGS if candidate != encoding]
+    
+    def _has_date_column(self, fieldnames: Optional[list]) -> bool:
+        """Check whether a CSV header has one of the known date columns"""
+        if not fieldnames:
+            return False
+        
+        header = {name.lower() for name in fieldnames if name}
+        return any(key.lower() in header for key in self.DATE_KEYS)
+    
+    def _resolve_columns(self, fieldnames: List[str], keys: List[str]) -> List[List[int]]:
+        """
+        Resolve candidate column names to column indices once per file
+        
+        For every key the indices are listed in the order a row dict would
+        be searched: the exact column name first, then case-insensitive
+        matches. Of duplicate column names only the last column counts,
+        like in the dicts csv.DictReader builds.
+        """
+        positions: Dict[str, int] = {}
+        for index, name in enumerate(fieldnames):
+            positions[name] = index
         
-        return False
+        resolved = []
+        for key in keys:
+            candidates = [positions[key]] if key in positions else []
+            lowered = key.lower()
+            candidates += [index for name, index in positions.items() if name.lower() == lowered]
+            resolved.append(candidates)
+        return resolved
     
-    def parse(self, file_path: str, encoding: str = 'utf-8-sig') -> List[Transaction]:
-        """Parse OTP CSV statement"""
-        transactions = []
+    def _build_row_decoder(self,
+                           fieldnames: List[str],
+                           diagnostics: Diagnostics,
+                           line_number: Callable[[], int]) -> Callable[[List[str]], Optional[Transaction]]:
+        """
+        Build a decoder of csv.reader rows with the header resolved to column indices
         
-        # Try different encodings
-        encodings_to_try = [encoding, 'windows-1250', 'utf-8', 'iso-8859-2']
+        Rejected rows are reported to diagnostics, line_number gives the
+        line of the row being decoded.
+        """
+        date_columns = self._resolve_columns(fieldnames, self.DATE_KEYS)
+        description_columns = self._resolve_columns(fieldnames, self.DESCRIPTION_KEYS)
+        amount_columns = self._resolve_columns(fieldnames, self.AMOUNT_KEYS)
+        debit_columns = self._resolve_columns(fieldnames, self.DEBIT_KEYS)
+        credit_columns = self._resolve_columns(fieldnames, self.CREDIT_KEYS)
+        balance_columns = self._resolve_columns(fieldnames, self.BALANCE_KEYS)
+        width = len(fieldnames)
+        parse_amount = AmountConverter(self.NUMBER_STYLE)
         
-        for enc in encodings_to_try:
+        def lookup(row: List[str], columns: List[List[int]]) -> Optional[str]:
+            size = len(row)
+            for candidates in columns:
+                for index in candidates:
+                    if index < size and row[index]:
+                        return row[index]
+            return None
+        
+        def decode(row: List[str]) -> Optional[Transaction]:
+            overflow = len(row) > width
+            if overflow:
+                # Decoded from the known columns, the surplus cells are only kept in raw_data
+                diagnostics.report(EXTRA_CELLS, f"Row has {len(row) - width} more cells than the header",
+                                   line_number(), row)
             try:
-                with open(file_path, 'r', encoding=enc) as f:
-                    reader = csv.DictReader(f, delimiter=';')
-                    
-                    for row in reader:
-                        transaction = self._parse_row(row)
-                        if transaction:
-                            transactions.append(transaction)
+                # Extract date
+                date_str = lookup(row, date_columns)
+                if not date_str:
+                    diagnostics.report(MISSING_DATE, "Row has no date", line_number(), row)
+                    return None
+                
+                transaction_date = self._parse_date(date_str)
+                if not transaction_date:
+                    diagnostics.report(INVALID_DATE, f"Unrecognized date: {date_str}", line_number(), row)
+                    return None
+                
+                # Extract description
+                description = lookup(row, description_columns) or "N/A"
+                
+                # Extract amount (handle debit/credit separately)
+                amount = 0.0
+                
+                # Try to get unified amount first
+                amount_str = lookup(row, amount_columns)
+                if amount_str:
+                    amount = parse_amount(amount_str)
+                else:
+                    # Check debit/credit columns
+                    debit = lookup(row, debit_columns)
+                    credit = lookup(row, credit_columns)
                     
-                    if transactions:
-                        break
-            except (UnicodeDecodeError, Exception) as e:
-                continue
-        
-        # If CSV parsing failed, try alternative format
-        if not transactions:
-            transactions = self._parse_alternative_format(file_path)
+                    if debit:
+                        amount = -abs(parse_amount(debit))
+                    elif credit:
+                        amount = abs(parse_amount(credit))
+                
+                # Extract balance
+                balance_str = lookup(row, balance_columns)
+                balance = parse_amount(balance_str) if balance_str else None
+                
+                # Same raw_data as csv.DictReader rows
+                raw_data = dict(zip(fieldnames, row))
+                if overflow:
+                    raw_data[None] = row[width:]
+                else:
+                    for name in fieldnames[len(row):]:
+                        raw_data[name] = None
+                
+                return Transaction(
+                    date=transaction_date,
+                    description=self._clean_description(description),
+                    amount=amount,
+                    currency="HUF",
+                    balance=balance,
+                    bank=self.bank_name,
+                    raw_data=raw_data
+                )
+                
+            except Exception as e:
+                diagnostics.report(ROW_ERROR, f"Error parsing row: {e}", line_number(), row)
+                return None
         
-        self.transactions = transactions
-        return transactions
+        return decode
     
-    def _parse_row(self, row: dict) -> Optional[Transaction]:
-        """Parse single CSV row into Transaction"""
+    def _iter_alternative_format(self, file_path: str, encoding: str = 'windows-1250',
+                                 diagnostics: Optional[Diagnostics] = None) -> Iterator[Transaction]:
+        """Stream alternative OTP format (tab-delimited or fixed-width)"""
+        if diagnostics is None:
+            diagnostics = self._start_diagnostics(file_path)
+        
+        syntax = byte_syntax(encoding)
+        if syntax is None:
+            yield from self._iter_alternative_text(file_path, encoding, diagnostics)
+            return
+        
         try:
-            # Common OTP CSV column names (multiple variations)
-            date_keys = ['Dátum', 'Könyvelés dátuma', 'Tranzakció dátuma', 'datum']
-            desc_keys = ['Közlemény', 'Leírás', 'Megnevezés', 'kozlemeny', 'leiras']
-            amount_keys = ['Összeg', 'Terhelés', 'Jóváírás', 'osszeg']
-            balance_keys = ['Egyenleg', 'Záró egyenleg', 'egyenleg']
+            with open(file_path, 'rb') as f:
+                if not os.fstat(f.fileno()).st_size:
+                    return
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    yield from self._scan_alternative_format(data, syntax)
+        
+        except Exception as e:
+            diagnostics.report(READ_ERROR, f"Error parsing alternative format: {e}")
+    
+    def _scan_alternative_format(self, data, syntax: ByteSyntax) -> Iterator[Transaction]:
+        """Scan raw statement bytes, decoding only the fields of a record"""
+        start = len(syntax.bom) if syntax.bom and data[:len(syntax.bom)] == syntax.bom else 0
+        encoding = syntax.encoding
+        parse_amount = AmountConverter(self.NUMBER_STYLE)
+        data_started = False
+        
+        for line in iter_lines(data, start):
+            line = syntax.strip(line)
             
-            # Extract date
-            date_str = self._find_value(row, date_keys)
-            if not date_str:
-                return None
+            if not line:
+                continue
             
-            transaction_date = self._parse_date(date_str)
-            if not transaction_date:
-                return None
+            # Skip header lines until the first one starting with a date
+            # Format: DATE | DESCRIPTION | AMOUNT | BALANCE
+            if not data_started:
+                if not ALTERNATIVE_DATE.match(line):
+                    continue
+                data_started = True
             
-            # Extract description
-            description = self._find_value(row, desc_keys) or "N/A"
+            # Try tab-delimited, then multiple spaces as delimiter
+            parts = line.split(b'\t')
+            if len(parts) < 3:
+                parts = syntax.split_runs(line)
             
-            # Extract amount (handle debit/credit separately)
-            amount = 0.0
+            if len(parts) < 3:
+                continue
             
-            # Try to get unified amount first
-            amount_str = self._find_value(row, ['Összeg', 'osszeg'])
-            if amount_str:
-                amount = self._parse_amount(amount_str)
-            else:
-                # Check debit/credit columns
-                debit = self._find_value(row, ['Terhelés', 'terheles'])
-                credit = self._find_value(row, ['Jóváírás', 'jovairas'])
+            try:
+                date = self._parse_date(parts[0].decode(encoding))
+                amount = parse_amount(parts[2].decode(encoding))
                 
-                if debit:
-                    amount = -abs(self._parse_amount(debit))
-                elif credit:
-                    amount = abs(self._parse_amount(credit))
-            
-            # Extract balance
-            balance_str = self._find_value(row, balance_keys)
-            balance = self._parse_amount(balance_str) if balance_str else None
-            
-            # Clean description
-            description = self._clean_description(description)
-            
-            return Transaction(
-                date=transaction_date,
-                description=description,
-                amount=amount,
-                currency="HUF",
-                balance=balance,
-                bank=self.bank_name,
-                raw_data=row
-            )
+                if not date or amount == 0:
+                    continue
+                
+                balance = parse_amount(parts[3].decode(encoding)) if len(parts) > 3 else None
+                
+                transaction = Transaction(
+                    date=date,
+                    description=self._clean_description(parts[1].decode(encoding)),
+                    amount=amount,
+                    currency="HUF",
+                    balance=balance,
+                    bank=self.bank_name
+                )
+            except:
+                continue
             
-        except Exception as e:
-            print(f"Error parsing row: {e}")
-            return None
+            yield transaction
     
-    def _parse_alternative_format(self, file_path: str) -> List[Transaction]:
-        """Parse alternative OTP format (tab-delimited or fixed-width)"""
-        transactions = []
-        
+    def _iter_alternative_text(self, file_path: str, encoding: str, diagnostics: Diagnostics) -> Iterator[Transaction]:
+        """Stream the alternative format in encodings the byte scanner doesn't support"""
+        parse_amount = AmountConverter(self.NUMBER_STYLE)
         try:
-            with open(file_path, 'r', encoding='windows-1250') as f:
-                lines = f.readlines()
-                
+            with open(file_path, 'r', encoding=encoding) as f:
                 # Skip header lines
                 data_started = False
-                for line in lines:
+                for line in f:
                     line = line.strip()
                     
                     if not line:
@@ -167,84 +345,31 @@ class OTPParser(BaseParser):
                             try:
                                 date = self._parse_date(parts[0])
                                 description = parts[1] if len(parts) > 1 else "N/A"
-                                amount = self._parse_amount(parts[2]) if len(parts) > 2 else 0
-                                balance = self._parse_amount(parts[3]) if len(parts) > 3 else None
+                                amount = parse_amount(parts[2]) if len(parts) > 2 else 0
+                                balance = parse_amount(parts[3]) if len(parts) > 3 else None
+                                
+                                if not date or amount == 0:
+                                    continue
                                 
-                                if date and amount != 0:
-                                    transactions.append(Transaction(
-                                        date=date,
-                                        description=self._clean_description(description),
-                                        amount=amount,
-                                        currency="HUF",
-                                        balance=balance,
-                                        bank=self.bank_name
-                                    ))
+                                transaction = Transaction(
+                                    date=date,
+                                    description=self._clean_description(description),
+                                    amount=amount,
+                                    currency="HUF",
+                                    balance=balance,
+                                    bank=self.bank_name
+                                )
                             except:
                                 continue
+                            
+                            yield transaction
                 
         except Exception as e:
-            print(f"Error parsing alternative format: {e}")
-        
-        return transactions
-    
-    def _find_value(self, row: dict, keys: list) -> Optional[str]:
-        """Find value by trying multiple key variations"""
-        for key in keys:
-            # Try exact match
-            if key in row and row[key]:
-                return row[key]
-            
-            # Try case-insensitive match
-            for row_key in row.keys():
-                if row_key.lower() == key.lower() and row[row_key]:
-                    return row[row_key]
-        
-        return None
+            diagnostics.report(READ_ERROR, f"Error parsing alternative format: {e}")
     
     def _parse_date(self, date_str: str) -> Optional[datetime]:
         """Parse date string with multiple format attempts"""
-        if not date_str:
-            return None
-        
-        date_str = date_str.strip()
-        
-        for date_format in self.date_formats:
-            try:
-                return datetime.strptime(date_str, date_format)
-            except ValueError:
-                continue
-        
-        # Try to extract date with regex
-        date_pattern = r'(\d{4})[\.\-/](\d{1,2})[\.\-/](\d{1,2})'
-        match = re.search(date_pattern, date_str)
-        if match:
-            try:
-                year, month, day = match.groups()
-                return datetime(int(year), int(month), int(day))
-            except:
-                pass
-        
-        return None
-    
-    def _parse_amount(self, amount_str: str) -> float:
-        """Parse amount string to float"""
-        if not amount_str:
-            return 0.0
-        
-        # Clean amount string
-        amount_str = amount_str.strip()
-        
-        # Remove currency symbols and spaces
-        amount_str = re.sub(r'[^\d\-\+\.,]', '', amount_str)
-        
-        # Handle Hungarian number format (space as thousand separator, comma as decimal)
-        amount_str = amount_str.replace(' ', '')  # Remove thousand separators
-        amount_str = amount_str.replace(',', '.')  # Convert decimal comma to point
-        
-        try:
-            return float(amount_str)
-        except ValueError:
-            return 0.0
+        return self.date_converter(date_str)
     
     def _clean_description(self, description: str) -> str:
         """Clean and normalize description"""
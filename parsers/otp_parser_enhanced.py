@@ -3,11 +3,30 @@ Enhanced OTP Bank PDF Parser
 Based on real OTP bankszámlakivonat structure from 2025
 """
 
+import os
 import re
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 from dataclasses import dataclass
 
+try:
+    from category_matcher import CategoryMatcher
+    from converters import AmountConverter
+    from merchant_normalizer import MerchantNormalizer
+    from worker_pool import TASKS_PER_WORKER, submit_bounded
+except ImportError:  # imported as parsers.otp_parser_enhanced
+    from .category_matcher import CategoryMatcher
+    from .converters import AmountConverter
+    from .merchant_normalizer import MerchantNormalizer
+    from .worker_pool import TASKS_PER_WORKER, submit_bounded
+
+try:
+    import pypdf
+except ImportError:  # pypdf is optional, page texts can be passed to parse_pages
+    pypdf = None
+
 
 @dataclass
 class OTPTransaction:
@@ -23,32 +42,72 @@ class OTPTransaction:
     category: Optional[str] = None
 
 
+# Line token kinds produced by OTPPDFParser._classify_line
+SECTION_START = 'section_start'
+SECTION_END = 'section_end'
+HEADER = 'header'
+BLANK = 'blank'
+RECORD = 'record'
+CONTINUATION = 'continuation'
+PAGE_FOOTER = 'page_footer'
+PAGE_BREAK = 'page_break'  # Inserted between pages by the page pipeline
+
+SECTION_START_MARKERS = ('FORGALMAK', 'KÖNYVELÉS/ÉRTÉKNAP')
+SECTION_END_MARKERS = (
+    'IDÕSZAK:', 'JÓVÁÍRÁSOK ÖSSZESEN:', 'TERHELÉSEK ÖSSZESEN:',
+    'ZÁRÓ EGYENLEG', 'TOVÁBBI SZÁMLAINFORMÁCIÓK'
+)
+# Page numbering at the bottom of every page
+PAGE_FOOTER_MARKERS = ('LAP/LAP',)
+HEADER_MARKERS = ('MEGNEVEZÉS', 'ÖSSZEG', 'NYITÓ EGYENLEG')
+
+# Booking date and value date opening every transaction line
+RECORD_HEAD = re.compile(r'(\d{2}\.\d{2}\.\d{2})\s+(\d{2}\.\d{2}\.\d{2})\s+')
+
+# Rest of the line after the transaction keyword
+CARD_RECORD = re.compile(
+    r',\s+(\d+),\s+(\d+),\s+Tranzakció:\s+\d{2}\.\d{2}\.\d{2},\s+(.+?)\s+([-]?\d+(?:\.\d{3})*(?:,\d{2})?)'
+)
+MEMO_RECORD = re.compile(r',\s+(.+?)\s+([-]?\d+(?:\.\d{3})*(?:,\d{2})?)')
+
+RECORD_KEYWORDS = (
+    ('VÁSÁRLÁS KÁRTYÁVAL', CARD_RECORD),
+    ('NAPKÖZBENI ÁTUTALÁS', MEMO_RECORD),
+    ('ADOMÁNY', MEMO_RECORD),
+)
+
+# Fallthrough for lines without one of the keywords above
+FEE_RECORD = re.compile(r'(OTPdirekt HAVIDÍJ\*|ÉRTÉKPAPÍR SZLADÍJ|.*DÍJ\*?)\s+([-]?\d+)')
+
+EUR_CONTINUATION = re.compile(r'([\d,]+)EUR\s+(\d+),?\s*([-]?\d+(?:\.\d{3})*(?:,\d{2})?)')
+
+# Pages classified per worker task
+PAGES_PER_TASK = 8
+# Statements shorter than this are parsed in-process unless workers is
+# given: starting a pool costs more than classifying a few pages
+POOL_MIN_PAGES = 64
+
+# Page texts, or (first page, end page) of the PDF being read
+PageTask = Union[List[str], Tuple[int, int]]
+
+
+@dataclass
+class LineToken:
+    """A classified line of statement text"""
+    kind: str
+    line: str
+    transaction: Optional[OTPTransaction] = None  # Parsed RECORD line
+    eur_amount: Optional[str] = None  # HUF amount if the line is an EUR row
+
+
 class OTPPDFParser:
     """Enhanced OTP PDF parser for 2025 format"""
     
     def __init__(self):
         self.transactions: List[OTPTransaction] = []
         
-        # Transaction patterns for OTP 2025 format
-        self.transaction_patterns = [
-            # VÁSÁRLÁS KÁRTYÁVAL pattern
-            r'(\d{2}\.\d{2}\.\d{2})\s+(\d{2}\.\d{2}\.\d{2})\s+VÁSÁRLÁS KÁRTYÁVAL,\s+(\d+),\s+(\d+),\s+Tranzakció:\s+\d{2}\.\d{2}\.\d{2},\s+(.+?)\s+([-]?\d+(?:\.\d{3})*(?:,\d{2})?|\d+\.\d{3}EUR)',
-            
-            # NAPKÖZBENI ÁTUTALÁS pattern
-            r'(\d{2}\.\d{2}\.\d{2})\s+(\d{2}\.\d{2}\.\d{2})\s+NAPKÖZBENI ÁTUTALÁS,\s+(.+?)\s+([-]?\d+(?:\.\d{3})*(?:,\d{2})?)',
-            
-            # OTPdirekt HAVIDÍJ pattern
-            r'(\d{2}\.\d{2}\.\d{2})\s+(\d{2}\.\d{2}\.\d{2})\s+OTPdirekt HAVIDÍJ\*\s+([-]?\d+)',
-            
-            # ADOMÁNY pattern
-            r'(\d{2}\.\d{2}\.\d{2})\s+(\d{2}\.\d{2}\.\d{2})\s+ADOMÁNY,\s+(.+?)\s+([-]?\d+(?:\.\d{3})*(?:,\d{2})?)',
-            
-            # ÉRTÉKPAPÍR SZLADÍJ pattern
-            r'(\d{2}\.\d{2}\.\d{2})\s+(\d{2}\.\d{2}\.\d{2})\s+ÉRTÉKPAPÍR SZLADÍJ,\s+(.+?)\s+([-]?\d+)',
-            
-            # General bank fees pattern
-            r'(\d{2}\.\d{2}\.\d{2})\s+(\d{2}\.\d{2}\.\d{2})\s+([A-ZÁÖÜÓŐŰÍ/\s]+DÍJ\*?)\s+([-]?\d+)',
-        ]
+        # Statement amounts always group thousands with dots: -2.714, 448.599
+        self.amount_converter = AmountConverter('hu', detect=False)
         
         # Merchant name cleaning patterns
         self.merchant_patterns = [
@@ -74,6 +133,19 @@ class OTPPDFParser:
             (r'(.+?)\s+\d+,\d+EUR.*', r'\1'),
         ]
         
+        # Case-sensitive clean-up applied after the merchant patterns
+        self.merchant_suffix_patterns = [
+            (r'\s+-[A-Z]+.*$', ''),  # Remove -GOOGLE etc.
+            (r'\s+\d+,\d+EUR.*$', ''),  # Remove EUR amounts
+            (r'\s+\d+\.\d+.*$', ''),  # Remove numbers at end
+        ]
+        
+        self.merchant_normalizer = MerchantNormalizer(
+            [(pattern, replacement, re.IGNORECASE) for pattern, replacement in self.merchant_patterns] +
+            [(pattern, replacement, 0) for pattern, replacement in self.merchant_suffix_patterns],
+            finalize=self._pick_merchant_words
+        )
+        
         # Category mapping for Hungarian merchants
         self.category_mapping = {
             # Food & Grocery
@@ -130,163 +202,265 @@ class OTPPDFParser:
             'WWF': '💚 Jótékonyság',
             'UNICEF': '💚 Jótékonyság',
         }
-
-    def parse_pdf_content(self, content: str) -> List[OTPTransaction]:
-        """Parse OTP PDF content and extract transactions"""
         
-        # Split content into lines
-        lines = content.split('\n')
+        # Keyword fallbacks, checked in order after the direct mapping
+        self.category_keywords = [
+            ('🍔 Élelmiszer', ['LIDL', 'TESCO', 'CBA', 'AUCHAN', 'SPAR', 'PENNY']),
+            ('🚗 Közlekedés', ['MOL', 'OMV', 'SHELL', 'BENZIN']),
+            ('🏠 Rezsi', ['MVM', 'ELMŰ', 'ÉMASZ', 'FŐTÁV']),
+            ('🎬 Szórakozás', ['NETFLIX', 'HBO', 'SPOTIFY', 'DISNEY']),
+            ('🛍️ Vásárlás', ['H&M', 'ZARA', 'IKEA', 'MÖMAX']),
+            ('📱 Alkalmazások', ['GOOGLE']),
+            ('💳 Online fizetés', ['PAYPAL']),
+            ('🏦 Banki díj', ['OTP', 'DÍJ', 'HAVIDÍJ']),
+            ('💚 Jótékonyság', ['ADOMÁNY', 'WWF', 'UNICEF']),
+        ]
         
-        # Find the transaction section
-        transaction_section = self._extract_transaction_section(lines)
+        self.category_matcher = self._build_category_matcher()
+    
+    def _build_category_matcher(self, user_rules: Optional[List[Dict]] = None) -> CategoryMatcher:
+        """Compile built-in mapping, keyword fallbacks and user rules into one matcher"""
+        matcher = CategoryMatcher(self.category_mapping.items(), default='📌 Egyéb')
         
-        if not transaction_section:
-            return []
+        for category, keywords in self.category_keywords:
+            for keyword in keywords:
+                matcher.add_rule(keyword, category)
         
-        # Parse transactions from the section
-        transactions = self._parse_transactions(transaction_section)
+        if user_rules:
+            matcher.add_user_rules(user_rules)
         
-        # Clean and categorize transactions
-        for transaction in transactions:
-            transaction.merchant = self._clean_merchant_name(transaction.description)
-            transaction.category = self._suggest_category(transaction.merchant)
+        matcher.compile()
+        return matcher
+    
+    def load_category_rules(self, rules: List[Dict]) -> None:
+        """Add user-defined category_rules rows, they take precedence over built-ins"""
+        self.category_matcher = self._build_category_matcher(rules)
+
+    def parse_pdf_content(self, content: str) -> List[OTPTransaction]:
+        """Parse OTP PDF content and extract transactions"""
+        
+        # Classify each line once and feed the tokens to the state machine
+        tokens = (self._classify_line(line) for line in content.split('\n'))
+        transactions = [self._complete(transaction) for transaction in self._lex(tokens)]
         
         self.transactions = transactions
         return transactions
 
-    def _extract_transaction_section(self, lines: List[str]) -> str:
-        """Extract the FORGALMAK section from PDF content"""
+    def parse_pages(self, pages: Iterable[str], workers: Optional[int] = None,
+                    pages_per_task: int = PAGES_PER_TASK) -> Iterator[OTPTransaction]:
+        """
+        Parse a statement given as per-page texts, classifying pages in parallel
+        
+        Unlike parse_pdf_content, every FORGALMAK section is read, so one
+        document may hold several accounts or periods. Lines are classified
+        in a process pool, a few tasks of pages_per_task pages at a time,
+        while this process assembles the records in page order; pages are
+        read from the iterable only as workers free up, so memory stays
+        bounded for archives of any size.
+        
+        Args:
+            pages: Text of every page, in order
+            workers: Number of worker processes, 1 classifies in this
+                process. By default statements of POOL_MIN_PAGES pages or
+                more use one worker per CPU, shorter ones none
+            pages_per_task: Pages sent to a worker at once
+            
+        Yields:
+            Transactions in statement order
+        """
+        tasks = _chunked(pages, pages_per_task)
+        if workers is None:
+            # Only look as far ahead as needed to tell whether the statement is long
+            head = []
+            for task in tasks:
+                head.append(task)
+                if len(head) * pages_per_task >= POOL_MIN_PAGES:
+                    break
+            page_count = sum(len(task) for task in head)
+            tasks = chain(head, tasks)
+            workers = _default_workers(page_count)
+        yield from self._parse_tasks(tasks, workers)
+
+    def parse_pdf(self, file_path: str, workers: Optional[int] = None,
+                  pages_per_task: int = PAGES_PER_TASK) -> Iterator[OTPTransaction]:
+        """
+        Parse an OTP PDF statement page by page, see parse_pages
+        
+        Workers open the PDF once each and extract the text of their own
+        pages, so the document's text is never held in one piece. Requires
+        pypdf.
+        """
+        if pypdf is None:
+            raise ImportError("pypdf is required to read PDF files, pass page texts to parse_pages instead")
+        
+        pdf_pages = pypdf.PdfReader(file_path).pages
+        page_count = len(pdf_pages)
+        tasks = (
+            (start, min(start + pages_per_task, page_count))
+            for start in range(0, page_count, pages_per_task)
+        )
+        if workers is None:
+            workers = _default_workers(page_count)
+        yield from self._parse_tasks(tasks, workers, file_path, pdf_pages)
+
+    def _parse_tasks(self, tasks: Iterable[PageTask], workers: int, file_path: Optional[str] = None,
+                     pdf_pages: Optional[Sequence] = None) -> Iterator[OTPTransaction]:
+        """Classify page tasks, in a pool when workers > 1, and lex them in order"""
+        if workers <= 1:
+            classified = (self._classify_pages(task, pdf_pages) for task in tasks)
+        else:
+            classified = _classify_in_pool(tasks, workers, file_path)
+        
+        for transaction in self._lex(_join_pages(classified), all_sections=True):
+            yield self._complete(transaction)
+
+    def _classify_pages(self, task: PageTask, pdf_pages: Optional[Sequence] = None) -> List[List[LineToken]]:
+        """Tokens of every page of a task, page ranges are extracted from pdf_pages"""
+        if isinstance(task, tuple):
+            start, end = task
+            texts: Sequence[str] = [pdf_pages[number].extract_text() or '' for number in range(start, end)]
+        else:
+            texts = task
+        return [[self._classify_line(line) for line in text.split('\n')] for text in texts]
+
+    def _complete(self, transaction: OTPTransaction) -> OTPTransaction:
+        """Clean the merchant name (unless a worker did) and categorize a lexed transaction"""
+        if transaction.merchant is None:
+            transaction.merchant = self._clean_merchant_name(transaction.description)
+        transaction.category = self._suggest_category(transaction.merchant)
+        return transaction
+
+    def _classify_line(self, line: str) -> LineToken:
+        """Turn a single line into a token, independently of its neighbours"""
         
-        transaction_lines = []
-        in_transaction_section = False
+        # Start of transaction section
+        if any(marker in line for marker in SECTION_START_MARKERS):
+            return LineToken(SECTION_START, line)
         
-        for line in lines:
-            # Start of transaction section
-            if 'FORGALMAK' in line or 'KÖNYVELÉS/ÉRTÉKNAP' in line:
-                in_transaction_section = True
-                continue
-            
-            # End markers
-            if in_transaction_section and any(marker in line for marker in [
-                'IDÕSZAK:', 'JÓVÁÍRÁSOK ÖSSZESEN:', 'TERHELÉSEK ÖSSZESEN:', 
-                'ZÁRÓ EGYENLEG', 'LAP/LAP', 'TOVÁBBI SZÁMLAINFORMÁCIÓK'
-            ]):
-                break
-            
-            # Collect transaction lines
-            if in_transaction_section and line.strip():
-                # Skip header lines
-                if not any(skip in line for skip in ['MEGNEVEZÉS', 'ÖSSZEG', 'NYITÓ EGYENLEG']):
-                    transaction_lines.append(line)
+        if any(marker in line for marker in SECTION_END_MARKERS):
+            return LineToken(SECTION_END, line)
         
-        return '\n'.join(transaction_lines)
-
-    def _parse_transactions(self, content: str) -> List[OTPTransaction]:
-        """Parse individual transactions from content"""
+        if any(marker in line for marker in PAGE_FOOTER_MARKERS):
+            return LineToken(PAGE_FOOTER, line)
         
-        transactions = []
-        lines = content.split('\n')
+        stripped = line.strip()
+        if not stripped:
+            return LineToken(BLANK, line)
         
-        i = 0
-        while i < len(lines):
-            line = lines[i].strip()
-            
-            if not line:
-                i += 1
-                continue
-            
-            # Try to match transaction patterns
-            transaction = self._parse_transaction_line(line, lines, i)
+        # Skip header lines
+        if any(skip in line for skip in HEADER_MARKERS):
+            return LineToken(HEADER, line)
+        
+        # HUF amount of an EUR row, used by the card record before this line
+        eur_amount = None
+        if 'EUR' in stripped:
+            eur_match = EUR_CONTINUATION.search(stripped)
+            if eur_match:
+                eur_amount = eur_match.group(3)
+        
+        transaction = self._parse_record(stripped)
+        kind = RECORD if transaction else CONTINUATION
+        return LineToken(kind, line, transaction, eur_amount)
+
+    def _parse_record(self, line: str) -> Optional[OTPTransaction]:
+        """Parse a transaction line by dispatching on the keyword after the dates"""
+        
+        head = RECORD_HEAD.search(line)
+        while head:
+            position = head.end()
+            for keyword, pattern in RECORD_KEYWORDS:
+                if not line.startswith(keyword, position):
+                    continue
+                match = pattern.match(line, position + len(keyword))
+                if not match:
+                    break
+                if pattern is CARD_RECORD:
+                    card_number, transaction_id, description, amount_str = match.groups()
+                else:
+                    card_number = transaction_id = None
+                    description, amount_str = match.groups()
+                return self._make_transaction(head, description, amount_str, card_number, transaction_id)
             
-            if transaction:
-                transactions.append(transaction)
+            # Bank fees (OTPdirekt HAVIDÍJ*, ÉRTÉKPAPÍR SZLADÍJ, ...)
+            match = FEE_RECORD.match(line, position)
+            if match:
+                return self._make_transaction(head, match.group(1), match.group(2))
             
-            i += 1
+            head = RECORD_HEAD.search(line, head.start() + 1)
         
-        return transactions
+        return None
 
-    def _parse_transaction_line(self, line: str, all_lines: List[str], line_index: int) -> Optional[OTPTransaction]:
-        """Parse a single transaction line"""
-        
-        # Card transaction pattern (most common)
-        card_pattern = r'(\d{2}\.\d{2}\.\d{2})\s+(\d{2}\.\d{2}\.\d{2})\s+VÁSÁRLÁS KÁRTYÁVAL,\s+(\d+),\s+(\d+),\s+Tranzakció:\s+\d{2}\.\d{2}\.\d{2},\s+(.+?)\s+([-]?\d+(?:\.\d{3})*(?:,\d{2})?)'
-        
-        match = re.search(card_pattern, line)
-        if match:
-            booking_date = self._parse_date(match.group(1))
-            value_date = self._parse_date(match.group(2))
-            card_number = match.group(3)
-            transaction_id = match.group(4)
-            description = match.group(5).strip()
-            amount_str = match.group(6)
+    def _make_transaction(self, head, description: str, amount_str: str,
+                          card_number: Optional[str] = None,
+                          transaction_id: Optional[str] = None) -> OTPTransaction:
+        return OTPTransaction(
+            booking_date=self._parse_date(head.group(1)),
+            value_date=self._parse_date(head.group(2)),
+            description=description.strip(),
+            amount=self._parse_amount(amount_str),
+            transaction_id=transaction_id,
+            card_number=card_number
+        )
+
+    def _lex(self, tokens: Iterable[LineToken], all_sections: bool = False) -> Iterator[OTPTransaction]:
+        """
+        Assemble transactions from line tokens in a single linear scan
+        
+        Only the first FORGALMAK section is read unless all_sections is
+        set, then every section is, and page footers don't end one. A card
+        record is held back until the next collected line, which may be its
+        EUR row carrying the HUF amount that replaces the one on the record
+        line. Other continuation lines (transfer memos and the like) are
+        consumed. After a PAGE_BREAK, continuation lines before the first
+        record or EUR row of the page are page furniture and don't release
+        a held-back card record, so its EUR row may be on the next page.
+        """
+        in_section = False
+        page_start = False
+        pending: Optional[OTPTransaction] = None
+        
+        for token in tokens:
+            kind = token.kind
+            if kind == PAGE_BREAK:
+                page_start = True
+                continue
             
-            # Handle EUR amounts (check next lines for EUR amounts)
-            if line_index + 1 < len(all_lines):
-                next_line = all_lines[line_index + 1].strip()
-                eur_match = re.search(r'([\d,]+)EUR\s+(\d+),?\s*([-]?\d+(?:\.\d{3})*(?:,\d{2})?)', next_line)
-                if eur_match:
-                    amount_str = eur_match.group(3)  # Use HUF amount
+            if kind == SECTION_START:
+                in_section = True
+                continue
             
-            amount = self._parse_amount(amount_str)
+            if not in_section or kind == BLANK or kind == HEADER:
+                continue
             
-            return OTPTransaction(
-                booking_date=booking_date,
-                value_date=value_date,
-                description=description,
-                amount=amount,
-                transaction_id=transaction_id,
-                card_number=card_number
-            )
-        
-        # Bank transfer pattern
-        transfer_pattern = r'(\d{2}\.\d{2}\.\d{2})\s+(\d{2}\.\d{2}\.\d{2})\s+NAPKÖZBENI ÁTUTALÁS,\s+(.+?)\s+([-]?\d+(?:\.\d{3})*(?:,\d{2})?)'
-        match = re.search(transfer_pattern, line)
-        if match:
-            booking_date = self._parse_date(match.group(1))
-            value_date = self._parse_date(match.group(2))
-            description = match.group(3).strip()
-            amount = self._parse_amount(match.group(4))
+            if kind == SECTION_END or kind == PAGE_FOOTER:
+                if not all_sections:
+                    break
+                if kind == SECTION_END:
+                    in_section = False
+                    if pending is not None:
+                        yield pending
+                        pending = None
+                continue
             
-            return OTPTransaction(
-                booking_date=booking_date,
-                value_date=value_date,
-                description=description,
-                amount=amount
-            )
-        
-        # Bank fee pattern
-        fee_pattern = r'(\d{2}\.\d{2}\.\d{2})\s+(\d{2}\.\d{2}\.\d{2})\s+(OTPdirekt HAVIDÍJ\*|ÉRTÉKPAPÍR SZLADÍJ|.*DÍJ\*?)\s+([-]?\d+)'
-        match = re.search(fee_pattern, line)
-        if match:
-            booking_date = self._parse_date(match.group(1))
-            value_date = self._parse_date(match.group(2))
-            description = match.group(3).strip()
-            amount = self._parse_amount(match.group(4))
+            if page_start:
+                if kind == CONTINUATION and token.eur_amount is None:
+                    continue
+                page_start = False
             
-            return OTPTransaction(
-                booking_date=booking_date,
-                value_date=value_date,
-                description=description,
-                amount=amount
-            )
-        
-        # Donation pattern
-        donation_pattern = r'(\d{2}\.\d{2}\.\d{2})\s+(\d{2}\.\d{2}\.\d{2})\s+ADOMÁNY,\s+(.+?)\s+([-]?\d+(?:\.\d{3})*(?:,\d{2})?)'
-        match = re.search(donation_pattern, line)
-        if match:
-            booking_date = self._parse_date(match.group(1))
-            value_date = self._parse_date(match.group(2))
-            description = match.group(3).strip()
-            amount = self._parse_amount(match.group(4))
+            if pending is not None:
+                if token.eur_amount is not None:
+                    pending.amount = self._parse_amount(token.eur_amount)
+                yield pending
+                pending = None
             
-            return OTPTransaction(
-                booking_date=booking_date,
-                value_date=value_date,
-                description=description,
-                amount=amount
-            )
-        
-        return None
+            if kind == RECORD:
+                if token.transaction.card_number is not None:
+                    pending = token.transaction
+                else:
+                    yield token.transaction
+        
+        if pending is not None:
+            yield pending
 
     def _parse_date(self, date_str: str) -> str:
         """Parse OTP date format (25.07.28) to ISO format"""
@@ -308,40 +482,16 @@ class OTPPDFParser:
 
     def _parse_amount(self, amount_str: str) -> float:
         """Parse Hungarian amount format"""
-        if not amount_str:
-            return 0.0
-        
-        # Clean the amount string
-        # Remove spaces and handle negative amounts
-        cleaned = amount_str.strip()
-        
-        # Handle formats like: -2.714, 448.599, -1.000
-        cleaned = cleaned.replace(' ', '')
-        
-        # Convert comma to dot for decimal places
-        if ',' in cleaned:
-            cleaned = cleaned.replace(',', '.')
-        
-        try:
-            return float(cleaned)
-        except ValueError:
-            return 0.0
+        return self.amount_converter(amount_str)
 
     def _clean_merchant_name(self, description: str) -> str:
         """Clean and extract merchant name from description"""
+        return self.merchant_normalizer.normalize(description)
+
+    @staticmethod
+    def _pick_merchant_words(merchant: str, description: str) -> str:
+        """Take the first meaningful words of a cleaned merchant name"""
         
-        merchant = description
-        
-        # Apply merchant patterns
-        for pattern, replacement in self.merchant_patterns:
-            merchant = re.sub(pattern, replacement, merchant, flags=re.IGNORECASE)
-        
-        # Remove common suffixes and clean up
-        merchant = re.sub(r'\s+-[A-Z]+.*$', '', merchant)  # Remove -GOOGLE etc.
-        merchant = re.sub(r'\s+\d+,\d+EUR.*$', '', merchant)  # Remove EUR amounts
-        merchant = re.sub(r'\s+\d+\.\d+.*$', '', merchant)  # Remove numbers at end
-        
-        # Take first meaningful part
         words = merchant.split()
         if len(words) > 0:
             # For single word merchants, return as is
@@ -360,35 +510,106 @@ class OTPPDFParser:
 
     def _suggest_category(self, merchant: str) -> str:
         """Suggest category based on merchant name"""
-        
-        merchant_upper = merchant.upper()
-        
-        # Direct match
-        for known_merchant, category in self.category_mapping.items():
-            if known_merchant.upper() in merchant_upper:
-                return category
-        
-        # Keyword-based matching
-        if any(food in merchant_upper for food in ['LIDL', 'TESCO', 'CBA', 'AUCHAN', 'SPAR', 'PENNY']):
-            return '🍔 Élelmiszer'
-        elif any(fuel in merchant_upper for fuel in ['MOL', 'OMV', 'SHELL', 'BENZIN']):
-            return '🚗 Közlekedés'
-        elif any(util in merchant_upper for util in ['MVM', 'ELMŰ', 'ÉMASZ', 'FŐTÁV']):
-            return '🏠 Rezsi'
-        elif any(stream in merchant_upper for stream in ['NETFLIX', 'HBO', 'SPOTIFY', 'DISNEY']):
-            return '🎬 Szórakozás'
-        elif any(shop in merchant_upper for shop in ['H&M', 'ZARA', 'IKEA', 'MÖMAX']):
-            return '🛍️ Vásárlás'
-        elif 'GOOGLE' in merchant_upper:
-            return '📱 Alkalmazások'
-        elif 'PAYPAL' in merchant_upper:
-            return '💳 Online fizetés'
-        elif any(bank in merchant_upper for bank in ['OTP', 'DÍJ', 'HAVIDÍJ']):
-            return '🏦 Banki díj'
-        elif 'ADOMÁNY' in merchant_upper or any(charity in merchant_upper for charity in ['WWF', 'UNICEF']):
-            return '💚 Jótékonyság'
-        
-        return '📌 Egyéb'
+        return self.category_matcher.match(merchant)
+    
+    def categorize(self, transactions: List[OTPTransaction]) -> List[str]:
+        """Assign categories to many transactions in one go"""
+        return self.category_matcher.categorize(transactions, overwrite=True)
+
+
+def _chunked(pages: Iterable[str], size: int) -> Iterator[List[str]]:
+    chunk = []
+    for page in pages:
+        chunk.append(page)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _join_pages(classified: Iterable[List[List[LineToken]]]) -> Iterator[LineToken]:
+    """Concatenate page tokens with a PAGE_BREAK between pages"""
+    first = True
+    for task_pages in classified:
+        for page in task_pages:
+            if not first:
+                yield LineToken(PAGE_BREAK, '')
+            first = False
+            yield from page
+
+
+def _default_workers(page_count: int) -> int:
+    """One worker per CPU for long statements, in-process parsing otherwise"""
+    if page_count < POOL_MIN_PAGES:
+        return 1
+    return os.cpu_count() or 1
+
+
+def _classify_in_pool(tasks: Iterable[PageTask], workers: int,
+                      file_path: Optional[str] = None) -> Iterator[List[List[LineToken]]]:
+    """
+    Classify tasks in a process pool, yielding results in task order
+    
+    At most TASKS_PER_WORKER tasks per worker are submitted ahead of the
+    one being consumed, unlike Executor.map, which submits every task up
+    front. Page range tasks are read from file_path.
+    """
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(file_path,))
+    try:
+        tasks = ((task,) for task in tasks)
+        for _, future in submit_bounded(pool, _classify_pages_in_worker, tasks, workers, in_order=True):
+            yield _unpack_pages(future.result())
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+# A token as sent back by a worker: (kind, eur_amount, transaction fields)
+PackedToken = Tuple[str, Optional[str], Optional[tuple]]
+
+_worker_parser: Optional[OTPPDFParser] = None
+_worker_pdf_pages: Optional[Sequence] = None
+
+
+def _init_worker(file_path: Optional[str] = None) -> None:
+    """Give each worker process its own parser, and open the PDF being read once"""
+    global _worker_parser, _worker_pdf_pages
+    _worker_parser = OTPPDFParser()
+    _worker_pdf_pages = pypdf.PdfReader(file_path).pages if file_path is not None else None
+
+
+def _classify_pages_in_worker(task: PageTask) -> List[List[PackedToken]]:
+    """
+    Process pool entry point, each worker classifies with its own parser
+    
+    Tokens go back as plain tuples without their line text, and blank and
+    header lines (always skipped by the lexer) not at all: unpickling
+    dataclasses would make the parent the bottleneck. Merchant names are
+    cleaned here too, categories are left to the parent's rules.
+    """
+    packed = []
+    for page in _worker_parser._classify_pages(task, _worker_pdf_pages):
+        page_tokens = []
+        for token in page:
+            if token.kind == BLANK or token.kind == HEADER:
+                continue
+            fields = None
+            transaction = token.transaction
+            if transaction is not None:
+                fields = (transaction.booking_date, transaction.value_date, transaction.description,
+                          transaction.amount, transaction.currency, transaction.transaction_id,
+                          transaction.card_number, _worker_parser._clean_merchant_name(transaction.description))
+            page_tokens.append((token.kind, token.eur_amount, fields))
+        packed.append(page_tokens)
+    return packed
+
+
+def _unpack_pages(packed: List[List[PackedToken]]) -> List[List[LineToken]]:
+    return [
+        [LineToken(kind, '', OTPTransaction(*fields) if fields is not None else None, eur_amount)
+         for kind, eur_amount, fields in page]
+        for page in packed
+    ]
 
 
 # Example usage and test
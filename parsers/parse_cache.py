@@ -0,0 +1,126 @@
+"""Content-addressed on-disk cache of parsed statements"""
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import List, Optional
+
+from base_parser import BaseParser, Transaction
+from columnar_file import load_transactions, save_transactions
+
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+CACHE_SUFFIX = '.batch'
+READ_CHUNK = 1024 * 1024
+
+
+@dataclass
+class CacheStats:
+    """Counters used to size the cache"""
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+    
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ParseCache:
+    """
+    Parsed transactions stored by file content digest and parser version
+    
+    Entries are columnar files (with raw_data), one per statement, so a
+    hit skips decoding and regex work entirely and only rebuilds
+    Transaction objects from the columns. The total size is
+    bounded and the least recently used entries are evicted first; recency
+    is the entry file's mtime, which is bumped on every hit. The size is
+    measured on the directory after every store, so the bound holds when
+    several processes (ParserFactory.parse_many workers) share the cache.
+    """
+    
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(entry.stat().st_size for entry in self._entries())
+    
+    def key(self, file_path: str, parser: BaseParser) -> str:
+        """Digest of the file content, the parser class and its version"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(READ_CHUNK), b''):
+                digest.update(chunk)
+        return f"{digest.hexdigest()}-{type(parser).__name__}-v{parser.VERSION}"
+    
+    def get(self, key: str) -> Optional[List[Transaction]]:
+        """Return the cached transactions or None on a miss"""
+        path = self._path(key)
+        try:
+            transactions = load_transactions(path)
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            self.stats.misses += 1
+            return None
+        
+        self.stats.hits += 1
+        return transactions
+    
+    def put(self, key: str, transactions: List[Transaction]) -> None:
+        """Store parsed transactions, evicting old entries if over the bound"""
+        path = self._path(key)
+        
+        # Write to a temporary file first so readers never see half an entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            save_transactions(transactions, tmp_path)
+            size = os.path.getsize(tmp_path)
+            if size > self.max_bytes:
+                os.remove(tmp_path)
+                return
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        
+        self.stats.stores += 1
+        self._evict()
+    
+    def clear(self) -> None:
+        for entry in self._entries():
+            os.remove(entry.path)
+        self.size = 0
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+    
+    def _entries(self) -> List[os.DirEntry]:
+        return [entry for entry in os.scandir(self.directory) if entry.name.endswith(CACHE_SUFFIX)]
+    
+    def _evict(self) -> None:
+        # Other processes may have stored or evicted entries since, the
+        # directory is the only shared truth
+        entries = []
+        for entry in self._entries():
+            try:
+                entries.append((entry.stat().st_mtime_ns, entry.stat().st_size, entry.path))
+            except OSError:  # Evicted by another process meanwhile
+                continue
+        self.size = sum(size for _, size, _ in entries)
+        if self.size <= self.max_bytes:
+            return
+        
+        for _, size, path in sorted(entries):
+            if self.size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.size -= size
+            self.stats.evictions += 1
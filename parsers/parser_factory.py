@@ -1,15 +1,60 @@
 """Factory pattern for selecting appropriate parser based on file"""
-from typing import Optional, List
+import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, Optional, List, Tuple
 from pathlib import Path
-from base_parser import BaseParser, Transaction
+from base_parser import BaseParser, Transaction, TransactionHistory, merchant_cache_info
+from diagnostics import CACHE_ERROR, NO_PARSER, PARSE_ERROR, DiagnosticHook, Diagnostics
+from format_probe import probe_file
+from instrumentation import NULL_STATS, PipelineStats
+from parse_cache import ParseCache
 from otp_parser import OTPParser
 from revolut_parser import RevolutParser
+from transaction_batch import TransactionBatch
+from transaction_store import TransactionStore
+from worker_pool import TASKS_PER_WORKER, submit_bounded
+
+
+logger = logging.getLogger(__name__)
+
+DETECTION_CACHE_SIZE = 4096
+
+
+@dataclass
+class StatementResult:
+    """Outcome of parsing one file of a parse_many batch"""
+    index: int  # Position of the file in the input
+    path: str
+    transactions: Optional[List[Transaction]] = None
+    error: Optional[str] = None
+    stats: Optional[Dict[str, Any]] = None  # Instrumentation snapshot of a worker
+    diagnostics: Optional[Diagnostics] = None
 
 
 class ParserFactory:
-    """Factory class for creating appropriate bank statement parser"""
+    """Factory class for creating appropriate bank statement parser
+    
+    Pass a PipelineStats as stats to time the stages of every parse
+    (detection, encoding sniffing, row decoding, dedupe, merging) and
+    count rows and cache hits; by default instrumentation is off.
     
-    def __init__(self):
+    Problems (unparseable rows, unreadable files) are collected in
+    self.diagnostics for the latest call instead of being printed;
+    diagnostics_hook (for example diagnostics.log_to(logger)) receives
+    the sampled ones as they are found.
+    """
+    
+    def __init__(self,
+                 cache: Optional[ParseCache] = None,
+                 stats: Optional[PipelineStats] = None,
+                 diagnostics_hook: Optional[DiagnosticHook] = None):
+        self.cache = cache
+        self.stats = stats if stats is not None else NULL_STATS
+        self.diagnostics_hook = diagnostics_hook
+        self.diagnostics = Diagnostics(hook=diagnostics_hook)
         self.parsers = [
             OTPParser(),
             RevolutParser(),
@@ -17,6 +62,16 @@ class ParserFactory:
             # RaiffeisenParser(),
             # ErsteParser(),
         ]
+        for parser in self.parsers:
+            parser.stats = self.stats
+            parser.diagnostics_hook = diagnostics_hook
+            date_converter = getattr(parser, 'date_converter', None)
+            if date_converter is not None:
+                self.stats.track_cache(f"dates[{parser.bank_name}]", date_converter.cache_info)
+        self.stats.track_cache('merchant', merchant_cache_info)
+        
+        # (path, size, mtime) -> (parser, encoding) decisions
+        self._detected: 'OrderedDict[Tuple[str, int, int], Tuple[Optional[BaseParser], Optional[str]]]' = OrderedDict()
     
     def get_parser(self, file_path: str) -> Optional[BaseParser]:
         """
@@ -28,11 +83,53 @@ class ParserFactory:
         Returns:
             Appropriate parser instance or None if no parser matches
         """
-        for parser in self.parsers:
-            if parser.validate_format(file_path):
-                return parser
+        return self.detect(file_path)[0]
+    
+    def detect(self, file_path: str) -> Tuple[Optional[BaseParser], Optional[str]]:
+        """
+        Route a file to a parser by its header signature
         
-        return None
+        The start of the file is read once and matched against the header
+        signature of every registered parser. Decisions are cached by
+        (path, size, mtime), so unchanged files aren't read again.
+        
+        Args:
+            file_path: Path to the bank statement file
+            
+        Returns:
+            Matching parser (or None) and the detected encoding of the file
+        """
+        suffix = Path(file_path).suffix.lower()
+        candidates = [parser for parser in self.parsers if suffix in parser.FILE_EXTENSIONS]
+        if not candidates:
+            return None, None
+        
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None, None
+        
+        key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        decision = self._detected.get(key)
+        self.stats.cache('detection', decision is not None)
+        if decision is not None:
+            self._detected.move_to_end(key)
+            return decision
+        
+        with self.stats.stage('detect'):
+            try:
+                probe = probe_file(file_path)
+            except OSError:
+                return None, None
+            
+            parser = next((parser for parser in candidates if parser.matches_header(probe)), None)
+            decision = (parser, probe.encoding)
+        
+        self._detected[key] = decision
+        if len(self._detected) > DETECTION_CACHE_SIZE:
+            self._detected.popitem(last=False)
+        
+        return decision
     
     def parse_statement(self, file_path: str) -> Optional[List[Transaction]]:
         """
@@ -42,35 +139,234 @@ class ParserFactory:
             file_path: Path to the bank statement file
             
         Returns:
-            List of transactions or None if parsing failed
+            List of transactions or None if parsing failed, problems are
+            in self.diagnostics
         """
-        parser = self.get_parser(file_path)
+        diagnostics = self._start_diagnostics(file_path)
+        parser, encoding = self.detect(file_path)
         
         if not parser:
-            print(f"No suitable parser found for {file_path}")
+            diagnostics.report(NO_PARSER, "No suitable parser found")
             return None
         
-        print(f"Using {parser.bank_name} parser for {Path(file_path).name}")
+        logger.info("Using %s parser for %s", parser.bank_name, Path(file_path).name)
         
         try:
-            transactions = parser.parse(file_path)
+            transactions, parse_diagnostics = self._parse(parser, file_path, encoding)
+            diagnostics.merge(parse_diagnostics)
             
-            if transactions:
-                summary = parser.get_summary(transactions)
-                print(f"Parsed {summary['total_transactions']} transactions")
-                print(f"Date range: {summary['date_range']['start']} to {summary['date_range']['end']}")
-                print(f"Total income: {summary['total_income']:,.0f} HUF")
-                print(f"Total expense: {summary['total_expense']:,.0f} HUF")
+            # The summary costs a duplicate scan, only worth it if it is logged
+            if transactions and logger.isEnabledFor(logging.INFO):
+                summary = parser.get_summary(transactions, include_duplicates=True)
+                logger.info("Parsed %d transactions", summary['total_transactions'])
+                logger.info("Date range: %s to %s", summary['date_range']['start'], summary['date_range']['end'])
+                logger.info("Total income: %s HUF", f"{summary['total_income']:,.0f}")
+                logger.info("Total expense: %s HUF", f"{summary['total_expense']:,.0f}")
                 
                 if summary['duplicates_found'] > 0:
-                    print(f"Warning: {summary['duplicates_found']} potential duplicates found")
+                    logger.warning("%d potential duplicates found", summary['duplicates_found'])
             
             return transactions
             
         except Exception as e:
-            print(f"Error parsing file: {e}")
+            diagnostics.report(PARSE_ERROR, f"Error parsing file: {e}")
             return None
     
+    def _start_diagnostics(self, source: Optional[str] = None) -> Diagnostics:
+        self.diagnostics = Diagnostics(source, hook=self.diagnostics_hook)
+        return self.diagnostics
+    
+    def _parse(self, parser: BaseParser, file_path: str,
+               encoding: Optional[str]) -> Tuple[List[Transaction], Diagnostics]:
+        """Parse a file, going through the parse cache if there is one"""
+        with self.stats.stage('parse') as span:
+            transactions = None
+            if self.cache is not None:
+                key = self.cache.key(file_path, parser)
+                transactions = self.cache.get(key)
+                self.stats.cache('parse_cache', transactions is not None)
+            
+            if transactions is None:
+                transactions = parser.parse(file_path, encoding)
+                diagnostics = parser.diagnostics
+                if self.cache is not None:
+                    try:
+                        self.cache.put(key, transactions)
+                    except Exception as e:
+                        # The parse itself succeeded, only the cache misses out
+                        diagnostics.report(CACHE_ERROR, f"Could not cache parse result: {e}")
+            else:
+                # Problems of a cached file were reported when it was parsed
+                diagnostics = Diagnostics(file_path)
+            span.rows_out = len(transactions)
+        return transactions, diagnostics
+    
+    def iter_statement(self, file_path: str) -> Iterator[Transaction]:
+        """
+        Stream transactions from a bank statement using auto-detected parser
+        
+        Args:
+            file_path: Path to the bank statement file
+            
+        Yields:
+            Transactions one at a time, without collecting the whole file;
+            problems of the rows read so far are in self.diagnostics even
+            when the caller stops early or the parser raises
+        """
+        diagnostics = self._start_diagnostics(file_path)
+        parser, encoding = self.detect(file_path)
+        
+        if not parser:
+            diagnostics.report(NO_PARSER, "No suitable parser found")
+            return
+        
+        try:
+            yield from parser.iter_parse(file_path, encoding)
+        finally:
+            diagnostics.merge(parser.diagnostics)
+    
+    def parse_batch(self, file_path: str, keep_raw: bool = False) -> Optional[TransactionBatch]:
+        """
+        Parse bank statement straight into a columnar TransactionBatch
+        
+        Args:
+            file_path: Path to the bank statement file
+            keep_raw: Whether to keep each row's raw_data
+            
+        Returns:
+            TransactionBatch or None if no parser matches
+        """
+        diagnostics = self._start_diagnostics(file_path)
+        parser, encoding = self.detect(file_path)
+        
+        if not parser:
+            diagnostics.report(NO_PARSER, "No suitable parser found")
+            return None
+        
+        try:
+            return TransactionBatch.from_transactions(parser.iter_parse(file_path, encoding), keep_raw=keep_raw)
+        finally:
+            diagnostics.merge(parser.diagnostics)
+    
+    def read_statement(self, file_path: str, index: int = 0) -> StatementResult:
+        """Parse a single file, reporting failures in the result instead of printing"""
+        parser, encoding = self.detect(file_path)
+        
+        if not parser:
+            diagnostics = Diagnostics(file_path, hook=self.diagnostics_hook)
+            diagnostics.report(NO_PARSER, "No suitable parser found")
+            return StatementResult(index, file_path, error="No suitable parser found", diagnostics=diagnostics)
+        
+        try:
+            transactions, diagnostics = self._parse(parser, file_path, encoding)
+        except Exception as e:
+            diagnostics = Diagnostics(file_path, hook=self.diagnostics_hook)
+            diagnostics.report(PARSE_ERROR, str(e))
+            return StatementResult(index, file_path, error=str(e), diagnostics=diagnostics)
+        return StatementResult(index, file_path, transactions=transactions, diagnostics=diagnostics)
+    
+    def iter_many(self, paths: Iterable[str], workers: Optional[int] = None) -> Iterator[StatementResult]:
+        """
+        Parse many statements in a process pool
+        
+        Files are submitted as workers free up, never more than
+        TASKS_PER_WORKER per worker past the earliest unfinished one, so a
+        slow file holds back at most that many finished results for
+        callers that consume them in input order.
+        
+        Args:
+            paths: Paths to bank statement files
+            workers: Number of worker processes (defaults to the CPU count,
+                1 parses in this process)
+            
+        Yields:
+            StatementResult per file, in completion order
+        """
+        paths = list(paths)
+        workers = min(workers or os.cpu_count() or 1, len(paths))
+        
+        if workers <= 1:
+            for index, file_path in enumerate(paths):
+                yield self.read_statement(file_path, index)
+            return
+        
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(self.cache, self.stats.enabled))
+        try:
+            tasks = ((file_path, index) for index, file_path in enumerate(paths))
+            for index, future in submit_bounded(pool, _read_statement_in_worker, tasks, workers):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The worker itself failed (crashed, result not picklable...)
+                    yield StatementResult(index, paths[index], error=str(e) or type(e).__name__)
+                    continue
+                self.stats.merge(result.stats)
+                if result.diagnostics is not None and self.diagnostics_hook is not None:
+                    # Workers have no hook, pass their samples to ours
+                    for diagnostic in result.diagnostics.samples:
+                        self.diagnostics_hook(diagnostic)
+                yield result
+        finally:
+            pool.shutdown(cancel_futures=True)
+    
+    def parse_many(self,
+                   paths: Iterable[str],
+                   workers: Optional[int] = None,
+                   existing: Optional[List[Transaction]] = None) -> Tuple[List[Transaction], Dict[str, str]]:
+        """
+        Parse many statements in parallel and merge them without duplicates
+        
+        Files are parsed in a process pool and merged as soon as all files
+        before them in paths are done, so the result is the same as merging
+        the statements one by one in input order. A file that fails is
+        reported and skipped without aborting the batch.
+        
+        Args:
+            paths: Paths to bank statement files
+            workers: Number of worker processes (defaults to the CPU count)
+            existing: Already known transactions to merge into, left
+                untouched if a list; a TransactionHistory is merged into in
+                place, a TransactionStore is merged into and returned
+            
+        Returns:
+            Merged transaction list and error message per failed file,
+            problems of all files are in self.diagnostics
+        """
+        diagnostics = self._start_diagnostics()
+        if isinstance(existing, (TransactionStore, TransactionHistory)):
+            history = existing
+        else:
+            history = TransactionHistory(existing)
+        errors: Dict[str, str] = {}
+        
+        # Results that finished ahead of an earlier file wait here
+        pending: Dict[int, StatementResult] = {}
+        next_index = 0
+        
+        for result in self.iter_many(paths, workers):
+            pending[result.index] = result
+            
+            while next_index in pending:
+                result = pending.pop(next_index)
+                next_index += 1
+                
+                if result.diagnostics is not None:
+                    diagnostics.merge(result.diagnostics)
+                elif result.error is not None:
+                    diagnostics.report(PARSE_ERROR, result.error)
+                
+                if result.error is not None:
+                    errors[result.path] = result.error
+                elif result.transactions:
+                    with self.stats.stage('merge') as span:
+                        added = history.merge(result.transactions)
+                        span.rows_in = len(result.transactions)
+                        span.rows_out = len(added)
+                        span.rejected = span.rows_in - span.rows_out
+        
+        return (history if isinstance(history, TransactionStore) else history.transactions), errors
+    
     def merge_statements(self, 
                         existing_transactions: List[Transaction],
                         new_file_path: str) -> Optional[List[Transaction]]:
@@ -84,13 +380,16 @@ class ParserFactory:
         Returns:
             Merged transaction list or None if parsing failed
         """
-        parser = self.get_parser(new_file_path)
+        diagnostics = self._start_diagnostics(new_file_path)
+        parser, encoding = self.detect(new_file_path)
         
         if not parser:
+            diagnostics.report(NO_PARSER, "No suitable parser found")
             return None
         
         try:
-            new_transactions = parser.parse(new_file_path)
+            new_transactions, parse_diagnostics = self._parse(parser, new_file_path, encoding)
+            diagnostics.merge(parse_diagnostics)
             
             if not new_transactions:
                 return existing_transactions
@@ -101,12 +400,33 @@ class ParserFactory:
             return merged
             
         except Exception as e:
-            print(f"Error merging statements: {e}")
+            diagnostics.report(PARSE_ERROR, f"Error merging statements: {e}")
             return None
 
 
+_worker_factory: Optional[ParserFactory] = None
+
+
+def _init_worker(cache: Optional[ParseCache], instrumented: bool = False) -> None:
+    """Give each worker process its own factory, sharing the cache directory"""
+    global _worker_factory
+    _worker_factory = ParserFactory(cache, PipelineStats() if instrumented else None)
+
+
+def _read_statement_in_worker(file_path: str, index: int) -> StatementResult:
+    """Process pool entry point"""
+    result = _worker_factory.read_statement(file_path, index)
+    stats = _worker_factory.stats
+    if stats.enabled:
+        # Sent back with the result and merged into the parent's stats
+        result.stats = stats.snapshot()
+        stats.reset()
+    return result
+
+
 # Example usage
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     factory = ParserFactory()
     
     # Test with sample files
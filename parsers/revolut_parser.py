@@ -1,54 +1,46 @@
 """Revolut statement parser"""
 import csv
-from datetime import datetime
-from typing import List, Optional
-from pathlib import Path
+from typing import Iterator, Optional
 from base_parser import BaseParser, Transaction
+from converters import AmountConverter, DateConverter
+from diagnostics import INVALID_DATE, MISSING_DATE, READ_ERROR, ROW_ERROR, Diagnostics
 
 
 class RevolutParser(BaseParser):
     """Parser for Revolut bank statements"""
     
+    # Revolut CSVs have specific headers
+    FILE_EXTENSIONS = ('.csv',)
+    HEADER_SIGNATURES = ('Type', 'Product', 'Started Date', 'Completed Date',
+                         'Description', 'Amount', 'Currency', 'State', 'Balance')
+    
+    # Revolut amounts: 1,234.56
+    NUMBER_STYLE = 'en'
+    
     def __init__(self):
         super().__init__("Revolut")
+        # Revolut uses ISO format: 2023-12-25 14:30:00
+        self.date_converter = DateConverter(['%Y-%m-%d'], search=None)
         
-    def validate_format(self, file_path: str) -> bool:
-        """Check if file is valid Revolut statement"""
-        path = Path(file_path)
-        
-        if path.suffix.lower() != '.csv':
-            return False
-        
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                first_line = f.readline()
-                # Revolut CSVs have specific headers
-                revolut_headers = ['Type', 'Product', 'Started Date', 'Completed Date', 
-                                 'Description', 'Amount', 'Currency', 'State', 'Balance']
-                return any(header in first_line for header in revolut_headers)
-        except:
-            return False
-    
-    def parse(self, file_path: str, encoding: str = 'utf-8') -> List[Transaction]:
-        """Parse Revolut CSV statement"""
-        transactions = []
-        
+    def iter_parse(self, file_path: str, encoding: Optional[str] = None) -> Iterator[Transaction]:
+        """Stream Revolut CSV statement transactions"""
+        diagnostics = self._start_diagnostics(file_path)
         try:
-            with open(file_path, 'r', encoding=encoding) as f:
+            with open(file_path, 'r', encoding=encoding or 'utf-8') as f:
                 reader = csv.DictReader(f)
+                # Exports always use a decimal dot, never sniff a comma decimal from the data
+                parse_amount = AmountConverter(self.NUMBER_STYLE, detect=False)
                 
-                for row in reader:
-                    transaction = self._parse_row(row)
-                    if transaction:
-                        transactions.append(transaction)
+                rows = self._decode_rows(
+                    reader, lambda row: self._parse_row(row, parse_amount, diagnostics, reader.line_num)
+                )
+                yield from self.stats.timed_iter('decode', rows)
         
         except Exception as e:
-            print(f"Error parsing Revolut statement: {e}")
-        
-        self.transactions = transactions
-        return transactions
+            diagnostics.report(READ_ERROR, f"Error parsing Revolut statement: {e}")
     
-    def _parse_row(self, row: dict) -> Optional[Transaction]:
+    def _parse_row(self, row: dict, parse_amount: AmountConverter,
+                   diagnostics: Diagnostics, line: Optional[int] = None) -> Optional[Transaction]:
         """Parse single CSV row into Transaction"""
         try:
             # Skip pending transactions
@@ -58,24 +50,28 @@ class RevolutParser(BaseParser):
             # Parse date (use Completed Date)
             date_str = row.get('Completed Date', row.get('Started Date', ''))
             if not date_str:
+                diagnostics.report(MISSING_DATE, "Row has no date", line, row)
                 return None
             
-            # Revolut uses ISO format: 2023-12-25 14:30:00
-            transaction_date = datetime.strptime(date_str.split(' ')[0], '%Y-%m-%d')
+            # The time of day is dropped
+            transaction_date = self.date_converter(date_str.split(' ')[0])
+            if transaction_date is None:
+                diagnostics.report(INVALID_DATE, f"Unrecognized date: {date_str}", line, row)
+                return None
             
             # Get description
             description = row.get('Description', 'N/A')
             
             # Get amount
             amount_str = row.get('Amount', '0')
-            amount = self._parse_amount(amount_str)
+            amount = parse_amount(amount_str)
             
             # Get currency
             currency = row.get('Currency', 'EUR')
             
             # Get balance
             balance_str = row.get('Balance', '')
-            balance = self._parse_amount(balance_str) if balance_str else None
+            balance = parse_amount(balance_str) if balance_str else None
             
             # Get transaction type for category hint
             trans_type = row.get('Type', '')
@@ -93,28 +89,9 @@ class RevolutParser(BaseParser):
             )
             
         except Exception as e:
-            print(f"Error parsing Revolut row: {e}")
+            diagnostics.report(ROW_ERROR, f"Error parsing Revolut row: {e}", line, row)
             return None
     
-    def _parse_amount(self, amount_str: str) -> float:
-        """Parse amount string to float"""
-        if not amount_str:
-            return 0.0
-        
-        # Remove currency symbols and spaces
-        amount_str = amount_str.strip()
-        amount_str = amount_str.replace(',', '')  # Remove thousand separators
-        
-        # Handle negative amounts
-        is_negative = '-' in amount_str or '(' in amount_str
-        amount_str = amount_str.replace('-', '').replace('(', '').replace(')', '')
-        
-        try:
-            amount = float(amount_str)
-            return -amount if is_negative else amount
-        except ValueError:
-            return 0.0
-    
     def _map_revolut_type_to_category(self, trans_type: str) -> Optional[str]:
         """Map Revolut transaction types to categories"""
         type_mapping = {
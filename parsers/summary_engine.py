@@ -0,0 +1,197 @@
+"""Single-pass and vectorized summary statistics for transactions"""
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from base_parser import Transaction
+from transaction_batch import DictionaryColumn, TransactionBatch
+from transfer_pairing import INTERNAL_TRANSFER
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, batches fall back to a column scan
+    np = None
+
+
+# date.toordinal() of 1970-01-01, the NumPy datetime64 epoch
+EPOCH_ORDINAL = 719163
+
+
+def _roll_up(groups: Dict[Tuple, List], position: int) -> Dict[Any, Dict[str, Any]]:
+    """Aggregate [count, income, expense] groups by one component of their key"""
+    totals: Dict[Any, Dict[str, Any]] = {}
+    for key, (count, income, expense) in groups.items():
+        label = key[position]
+        total = totals.get(label)
+        if total is None:
+            total = totals[label] = {'count': 0, 'income': 0.0, 'expense': 0.0, 'net': 0.0}
+        total['count'] += count
+        total['income'] += income
+        total['expense'] += expense
+        total['net'] += income - expense
+    return totals
+
+
+def _build_summary(bank: Optional[str], count: int, income: float, expense: float,
+                   start: Optional[datetime], end: Optional[datetime], transfers: int,
+                   breakdowns: Dict[str, Dict[str, Dict[str, Any]]]) -> Dict[str, Any]:
+    summary = {
+        'bank': bank,
+        'total_transactions': count,
+        'internal_transfers': transfers,
+        'total_income': income,
+        'total_expense': abs(expense),
+        'net_flow': income + expense,
+        'date_range': {
+            'start': start.isoformat() if start else None,
+            'end': end.isoformat() if end else None
+        }
+    }
+    summary.update(breakdowns)
+    return summary
+
+
+def summarize_transactions(transactions: Iterable[Transaction], bank: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Summarize transactions in a single pass
+    
+    Args:
+        transactions: Transactions (or TransactionRow views) to summarize
+        bank: Bank name reported in the summary
+    
+    Returns:
+        Totals, net flow, date range and per-bank, per-currency,
+        per-category and per-month breakdowns. Rows tagged as internal
+        transfers are counted but left out of income and expense.
+    """
+    count = transfers = 0
+    income = expense = 0.0
+    start = end = None
+    # [count, income, expense] per (bank, currency, category, month), rolled
+    # up into the individual breakdowns at the end
+    groups: Dict[Tuple, List] = {}
+    
+    for trans in transactions:
+        amount = trans.amount
+        date = trans.date
+        count += 1
+        
+        if start is None or date < start:
+            start = date
+        if end is None or date > end:
+            end = date
+        
+        key = (trans.bank, trans.currency, trans.category, f"{date.year:04d}-{date.month:02d}")
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = [0, 0.0, 0.0]
+        group[0] += 1
+        
+        if trans.category == INTERNAL_TRANSFER:
+            # Money moved between own accounts is neither income nor expense
+            transfers += 1
+        elif amount > 0:
+            income += amount
+            group[1] += amount
+        elif amount < 0:
+            expense += amount
+            group[2] -= amount
+    
+    return _build_summary(bank, count, income, expense, start, end, transfers, {
+        'by_bank': _roll_up(groups, 0),
+        'by_currency': _roll_up(groups, 1),
+        'by_category': _roll_up(groups, 2),
+        'by_month': dict(sorted(_roll_up(groups, 3).items()))
+    })
+
+
+def summarize_batch(batch: TransactionBatch, bank: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Summarize a columnar batch with vectorized NumPy reductions
+    
+    Falls back to a single pass over the rows when NumPy isn't installed.
+    
+    Args:
+        batch: TransactionBatch to summarize
+        bank: Bank name reported in the summary
+    
+    Returns:
+        Same structure as summarize_transactions
+    """
+    if np is None:
+        return summarize_transactions(batch, bank)
+    
+    if not len(batch):
+        return _build_summary(bank, 0, 0.0, 0.0, None, None, 0, {
+            'by_bank': {}, 'by_currency': {}, 'by_category': {}, 'by_month': {}
+        })
+    
+    scale = 100 if batch.amounts_in_cents else 1
+    # Columns are arrays or memoryviews over a mapped file, NumPy takes the
+    # element type from their buffer format without copying
+    amounts = np.asarray(batch.amounts)
+    dates = np.asarray(batch.dates)
+    
+    income_values = np.where(amounts > 0, amounts, 0).astype(np.float64)
+    expense_values = np.where(amounts < 0, amounts, 0).astype(np.float64)
+    
+    categories = np.asarray(batch.categories.codes)
+    transfer_code = batch.categories.lookup.get(INTERNAL_TRANSFER)
+    transfers = 0
+    if transfer_code is not None:
+        is_transfer = categories == transfer_code
+        transfers = int(is_transfer.sum())
+        income_values[is_transfer] = 0
+        expense_values[is_transfer] = 0
+    
+    # Integer cents sum exactly, floats accumulate pairwise
+    income = float(income_values.sum()) / scale
+    expense = float(expense_values.sum()) / scale
+    
+    if batch.times is None:
+        start = datetime.fromordinal(int(dates.min()))
+        end = datetime.fromordinal(int(dates.max()))
+    else:
+        times = np.asarray(batch.times)
+        stamps = dates.astype(np.int64) * 86400000000 + times
+        start = batch.date_at(int(stamps.argmin()))
+        end = batch.date_at(int(stamps.argmax()))
+    
+    def grouped(codes: np.ndarray, labels) -> Dict[Any, Dict[str, Any]]:
+        size = len(labels)
+        counts = np.bincount(codes, minlength=size)
+        incomes = np.bincount(codes, weights=income_values, minlength=size) / scale
+        expenses = np.bincount(codes, weights=expense_values, minlength=size) / scale
+        return {
+            labels[code]: {
+                'count': int(counts[code]),
+                'income': float(incomes[code]),
+                'expense': -float(expenses[code]),
+                'net': float(incomes[code] + expenses[code])
+            }
+            for code in np.flatnonzero(counts)
+        }
+    
+    def column_groups(column: DictionaryColumn) -> Dict[Any, Dict[str, Any]]:
+        return grouped(np.asarray(column.codes), column.values)
+    
+    # Months since 1970-01 as group codes
+    months = (dates - EPOCH_ORDINAL).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    first_month = int(months.min())
+    month_count = int(months.max()) - first_month + 1
+    month_labels = [
+        str(np.datetime64(first_month + offset, 'M')) for offset in range(month_count)
+    ]
+    
+    return _build_summary(bank, len(batch), income, expense, start, end, transfers, {
+        'by_bank': column_groups(batch.banks),
+        'by_currency': column_groups(batch.currencies),
+        'by_category': column_groups(batch.categories),
+        'by_month': grouped(months - first_month, month_labels)
+    })
+
+
+def summarize(transactions, bank: Optional[str] = None) -> Dict[str, Any]:
+    """Summarize a TransactionBatch or any iterable of transactions"""
+    if isinstance(transactions, TransactionBatch):
+        return summarize_batch(transactions, bank)
+    return summarize_transactions(transactions, bank)
@@ -0,0 +1,354 @@
+"""Columnar, memory-compact storage for large transaction histories"""
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import math
+
+from base_parser import Transaction
+
+
+class DictionaryColumn:
+    """String column stored as int codes into a table of distinct values"""
+    
+    __slots__ = ('values', 'lookup', 'codes')
+    
+    def __init__(self):
+        self.values: List[Optional[str]] = []
+        self.lookup: Dict[Optional[str], int] = {}
+        self.codes = array('i')
+    
+    def __len__(self) -> int:
+        return len(self.codes)
+    
+    def __getitem__(self, index: int) -> Optional[str]:
+        return self.values[self.codes[index]]
+    
+    def encode(self, value: Optional[str]) -> int:
+        """Return the code of value, adding it to the dictionary if new"""
+        code = self.lookup.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.lookup[value] = code
+        return code
+    
+    def append(self, value: Optional[str]) -> None:
+        self.codes.append(self.encode(value))
+    
+    def to_list(self) -> List[Optional[str]]:
+        """Decode the whole column"""
+        values = self.values
+        return [values[code] for code in self.codes]
+    
+    @property
+    def nbytes(self) -> int:
+        return self.codes.itemsize * len(self.codes) + sum(len(v) for v in self.values if v)
+
+
+class HashColumn:
+    """Transaction hashes stored as raw 16-byte MD5 digests
+    
+    Falls back to plain strings as soon as a hash that isn't an MD5 hex
+    digest (for example one set by the caller) is appended.
+    """
+    
+    __slots__ = ('digests', 'strings')
+    
+    DIGEST_SIZE = 16
+    
+    def __init__(self):
+        self.digests: Optional[bytearray] = bytearray()
+        self.strings: Optional[List[Optional[str]]] = None
+    
+    def __len__(self) -> int:
+        if self.strings is not None:
+            return len(self.strings)
+        return len(self.digests) // self.DIGEST_SIZE
+    
+    def __getitem__(self, index: int) -> Optional[str]:
+        if self.strings is not None:
+            return self.strings[index]
+        start = index * self.DIGEST_SIZE
+        return self.digests[start:start + self.DIGEST_SIZE].hex()
+    
+    def append(self, value: Optional[str]) -> None:
+        if self.strings is None:
+            digest = self._to_digest(value)
+            if digest is not None:
+                self.digests += digest
+                return
+            self.strings = [self[i] for i in range(len(self))]
+            self.digests = None
+        self.strings.append(value)
+    
+    def to_list(self) -> List[Optional[str]]:
+        """Decode the whole column"""
+        if self.strings is not None:
+            return list(self.strings)
+        hex_digits = self.digests.hex()
+        width = self.DIGEST_SIZE * 2
+        return [hex_digits[start:start + width] for start in range(0, len(hex_digits), width)]
+    
+    def _to_digest(self, value: Optional[str]) -> Optional[bytes]:
+        if not value or len(value) != self.DIGEST_SIZE * 2:
+            return None
+        try:
+            digest = bytes.fromhex(value)
+        except ValueError:
+            return None
+        # Upper-case hex wouldn't round-trip through bytes.hex()
+        return digest if digest.hex() == value else None
+    
+    @property
+    def nbytes(self) -> int:
+        if self.strings is not None:
+            return sum(len(v) for v in self.strings if v)
+        return len(self.digests)
+
+
+class TransactionRow:
+    """Zero-copy view of a single row of a TransactionBatch
+    
+    Exposes the same attributes as Transaction, reading them from the
+    batch columns on access, so duplicate detection and summaries work on
+    rows without materializing Transaction objects.
+    """
+    
+    __slots__ = ('batch', 'index')
+    
+    def __init__(self, batch: 'TransactionBatch', index: int):
+        self.batch = batch
+        self.index = index
+    
+    def __repr__(self) -> str:
+        return f"TransactionRow({self.index}, {self.date.date()}, {self.amount}, {self.description!r})"
+    
+    @property
+    def date(self) -> datetime:
+        return self.batch.date_at(self.index)
+    
+    @property
+    def description(self) -> str:
+        return self.batch.descriptions[self.index]
+    
+    @property
+    def amount(self) -> float:
+        return self.batch.amount_at(self.index)
+    
+    @property
+    def currency(self) -> str:
+        return self.batch.currencies[self.index]
+    
+    @property
+    def balance(self) -> Optional[float]:
+        balance = self.batch.balances[self.index]
+        return None if math.isnan(balance) else balance
+    
+    @property
+    def category(self) -> Optional[str]:
+        return self.batch.categories[self.index]
+    
+    @property
+    def merchant(self) -> Optional[str]:
+        return self.batch.merchants[self.index]
+    
+    @property
+    def transaction_type(self) -> str:
+        return self.batch.transaction_types[self.index]
+    
+    @property
+    def bank(self) -> Optional[str]:
+        return self.batch.banks[self.index]
+    
+    @property
+    def account_number(self) -> Optional[str]:
+        return self.batch.account_numbers[self.index]
+    
+    @property
+    def raw_data(self) -> Optional[Dict[str, Any]]:
+        raw_data = self.batch.raw_data
+        return raw_data[self.index] if raw_data is not None else None
+    
+    @property
+    def hash(self) -> Optional[str]:
+        return self.batch.hashes[self.index]
+    
+    # Duplicate detection only needs the attributes above
+    matches = Transaction.matches
+    _description_similarity = Transaction._description_similarity
+    
+    def to_transaction(self) -> Transaction:
+        """Materialize the row as a standalone Transaction"""
+        return self.batch.transaction_at(self.index)
+
+
+class TransactionBatch:
+    """Columnar collection of transactions
+    
+    Dates are stored as day ordinals (plus microseconds of the day, only
+    once a row has a time), amounts as integer cents, balances as floats
+    with NaN for missing values and hashes as raw digests. Repetitive
+    strings (bank, currency, category, merchant, description...) are
+    dictionary-encoded. A row costs a few dozen bytes instead of the
+    several hundred a Transaction object with its strings takes.
+    
+    Amounts that are not exact in cents (for example the result of float
+    arithmetic) switch the amount column to float64 so that conversion
+    back to Transaction stays lossless.
+    """
+    
+    def __init__(self, keep_raw: bool = False):
+        self.dates = array('i')
+        self.times: Optional[array] = None
+        self.amounts = array('q')
+        self.amounts_in_cents = True
+        self.balances = array('d')
+        self.descriptions = DictionaryColumn()
+        self.currencies = DictionaryColumn()
+        self.categories = DictionaryColumn()
+        self.merchants = DictionaryColumn()
+        self.transaction_types = DictionaryColumn()
+        self.banks = DictionaryColumn()
+        self.account_numbers = DictionaryColumn()
+        self.hashes = HashColumn()
+        self.raw_data: Optional[List[Optional[Dict[str, Any]]]] = [] if keep_raw else None
+    
+    @classmethod
+    def from_transactions(cls, transactions: Iterable[Transaction], keep_raw: bool = False) -> 'TransactionBatch':
+        """Build a batch from Transaction objects (or any iterable of them)"""
+        batch = cls(keep_raw=keep_raw)
+        batch.extend(transactions)
+        return batch
+    
+    def __len__(self) -> int:
+        return len(self.dates)
+    
+    def __getitem__(self, index: int) -> TransactionRow:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('TransactionBatch index out of range')
+        return TransactionRow(self, index)
+    
+    def __iter__(self) -> Iterator[TransactionRow]:
+        for index in range(len(self)):
+            yield TransactionRow(self, index)
+    
+    def append(self, trans: Transaction) -> None:
+        """Append a transaction (or row view) to the batch"""
+        date = trans.date
+        self.dates.append(date.toordinal())
+        
+        time_of_day = (date.hour * 3600 + date.minute * 60 + date.second) * 1000000 + date.microsecond
+        if self.times is not None:
+            self.times.append(time_of_day)
+        elif time_of_day:
+            self.times = array('q', bytes(8 * (len(self.dates) - 1)))
+            self.times.append(time_of_day)
+        
+        self._append_amount(trans.amount)
+        self.balances.append(math.nan if trans.balance is None else trans.balance)
+        self.descriptions.append(trans.description)
+        self.currencies.append(trans.currency)
+        self.categories.append(trans.category)
+        self.merchants.append(trans.merchant)
+        self.transaction_types.append(trans.transaction_type)
+        self.banks.append(trans.bank)
+        self.account_numbers.append(trans.account_number)
+        self.hashes.append(trans.hash)
+        
+        if self.raw_data is not None:
+            self.raw_data.append(trans.raw_data)
+    
+    def extend(self, transactions: Iterable[Transaction]) -> None:
+        for trans in transactions:
+            self.append(trans)
+    
+    def _append_amount(self, amount: float) -> None:
+        if self.amounts_in_cents:
+            cents = round(amount * 100)
+            if cents / 100 == amount:
+                self.amounts.append(cents)
+                return
+            # Not representable in cents, keep exact floats from now on
+            self.amounts = array('d', (value / 100 for value in self.amounts))
+            self.amounts_in_cents = False
+        self.amounts.append(amount)
+    
+    def set_category(self, row: TransactionRow, category: Optional[str]) -> None:
+        """Change the category of a row of this batch"""
+        self.categories.codes[row.index] = self.categories.encode(category)
+    
+    def date_at(self, index: int) -> datetime:
+        date = datetime.fromordinal(self.dates[index])
+        if self.times is not None and self.times[index]:
+            date += timedelta(microseconds=self.times[index])
+        return date
+    
+    def amount_at(self, index: int) -> float:
+        amount = self.amounts[index]
+        return amount / 100 if self.amounts_in_cents else amount
+    
+    def transaction_at(self, index: int) -> Transaction:
+        row = TransactionRow(self, index)
+        return Transaction(
+            date=row.date,
+            description=row.description,
+            amount=row.amount,
+            currency=row.currency,
+            balance=row.balance,
+            category=row.category,
+            merchant=row.merchant,
+            bank=row.bank,
+            account_number=row.account_number,
+            raw_data=row.raw_data,
+            hash=row.hash
+        )
+    
+    def to_transactions(self) -> List[Transaction]:
+        """Convert the batch back into a list of Transaction objects"""
+        # Decode column by column, each distinct day becomes one datetime
+        days: Dict[int, datetime] = {}
+        dates = [days.get(day) or days.setdefault(day, datetime.fromordinal(day)) for day in self.dates]
+        if self.times is not None:
+            dates = [
+                date + timedelta(microseconds=time) if time else date
+                for date, time in zip(dates, self.times)
+            ]
+        
+        amounts = [amount / 100 for amount in self.amounts] if self.amounts_in_cents else list(self.amounts)
+        balances = [None if math.isnan(balance) else balance for balance in self.balances]
+        raw_data = self.raw_data if self.raw_data is not None else [None] * len(self)
+        
+        return [
+            Transaction(
+                date=date,
+                description=description,
+                amount=amount,
+                currency=currency,
+                balance=balance,
+                category=category,
+                merchant=merchant,
+                bank=bank,
+                account_number=account_number,
+                raw_data=raw,
+                hash=hash_value
+            )
+            for date, description, amount, currency, balance, category, merchant, bank,
+                account_number, raw, hash_value in zip(
+                dates, self.descriptions.to_list(), amounts, self.currencies.to_list(), balances,
+                self.categories.to_list(), self.merchants.to_list(), self.banks.to_list(),
+                self.account_numbers.to_list(), raw_data, self.hashes.to_list()
+            )
+        ]
+    
+    @property
+    def nbytes(self) -> int:
+        """Approximate size of the column data in bytes"""
+        size = sum(column.itemsize * len(column) for column in (self.dates, self.amounts, self.balances))
+        if self.times is not None:
+            size += self.times.itemsize * len(self.times)
+        for column in (self.descriptions, self.currencies, self.categories, self.merchants,
+                       self.transaction_types, self.banks, self.account_numbers, self.hashes):
+            size += column.nbytes
+        return size
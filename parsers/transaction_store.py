@@ -0,0 +1,302 @@
+"""Date-ordered, block-structured transaction store with range queries"""
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import datetime
+from typing import FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple
+
+from base_parser import Transaction, TransactionIndex
+from instrumentation import NULL_STATS
+
+
+# Transactions per block, a block is split in two once it doubles
+BLOCK_SIZE = 512
+
+
+def _date_key(trans: Transaction) -> datetime:
+    return trans.date
+
+
+@dataclass(slots=True)
+class ZoneMap:
+    """
+    Per-block statistics used to skip blocks that can't match a filter
+    
+    Amount and bank are fixed once a row is parsed. Categories and
+    merchants can be reassigned, so they must be changed through
+    TransactionStore.set_category / set_merchant, which add the new value
+    to the block's set. A value that is no longer used only costs a read
+    of the block, never a wrong skip. The merchant set is collected on
+    the first merchant filter, since merchants are extracted lazily.
+    """
+    min_amount: float
+    max_amount: float
+    banks: FrozenSet[Optional[str]]
+    categories: Set[Optional[str]]
+    merchants: Optional[Set[Optional[str]]] = None
+
+
+class TransactionStore:
+    """
+    Transactions kept ordered by date in fixed-size blocks
+    
+    Blocks are plain lists found by bisecting the last date of every
+    block, so an insert costs O(log n) plus a list insert into one block
+    of at most 2 * BLOCK_SIZE rows, and a date range is sliced with two
+    bisections. Transactions with equal dates keep their insertion order.
+    
+    Every block has a lazily built ZoneMap (amount range, banks,
+    categories, merchants); select() checks it before looking at the rows
+    of a block, so selective filters skip most of the store. Change the
+    category or merchant of a stored transaction with set_category or
+    set_merchant (or call invalidate_zones after changing rows directly)
+    so the zone maps stay correct.
+    
+    BaseParser.merge_statements, get_date_range and get_summary accept a
+    store in place of a list; merging into a store updates it in place.
+    """
+    
+    def __init__(self, transactions: Iterable[Transaction] = (), block_size: int = BLOCK_SIZE):
+        self.block_size = block_size
+        self.stats = NULL_STATS
+        self._blocks: List[List[Transaction]] = []
+        self._maxes: List[datetime] = []  # Last date of every block
+        self._zones: List[Optional[ZoneMap]] = []
+        self._offsets: Optional[List[int]] = None  # Rows before every block
+        self._length = 0
+        self._index: Optional[TransactionIndex] = None
+        self._load(sorted(transactions, key=_date_key))
+    
+    def _load(self, ordered: List[Transaction]) -> None:
+        """Fill an empty store from date-sorted transactions"""
+        size = self.block_size
+        for start in range(0, len(ordered), size):
+            block = ordered[start:start + size]
+            self._blocks.append(block)
+            self._maxes.append(block[-1].date)
+            self._zones.append(None)
+        self._length = len(ordered)
+    
+    def __len__(self) -> int:
+        return self._length
+    
+    def __iter__(self) -> Iterator[Transaction]:
+        for block in self._blocks:
+            yield from block
+    
+    def __getitem__(self, index: int) -> Transaction:
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError('TransactionStore index out of range')
+        offsets = self._block_offsets()
+        position = bisect_right(offsets, index) - 1
+        return self._blocks[position][index - offsets[position]]
+    
+    def _block_offsets(self) -> List[int]:
+        if self._offsets is None:
+            offsets = []
+            total = 0
+            for block in self._blocks:
+                offsets.append(total)
+                total += len(block)
+            self._offsets = offsets
+        return self._offsets
+    
+    @property
+    def block_count(self) -> int:
+        return len(self._blocks)
+    
+    def add(self, trans: Transaction) -> None:
+        """Insert a transaction after any existing ones with the same date"""
+        date = trans.date
+        self._length += 1
+        self._offsets = None
+        if self._index is not None:
+            self._index.add(trans)
+        
+        if not self._blocks:
+            self._blocks.append([trans])
+            self._maxes.append(date)
+            self._zones.append(None)
+            return
+        
+        # First block ending after date, or the last block when date is the latest
+        position = min(bisect_right(self._maxes, date), len(self._blocks) - 1)
+        block = self._blocks[position]
+        block.insert(bisect_right(block, date, key=_date_key), trans)
+        self._maxes[position] = block[-1].date
+        self._zones[position] = None
+        
+        if len(block) > 2 * self.block_size:
+            self._split(position)
+    
+    def extend(self, transactions: Iterable[Transaction]) -> None:
+        for trans in transactions:
+            self.add(trans)
+    
+    def _split(self, position: int) -> None:
+        block = self._blocks[position]
+        half = len(block) // 2
+        self._blocks[position:position + 1] = [block[:half], block[half:]]
+        self._maxes[position:position + 1] = [block[half - 1].date, block[-1].date]
+        self._zones[position:position + 1] = [None, None]
+    
+    def merge(self, new: List[Transaction]) -> List[Transaction]:
+        """
+        Add the transactions of new that aren't duplicates and return them
+        
+        Same rules as TransactionHistory.merge: new transactions are only
+        checked against the store as it was before the merge. The
+        duplicate index is built on the first merge and kept up to date
+        by later inserts.
+        """
+        if self._index is None:
+            self._index = TransactionIndex(self)
+        
+        added = [trans for trans in new if not self._index.contains(trans)]
+        for trans in sorted(added, key=_date_key):
+            self.add(trans)
+        return added
+    
+    def bounds(self) -> Tuple[Optional[datetime], Optional[datetime]]:
+        """Earliest and latest date in the store"""
+        if not self._blocks:
+            return None, None
+        return self._blocks[0][0].date, self._maxes[-1]
+    
+    def _locate(self, date: datetime) -> Tuple[int, int]:
+        """(block, row) of the first transaction dated date or later"""
+        position = bisect_left(self._maxes, date)
+        if position == len(self._blocks):
+            return position, 0
+        return position, bisect_left(self._blocks[position], date, key=_date_key)
+    
+    def between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Transaction]:
+        """Transactions dated from start (inclusive) to end (exclusive)"""
+        return self.select(start, end)
+    
+    def _zone(self, position: int, merchants: bool = False) -> ZoneMap:
+        zone = self._zones[position]
+        block = self._blocks[position]
+        if zone is None:
+            amounts = [trans.amount for trans in block]
+            zone = self._zones[position] = ZoneMap(
+                min(amounts), max(amounts),
+                frozenset(trans.bank for trans in block),
+                {trans.category for trans in block},
+            )
+        if merchants and zone.merchants is None:
+            zone.merchants = {trans.merchant for trans in block}
+        return zone
+    
+    def _zones_of(self, trans: Transaction) -> List[ZoneMap]:
+        """Built zone maps of the blocks holding trans (by identity)"""
+        date = trans.date
+        found = False
+        zones = []
+        position = bisect_left(self._maxes, date)
+        while position < len(self._blocks):
+            block = self._blocks[position]
+            if block[0].date > date:
+                break
+            low = bisect_left(block, date, key=_date_key)
+            high = bisect_right(block, date, key=_date_key)
+            if any(row is trans for row in block[low:high]):
+                found = True
+                if self._zones[position] is not None:
+                    zones.append(self._zones[position])
+            position += 1
+        if not found:
+            raise ValueError("Transaction is not in the store")
+        return zones
+    
+    def set_category(self, trans: Transaction, category: Optional[str]) -> None:
+        """Change the category of a stored transaction, keeping zone maps valid"""
+        zones = self._zones_of(trans)
+        trans.category = category
+        for zone in zones:
+            zone.categories.add(category)
+    
+    def set_merchant(self, trans: Transaction, merchant: Optional[str]) -> None:
+        """Change the merchant of a stored transaction, keeping zone maps valid"""
+        zones = self._zones_of(trans)
+        trans.merchant = merchant
+        for zone in zones:
+            if zone.merchants is not None:
+                zone.merchants.add(merchant)
+    
+    def invalidate_zones(self) -> None:
+        """Drop all zone maps, after rows were changed without set_category / set_merchant"""
+        self._zones = [None] * len(self._blocks)
+    
+    def select(self,
+               start: Optional[datetime] = None,
+               end: Optional[datetime] = None,
+               min_amount: Optional[float] = None,
+               max_amount: Optional[float] = None,
+               bank: Optional[str] = None,
+               merchant: Optional[str] = None,
+               category: Optional[str] = None) -> List[Transaction]:
+        """
+        Transactions matching all given filters, in date order
+        
+        Args:
+            start: Earliest date (inclusive)
+            end: Latest date (exclusive)
+            min_amount: Smallest amount (inclusive)
+            max_amount: Largest amount (inclusive)
+            bank: Bank name
+            merchant: Extracted merchant name
+            category: Category
+        
+        Returns:
+            Matching transactions
+        """
+        if not self._blocks:
+            return []
+        
+        first_block, first_row = self._locate(start) if start is not None else (0, 0)
+        last_block, last_row = self._locate(end) if end is not None else (len(self._blocks), 0)
+        
+        zone_filtered = (min_amount is not None or max_amount is not None or bank is not None
+                         or category is not None or merchant is not None)
+        row_filters = []
+        if min_amount is not None:
+            row_filters.append(lambda trans: trans.amount >= min_amount)
+        if max_amount is not None:
+            row_filters.append(lambda trans: trans.amount <= max_amount)
+        if bank is not None:
+            row_filters.append(lambda trans: trans.bank == bank)
+        if category is not None:
+            row_filters.append(lambda trans: trans.category == category)
+        if merchant is not None:
+            row_filters.append(lambda trans: trans.merchant == merchant)
+        
+        result: List[Transaction] = []
+        read = skipped = 0
+        for position in range(first_block, min(last_block + 1, len(self._blocks))):
+            block = self._blocks[position]
+            low = first_row if position == first_block else 0
+            high = last_row if position == last_block else len(block)
+            if low >= high:
+                continue
+            
+            if zone_filtered:
+                zone = self._zone(position, merchants=merchant is not None)
+                if ((min_amount is not None and zone.max_amount < min_amount)
+                        or (max_amount is not None and zone.min_amount > max_amount)
+                        or (bank is not None and bank not in zone.banks)
+                        or (category is not None and category not in zone.categories)
+                        or (merchant is not None and merchant not in zone.merchants)):
+                    skipped += 1
+                    continue
+            
+            read += 1
+            rows = block[low:high] if low or high < len(block) else block
+            if row_filters:
+                result.extend(trans for trans in rows if all(check(trans) for check in row_filters))
+            else:
+                result.extend(rows)
+        
+        self.stats.count('store_blocks', rows_in=read + skipped, rows_out=read, rejected=skipped)
+        return result
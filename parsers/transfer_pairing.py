@@ -0,0 +1,386 @@
+"""Pairing of transfers between own accounts at different banks"""
+import math
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from base_parser import Transaction
+from transaction_batch import TransactionBatch, TransactionRow
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, candidates are then found row by row
+    np = None
+
+
+# Category given to both sides of a paired transfer, summaries leave
+# these rows out of income and expense
+INTERNAL_TRANSFER = 'Internal Transfer'
+
+DEFAULT_WINDOW_DAYS = 3
+# Exchange spreads and fees make the two sides differ a little
+DEFAULT_TOLERANCE = 0.02
+# Same-currency sides have to be equal up to rounding
+SAME_CURRENCY_TOLERANCE = 0.01
+
+# Rows in other categories (purchases, fees, refunds...) are never one
+# side of a transfer; None is an uncategorized row
+TRANSFER_CATEGORIES = frozenset({None, 'Transfer', 'Transfer In', INTERNAL_TRANSFER})
+
+# Index keys pack (amount bucket, day ordinal) into one int, ordinals fit 22 bits
+DAY_BITS = 22
+DAY_MASK = (1 << DAY_BITS) - 1
+MICROSECONDS_PER_DAY = 86400 * 1000000
+
+# (sender, relative difference, days apart, receiver), sorting candidates
+# puts every sender's closest receiver first
+Candidate = Tuple[int, float, int, int]
+# The same as columns: senders, differences, days apart, receivers
+CandidateColumns = Tuple[Sequence[int], Sequence[float], Sequence[int], Sequence[int]]
+
+
+@dataclass
+class TransferPair:
+    """The outgoing and incoming side of one internal transfer"""
+    outgoing: Transaction
+    incoming: Transaction
+    days_apart: int
+    difference: float  # Relative amount difference after conversion
+
+
+class _Side:
+    """
+    Columns of the rows of one side that can take part in a transfer
+    
+    Columns are NumPy arrays when NumPy is installed, lists otherwise.
+    transactions is a list of Transaction objects or a TransactionBatch,
+    whose rows come back as TransactionRow views.
+    """
+    
+    def __init__(self, transactions: Union[List[Transaction], TransactionBatch], positions: Sequence[int],
+                 keys: Sequence[int], amounts: Sequence[float], raw_amounts: Sequence[float],
+                 banks: Sequence[int], currencies: Sequence[int], dates: Sequence):
+        self.transactions = transactions
+        self.positions = positions  # Index into transactions of every row
+        self.keys = keys  # (amount bucket << DAY_BITS) + day ordinal
+        self.amounts = amounts  # Absolute amount in the base currency
+        self.raw_amounts = raw_amounts  # Absolute amount in the row's currency
+        self.banks = banks  # Bank and currency codes, shared by both sides
+        self.currencies = currencies
+        self.dates = dates  # Sort key of the date and time (datetimes, or microseconds for a batch)
+    
+    def __len__(self) -> int:
+        return len(self.positions)
+    
+    def __getitem__(self, index: int) -> Transaction:
+        return self.transactions[int(self.positions[index])]
+    
+    def rows(self, indices: List[int]) -> List[Transaction]:
+        """Transactions of many rows, views for a batch"""
+        positions = _gather(self.positions, indices)
+        transactions = self.transactions
+        if isinstance(transactions, TransactionBatch):
+            return [TransactionRow(transactions, position) for position in positions]
+        return [transactions[position] for position in positions]
+    
+    def reorder(self, order: Sequence[int]) -> '_Side':
+        columns = (self.positions, self.keys, self.amounts, self.raw_amounts, self.banks, self.currencies, self.dates)
+        if np is not None:
+            order = np.asarray(order, dtype=np.int64)
+            return _Side(self.transactions, *(column[order] for column in columns))
+        return _Side(self.transactions, *([column[index] for index in order] for column in columns))
+
+
+def _gather(column: Sequence, indices: List[int]) -> list:
+    """Values of column at indices, as a list of plain Python values"""
+    if np is not None and isinstance(column, np.ndarray):
+        return column[np.asarray(indices, dtype=np.int64)].tolist()
+    return [column[index] for index in indices]
+
+
+def _group_starts(column: Sequence[int]) -> List[int]:
+    """Positions where the value of column changes, starting with 0 (if not empty)"""
+    if np is not None and isinstance(column, np.ndarray):
+        return np.flatnonzero(np.diff(column, prepend=-1)).tolist()
+    return [index for index, value in enumerate(column) if not index or value != column[index - 1]]
+
+
+def _stable_order(column: Sequence) -> Sequence[int]:
+    """Positions that sort column, equal values keeping their order"""
+    if np is not None and isinstance(column, np.ndarray) and column.dtype != object:
+        return np.argsort(column, kind='stable')
+    return sorted(range(len(column)), key=column.__getitem__)
+
+
+class TransferPairer:
+    """
+    Matches expenses at one bank with incomes at another bank
+    
+    A top-up of a Revolut account from OTP is an OTP expense and a
+    Revolut income of the same value a few days apart. Two rows pair
+    when they are at most window_days apart and their amounts match:
+    exactly in the same currency, within tolerance after converting both
+    to the base currency with rates (currency -> value of one unit in the
+    base currency) otherwise. Rows in a currency without a rate, and rows
+    whose category isn't one of categories, are left alone. Either side
+    may be a TransactionBatch, whose columns are then read directly (with
+    NumPy) instead of the attributes of one Transaction at a time.
+    
+    Incoming rows are sorted by (amount bucket, day), with buckets on a
+    log scale as wide as the largest ratio of two matching amounts,
+    1 / (1 - tolerance), so a match is always in the same or a
+    neighbouring bucket. The candidates of an outgoing row are then three
+    index ranges found by binary search instead of a scan of the other
+    side; with NumPy the searches and checks run vectorized for all rows
+    at once. Pairing is one-to-one: outgoing rows are taken in date order
+    and each gets the closest unpaired incoming row (smallest amount
+    difference, then fewest days apart).
+    """
+    
+    def __init__(self,
+                 rates: Optional[Dict[str, float]] = None,
+                 base_currency: str = 'HUF',
+                 window_days: int = DEFAULT_WINDOW_DAYS,
+                 tolerance: float = DEFAULT_TOLERANCE,
+                 categories: Iterable[Optional[str]] = TRANSFER_CATEGORIES):
+        if not 0 < tolerance < 1:
+            raise ValueError("tolerance must be between 0 and 1")
+        self.rates = dict(rates or {})
+        self.rates.setdefault(base_currency, 1.0)
+        self.base_currency = base_currency
+        self.window_days = window_days
+        self.tolerance = tolerance
+        self.categories = frozenset(categories)
+        # |a - b| / max(a, b) <= tolerance allows max / min up to 1 / (1 - tolerance),
+        # the margin keeps float rounding from pushing such a pair two buckets apart
+        self._log_step = -math.log1p(-tolerance) * (1 + 1e-9)
+    
+    def _side(self, transactions: Union[Iterable[Transaction], TransactionBatch], incoming: bool,
+              bank_codes: Dict[Optional[str], int], currency_codes: Dict[str, int]) -> _Side:
+        """The incoming (positive) or outgoing (negative) rows that can be converted"""
+        if isinstance(transactions, TransactionBatch) and np is not None:
+            return self._batch_side(transactions, incoming, bank_codes, currency_codes)
+        
+        transactions = list(transactions)
+        sign = 1.0 if incoming else -1.0
+        rates = self.rates
+        categories = self.categories
+        # Attribute reads in comprehensions, the math vectorized when possible;
+        # rows that can't take part get a zero amount and are dropped below
+        amounts = [trans.amount * sign * rates.get(trans.currency, 0.0) if trans.category in categories else 0.0
+                   for trans in transactions]
+        days = [trans.date.toordinal() for trans in transactions]
+        
+        if np is not None:
+            values = np.asarray(amounts, dtype=np.float64)
+            positions = np.flatnonzero(values > 0)
+            amounts = values[positions]
+            buckets = np.floor(np.log(amounts) / self._log_step).astype(np.int64)
+            keys = (buckets << DAY_BITS) + np.asarray(days, dtype=np.int64)[positions]
+            column = np.asarray
+        else:
+            step = self._log_step
+            positions = [position for position, amount in enumerate(amounts) if amount > 0]
+            keys = [(math.floor(math.log(amounts[position]) / step) << DAY_BITS) + days[position]
+                    for position in positions]
+            amounts = [amounts[position] for position in positions]
+            column = list
+        
+        rows = [transactions[position] for position in positions]
+        return _Side(
+            transactions, positions, keys, amounts,
+            column([abs(trans.amount) for trans in rows]),
+            column([bank_codes.setdefault(trans.bank, len(bank_codes)) for trans in rows]),
+            column([currency_codes.setdefault(trans.currency, len(currency_codes)) for trans in rows]),
+            column([trans.date for trans in rows])
+        )
+    
+    def _batch_side(self, batch: TransactionBatch, incoming: bool,
+                    bank_codes: Dict[Optional[str], int], currency_codes: Dict[str, int]) -> _Side:
+        """_side on the columns of a batch, per-row work is only done once per distinct value"""
+        raw_amounts = np.asarray(batch.amounts, dtype=np.float64)
+        if batch.amounts_in_cents:
+            raw_amounts = raw_amounts / 100
+        
+        # Rate, eligibility and shared codes looked up per dictionary value, then gathered by code
+        currency_column = np.asarray(batch.currencies.codes)
+        category_column = np.asarray(batch.categories.codes)
+        bank_column = np.asarray(batch.banks.codes)
+        rates = np.array([self.rates.get(currency, 0.0) for currency in batch.currencies.values] or [0.0])
+        eligible = np.array([category in self.categories for category in batch.categories.values] or [False])
+        banks = np.array([bank_codes.setdefault(bank, len(bank_codes)) for bank in batch.banks.values] or [0])
+        currencies = np.array([currency_codes.setdefault(currency, len(currency_codes))
+                               for currency in batch.currencies.values] or [0])
+        
+        values = raw_amounts * (1.0 if incoming else -1.0) * rates[currency_column]
+        positions = np.flatnonzero((values > 0) & eligible[category_column])
+        amounts = values[positions]
+        days = np.asarray(batch.dates, dtype=np.int64)[positions]
+        buckets = np.floor(np.log(amounts) / self._log_step).astype(np.int64)
+        dates = days * MICROSECONDS_PER_DAY
+        if batch.times is not None:
+            dates += np.asarray(batch.times, dtype=np.int64)[positions]
+        
+        return _Side(
+            batch, positions, (buckets << DAY_BITS) + days, amounts, np.abs(raw_amounts[positions]),
+            banks[bank_column[positions]], currencies[currency_column[positions]], dates
+        )
+    
+    def _candidates(self, senders: _Side, receivers: _Side) -> List[Candidate]:
+        """Every (sender, receiver) combination that may pair, row by row"""
+        keys = receivers.keys
+        window = self.window_days
+        tolerance = self.tolerance
+        shifts = [(offset << DAY_BITS) - window for offset in (-1, 0, 1)]
+        candidates = []
+        for sender, (key, amount) in enumerate(zip(senders.keys, senders.amounts)):
+            day = key & DAY_MASK
+            for shift in shifts:
+                low = bisect_left(keys, key + shift)
+                for receiver in range(low, bisect_right(keys, key + shift + 2 * window, low)):
+                    if senders.banks[sender] == receivers.banks[receiver]:
+                        continue
+                    if senders.currencies[sender] == receivers.currencies[receiver]:
+                        # Nothing to convert, the sides have to be equal
+                        if abs(senders.raw_amounts[sender] - receivers.raw_amounts[receiver]) >= SAME_CURRENCY_TOLERANCE:
+                            continue
+                    other_amount = receivers.amounts[receiver]
+                    difference = abs(amount - other_amount) / max(amount, other_amount)
+                    if difference <= tolerance:
+                        candidates.append((sender, difference, abs((keys[receiver] & DAY_MASK) - day), receiver))
+        return candidates
+    
+    def _candidates_vectorized(self, senders: _Side, receivers: _Side) -> CandidateColumns:
+        """Same as _candidates, with the searches and checks done in NumPy, sorted and as columns"""
+        window = self.window_days
+        receiver_keys = receivers.keys
+        sender_keys = senders.keys
+        
+        # Expand the three key ranges of every sender into (sender, receiver) rows
+        sender_parts = []
+        receiver_parts = []
+        for offset in (-1, 0, 1):
+            starts = sender_keys + ((offset << DAY_BITS) - window)
+            lows = np.searchsorted(receiver_keys, starts, side='left')
+            counts = np.searchsorted(receiver_keys, starts + 2 * window, side='right') - lows
+            total = int(counts.sum())
+            if not total:
+                continue
+            sender_parts.append(np.repeat(np.arange(len(senders)), counts))
+            # Receiver index: the range start of its sender plus the offset within the range
+            receiver_parts.append(np.repeat(lows - (np.cumsum(counts) - counts), counts) + np.arange(total))
+        
+        if not sender_parts:
+            return [], [], [], []
+        sender_index = np.concatenate(sender_parts)
+        receiver_index = np.concatenate(receiver_parts)
+        
+        sender_amounts = senders.amounts[sender_index]
+        receiver_amounts = receivers.amounts[receiver_index]
+        differences = np.abs(sender_amounts - receiver_amounts) / np.maximum(sender_amounts, receiver_amounts)
+        same_currency = senders.currencies[sender_index] == receivers.currencies[receiver_index]
+        raw_gap = np.abs(senders.raw_amounts[sender_index] - receivers.raw_amounts[receiver_index])
+        keep = np.flatnonzero(
+            (differences <= self.tolerance)
+            & (senders.banks[sender_index] != receivers.banks[receiver_index])
+            & (~same_currency | (raw_gap < SAME_CURRENCY_TOLERANCE))
+        )
+        sender_index = sender_index[keep]
+        receiver_index = receiver_index[keep]
+        differences = differences[keep]
+        days_apart = np.abs((sender_keys[sender_index] & DAY_MASK) - (receiver_keys[receiver_index] & DAY_MASK))
+        
+        # Same order as sorting (sender, difference, days, receiver) tuples, but
+        # on two integer keys: a float lexsort costs more than the rest combined
+        by_difference = np.argsort(differences)
+        ordered = differences[by_difference]
+        rank = np.empty(len(differences), dtype=np.int64)
+        rank[by_difference] = np.cumsum(np.concatenate(([0], ordered[1:] != ordered[:-1])))
+        order = np.argsort((days_apart << 32) | receiver_index)
+        order = order[np.argsort(((sender_index << 32) | rank)[order], kind='stable')]
+        # Receivers are walked in Python, the rest is only gathered for the chosen pairs
+        return (sender_index[order], differences[order],
+                days_apart[order], receiver_index[order].tolist())
+    
+    def pair(self, outgoing: Union[Iterable[Transaction], TransactionBatch],
+             incoming: Union[Iterable[Transaction], TransactionBatch]) -> List[TransferPair]:
+        """
+        Pair outgoing (negative) and incoming (positive) transactions
+        
+        Args:
+            outgoing: Candidate sending sides, rows with a non-negative amount are ignored
+            incoming: Candidate receiving sides, rows with a non-positive amount are ignored
+        
+        Returns:
+            Pairs in the date order of their outgoing side, the two sides
+            of a pair are always at different banks. Rows of a batch are
+            TransactionRow views
+        """
+        bank_codes: Dict[Optional[str], int] = {}
+        currency_codes: Dict[str, int] = {}
+        receivers = self._side(incoming, True, bank_codes, currency_codes)
+        senders = self._side(outgoing, False, bank_codes, currency_codes)
+        if not len(receivers) or not len(senders):
+            return []
+        
+        # Receivers by (amount bucket, day) for the range searches, senders
+        # by date so a lower index claims first; both sorts are stable
+        receivers = receivers.reorder(_stable_order(receivers.keys))
+        senders = senders.reorder(_stable_order(senders.dates))
+        
+        if np is not None:
+            sender_column, differences, days_apart, receiver_column = self._candidates_vectorized(senders, receivers)
+        else:
+            candidates = self._candidates(senders, receivers)
+            candidates.sort()
+            sender_column, differences, days_apart, receiver_column = zip(*candidates) if candidates else ((),) * 4
+        
+        # Candidates are grouped by sender, best first: a sender takes its
+        # first receiver that no earlier sender took
+        bounds = _group_starts(sender_column) + [len(receiver_column)]
+        used = bytearray(len(receivers))
+        chosen = []
+        for start, end in zip(bounds, bounds[1:]):
+            for candidate in range(start, end):
+                receiver = receiver_column[candidate]
+                if not used[receiver]:
+                    used[receiver] = 1
+                    chosen.append(candidate)
+                    break
+        
+        outgoing = senders.rows(_gather(sender_column, chosen))
+        incoming = receivers.rows([receiver_column[candidate] for candidate in chosen])
+        return [
+            TransferPair(sent, received, days, difference)
+            for sent, received, days, difference in zip(
+                outgoing, incoming, _gather(days_apart, chosen), _gather(differences, chosen))
+        ]
+
+
+def tag_transfers(pairs: Iterable[TransferPair], store=None) -> None:
+    """
+    Mark both sides of every pair as an internal transfer
+    
+    Only rows in the pairer's categories are paired, so this replaces no
+    purchase, fee or other real category. Pass the TransactionStore the
+    rows live in, if any, so its zone maps learn the new category, or
+    the TransactionBatch the pairs were found in.
+    """
+    for pair in pairs:
+        for trans in (pair.outgoing, pair.incoming):
+            if store is not None:
+                store.set_category(trans, INTERNAL_TRANSFER)
+            else:
+                trans.category = INTERNAL_TRANSFER
+
+
+def pair_transfers(transactions: Union[Iterable[Transaction], TransactionBatch],
+                   pairer: Optional[TransferPairer] = None) -> List[TransferPair]:
+    """Pair the transfers within a multi-bank history (list, TransactionStore or TransactionBatch) and tag them"""
+    pairer = pairer or TransferPairer()
+    store = transactions if hasattr(transactions, 'set_category') else None
+    if not isinstance(transactions, TransactionBatch):
+        transactions = list(transactions)
+    pairs = pairer.pair(transactions, transactions)
+    tag_transfers(pairs, store)
+    return pairs
@@ -0,0 +1,245 @@
+"""Asyncio pipeline uploading parsed transactions to Supabase (PostgREST)"""
+import asyncio
+import json
+import logging
+import urllib.error
+import urllib.request
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, Dict, Iterable, List, Optional, Union
+
+from base_parser import Transaction
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+MAX_BATCH_DELAY = 1.0  # Seconds a partial batch may wait for more rows
+MAX_IN_FLIGHT = 4
+MAX_RETRIES = 3
+RETRY_DELAY = 0.5  # Doubled after every failed attempt
+
+# HTTP statuses worth retrying, anything else in 4xx won't get better
+RETRYABLE_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+_END = object()
+
+
+class UploadError(Exception):
+    """A batch was rejected by the sink"""
+    
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def transaction_to_row(trans: Transaction, user_id: str) -> Dict[str, Any]:
+    """Map a transaction onto a row of the transactions table, owned by user_id"""
+    return {
+        'user_id': user_id,
+        'date': trans.date.date().isoformat(),
+        'merchant': (trans.merchant or trans.description or '')[:200],
+        'description': trans.description,
+        'amount': round(trans.amount, 2),
+        'bank': trans.bank,
+        'hash': trans.hash,
+    }
+
+
+class PostgrestSink:
+    """
+    Upserts rows into a PostgREST table with plain urllib requests
+    
+    Rows are posted with on_conflict=user_id,hash (the non-deferrable
+    transactions_user_hash_unique constraint) and merge-duplicates
+    resolution, so re-uploading a statement updates the existing rows. Requests run in
+    a worker thread to keep the event loop free.
+    """
+    
+    def __init__(self, base_url: str, api_key: Optional[str] = None,
+                 table: str = 'transactions', timeout: float = 30.0):
+        self.url = f"{base_url.rstrip('/')}/rest/v1/{table}?on_conflict=user_id,hash"
+        self.timeout = timeout
+        self.headers = {
+            'Content-Type': 'application/json',
+            'Prefer': 'resolution=merge-duplicates,return=minimal',
+        }
+        if api_key:
+            self.headers['apikey'] = api_key
+            self.headers['Authorization'] = f"Bearer {api_key}"
+    
+    async def upsert(self, rows: List[Dict[str, Any]]) -> None:
+        await asyncio.to_thread(self._post, json.dumps(rows, ensure_ascii=False).encode('utf-8'))
+    
+    def _post(self, body: bytes) -> None:
+        request = urllib.request.Request(self.url, data=body, headers=self.headers, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode('utf-8', errors='replace')[:200]
+            raise UploadError(f"HTTP {e.code}: {detail}", retryable=e.code in RETRYABLE_STATUSES)
+        except (urllib.error.URLError, OSError) as e:
+            raise UploadError(str(e))
+
+
+@dataclass
+class UploadStats:
+    """Counters of an upload run"""
+    rows: int = 0
+    batches: int = 0
+    retries: int = 0
+    failed_batches: int = 0
+    failed_rows: int = 0
+
+
+class UploadPipeline:
+    """
+    Batches transactions and upserts them with bounded concurrency
+    
+    Transactions go through a bounded queue into batches that are closed
+    when they reach batch_size rows or max_delay seconds after their first
+    row. At most max_in_flight batches are sent at once. When the sink
+    falls behind, the batcher waits for a free slot, the queue fills up
+    and the producer stops pulling from the parser until there is room.
+    Failed batches are retried with exponential backoff and counted as
+    failed once the retries are used up, without stopping the upload.
+    """
+    
+    def __init__(self, sink, user_id: str,
+                 batch_size: int = BATCH_SIZE,
+                 max_delay: float = MAX_BATCH_DELAY,
+                 max_in_flight: int = MAX_IN_FLIGHT,
+                 max_retries: int = MAX_RETRIES,
+                 retry_delay: float = RETRY_DELAY):
+        if not user_id:
+            raise ValueError("user_id is required, transactions.user_id is NOT NULL")
+        self.sink = sink
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+    
+    async def run(self, transactions: Union[Iterable[Transaction], AsyncIterable[Transaction]]) -> UploadStats:
+        """
+        Upload transactions, for example the output of ParserFactory.iter_statement
+        
+        Args:
+            transactions: Iterable (parsed in a worker thread) or async
+                iterable of transactions
+        
+        Returns:
+            UploadStats of the run
+        """
+        stats = UploadStats()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.batch_size * self.max_in_flight)
+        producer = asyncio.create_task(self._produce(transactions, queue))
+        try:
+            await self._consume(queue, stats)
+        except BaseException:
+            producer.cancel()
+            raise
+        # Re-raises errors of the parser
+        await producer
+        return stats
+    
+    async def _produce(self, transactions, queue: asyncio.Queue) -> None:
+        try:
+            await self._feed(transactions, queue)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await queue.put(_END)
+            raise
+        await queue.put(_END)
+    
+    async def _feed(self, transactions, queue: asyncio.Queue) -> None:
+        if hasattr(transactions, '__aiter__'):
+            async for trans in transactions:
+                await queue.put(trans)
+            return
+        
+        iterator = iter(transactions)
+        while True:
+            # Parse a chunk off the event loop, then wait for room
+            chunk = await asyncio.to_thread(_take, iterator, self.batch_size)
+            for trans in chunk:
+                await queue.put(trans)
+            if len(chunk) < self.batch_size:
+                return
+    
+    async def _consume(self, queue: asyncio.Queue, stats: UploadStats) -> None:
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.max_in_flight)
+        in_flight = set()
+        done = False
+        
+        def release(task: asyncio.Task) -> None:
+            in_flight.discard(task)
+            slots.release()
+        
+        while not done:
+            batch: Dict[str, Dict[str, Any]] = {}
+            rows: List[Dict[str, Any]] = []
+            deadline = None
+            
+            while len(batch) + len(rows) < self.batch_size:
+                timeout = None if deadline is None else max(deadline - loop.time(), 0)
+                try:
+                    trans = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if trans is _END:
+                    done = True
+                    break
+                if deadline is None:
+                    deadline = loop.time() + self.max_delay
+                
+                row = transaction_to_row(trans, self.user_id)
+                if row['hash'] is None:
+                    rows.append(row)
+                else:
+                    # A hash may appear only once per upsert statement
+                    batch.pop(row['hash'], None)
+                    batch[row['hash']] = row
+            
+            rows.extend(batch.values())
+            if not rows:
+                continue
+            
+            # Backpressure: wait for a free request slot before batching on
+            await slots.acquire()
+            task = asyncio.create_task(self._send(rows, stats))
+            in_flight.add(task)
+            task.add_done_callback(release)
+        
+        if in_flight:
+            await asyncio.gather(*in_flight)
+    
+    async def _send(self, rows: List[Dict[str, Any]], stats: UploadStats) -> None:
+        delay = self.retry_delay
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.sink.upsert(rows)
+                stats.batches += 1
+                stats.rows += len(rows)
+                return
+            except Exception as e:
+                if not getattr(e, 'retryable', True) or attempt == self.max_retries:
+                    logger.warning("Upload of %d transactions failed: %s", len(rows), e)
+                    break
+            stats.retries += 1
+            await asyncio.sleep(delay)
+            delay *= 2
+        
+        stats.failed_batches += 1
+        stats.failed_rows += len(rows)
+
+
+def _take(iterator, count: int) -> List[Transaction]:
+    chunk = []
+    for trans in iterator:
+        chunk.append(trans)
+        if len(chunk) == count:
+            break
+    return chunk
@@ -0,0 +1,61 @@
+"""Bounded task submission to process pools"""
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, wait
+from typing import Callable, Dict, Iterable, Iterator, Tuple
+
+
+# Tasks in flight per worker process, past the earliest unfinished one
+TASKS_PER_WORKER = 2
+
+
+def submit_bounded(pool: Executor,
+                   function: Callable,
+                   tasks: Iterable[tuple],
+                   workers: int,
+                   in_order: bool = False) -> Iterator[Tuple[int, Future]]:
+    """
+    Run function(*task) in pool for every task, submitting them as workers free up
+    
+    Unlike Executor.map, which submits every task up front, never more
+    than TASKS_PER_WORKER tasks per worker are submitted past the earliest
+    one not yet yielded, so a slow task holds back a bounded number of
+    finished ones. tasks is only read as far as that.
+    
+    Args:
+        pool: Executor to submit to
+        function: Task function, must be picklable for a process pool
+        tasks: Argument tuples, one per task
+        workers: Number of workers of the pool
+        in_order: Yield in task order instead of completion order
+    
+    Yields:
+        (task index, finished future)
+    """
+    window = workers * TASKS_PER_WORKER
+    tasks = iter(tasks)
+    pending: Dict[Future, int] = {}
+    finished: Dict[int, Future] = {}  # Done ahead of next_out, with in_order
+    next_index = 0  # Next task to submit
+    next_out = 0  # Next task to yield, with in_order
+    exhausted = False
+    while True:
+        earliest = next_out if in_order else min(pending.values(), default=next_index)
+        while not exhausted and next_index < earliest + window:
+            task = next(tasks, None)
+            if task is None:
+                exhausted = True
+                break
+            pending[pool.submit(function, *task)] = next_index
+            next_index += 1
+        if not pending:
+            return
+        
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in sorted(done, key=pending.get):
+            index = pending.pop(future)
+            if in_order:
+                finished[index] = future
+            else:
+                yield index, future
+        while next_out in finished:
+            yield next_out, finished.pop(next_out)
+            next_out += 1
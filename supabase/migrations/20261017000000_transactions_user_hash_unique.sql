@@ -0,0 +1,10 @@
+-- Unique transaction hash per user, usable as an upsert arbiter
+--
+-- transactions_hash_unique was DEFERRABLE INITIALLY DEFERRED, which Postgres
+-- rejects as an ON CONFLICT arbiter, so PostgREST upserts with
+-- on_conflict=hash failed. Hashes are only unique within a user's history.
+
+ALTER TABLE transactions DROP CONSTRAINT IF EXISTS transactions_hash_unique;
+
+ALTER TABLE transactions
+    ADD CONSTRAINT transactions_user_hash_unique UNIQUE(user_id, hash);
@@ -46,7 +46,8 @@ CREATE TABLE IF NOT EXISTS transactions (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     
-    CONSTRAINT transactions_hash_unique UNIQUE(hash) DEFERRABLE INITIALLY DEFERRED
+    -- Not deferrable: upserts use it as the ON CONFLICT arbiter
+    CONSTRAINT transactions_user_hash_unique UNIQUE(user_id, hash)
 );
 
 -- File Uploads table
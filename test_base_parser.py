@@ -0,0 +1,482 @@
+"""Tests for the shared transaction model and BaseParser helpers"""
+
+import random
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent / 'parsers'))
+
+from base_parser import BaseParser, Transaction, TransactionHistory, TransactionIndex, merchant_cache_info
+from category_matcher import CategoryMatcher
+from columnar_file import load_batch, load_transactions, save_transactions
+from converters import AmountConverter, DateConverter
+from transaction_batch import TransactionBatch
+from transaction_store import TransactionStore
+from transfer_pairing import INTERNAL_TRANSFER, TransferPairer, pair_transfers
+import summary_engine
+import transfer_pairing
+
+
+class DummyParser(BaseParser):
+    """Minimal concrete parser for exercising BaseParser helpers"""
+    
+    def __init__(self):
+        super().__init__("Test Bank")
+    
+    def iter_parse(self, file_path, encoding=None):
+        return iter([])
+    
+    def validate_format(self, file_path):
+        return False
+
+
+def make_history(count=400, seed=7):
+    """Build a noisy history with exact and near duplicates"""
+    rng = random.Random(seed)
+    words = ['LIDL', 'TESCO', 'SPAR', 'MOL', 'BUDAPEST', 'KARTYA', 'VASARLAS', 'ATM']
+    transactions = []
+    
+    for _ in range(count):
+        date = datetime(2024, 1, 1) + timedelta(days=rng.randint(0, 12), hours=rng.choice([0, 0, 6, 23]))
+        amount = rng.choice([-1500.0, -1500.004, -1499.996, -250.0, 1200.0])
+        description = ' '.join(rng.sample(words, rng.randint(1, 4)))
+        transactions.append(Transaction(date=date, description=description, amount=amount))
+    
+    transactions += transactions[:25]
+    rng.shuffle(transactions)
+    return transactions
+
+
+def naive_duplicates(transactions):
+    """Reference all-pairs implementation of detect_duplicates"""
+    duplicates = []
+    seen = set()
+    for i, trans in enumerate(transactions):
+        if trans.hash not in seen:
+            seen.add(trans.hash)
+            matches = [other for other in transactions[i + 1:] if trans.matches(other)]
+            if matches:
+                duplicates.append([trans] + matches)
+    return duplicates
+
+
+def test_detect_duplicates_matches_pairwise_scan():
+    transactions = make_history()
+    
+    expected = naive_duplicates(transactions)
+    found = DummyParser().detect_duplicates(transactions)
+    
+    assert [[id(t) for t in group] for group in found] == [[id(t) for t in group] for group in expected]
+    assert found
+
+
+def naive_merge(existing, new):
+    """Reference list-scanning implementation of merge_statements"""
+    existing_hashes = {t.hash for t in existing}
+    merged = existing.copy()
+    for trans in new:
+        if trans.hash not in existing_hashes and not any(trans.matches(e) for e in existing):
+            merged.append(trans)
+    merged.sort(key=lambda t: t.date)
+    return merged
+
+
+def test_grouped_buckets_find_the_same_duplicates(monkeypatch):
+    monkeypatch.setattr(TransactionIndex, 'GROUP_BUCKET_SIZE', 2)
+    rng = random.Random(11)
+    vocab = ['kartyas', 'vasarlas', 'LIDL', 'lidl', 'TESCO', 'BUDAPEST', '0177', 'MOL', 'ATM', 'dij']
+    transactions = [
+        Transaction(date=datetime(2024, 1, 1) + timedelta(days=rng.randint(0, 3), hours=rng.choice([0, 23])),
+                    description=' '.join(rng.choices(vocab, k=rng.randint(0, 9))),
+                    amount=rng.choice([-164.0, -164.004, 2500.0]))
+        for _ in range(600)
+    ]
+    
+    expected = naive_duplicates(transactions)
+    found = DummyParser().detect_duplicates(transactions)
+    
+    assert [[id(t) for t in group] for group in found] == [[id(t) for t in group] for group in expected]
+
+
+def test_merge_statements_matches_list_scan():
+    parser = DummyParser()
+    history = make_history(200, seed=1)
+    expected = list(history)
+    merged = history
+    
+    for seed in range(2, 6):
+        new = make_history(60, seed=seed) + expected[:5]
+        expected = naive_merge(expected, new)
+        merged = parser.merge_statements(merged, new)
+        assert [id(t) for t in merged] == [id(t) for t in expected]
+    
+    assert len(history) == 225
+
+
+def test_merge_statements_copies_lists_and_reuses_histories():
+    parser = DummyParser()
+    first = parser.merge_statements([], make_history(50, seed=1))
+    second = parser.merge_statements(first, make_history(10, seed=2))
+    assert second is not first and len(first) < len(second)
+    
+    # Edits to a returned list are seen by the next merge
+    tesco = Transaction(date=datetime(2024, 2, 1), description="TESCO", amount=-990.0)
+    second[0] = tesco
+    assert len(parser.merge_statements(second, [tesco])) == len(second)
+    
+    existing, new = make_history(50, seed=1), make_history(10, seed=3)
+    history = TransactionHistory(existing)
+    merged = parser.merge_statements(history, new)
+    assert merged is history.transactions
+    assert [id(t) for t in merged] == [id(t) for t in naive_merge(existing, new)]
+    assert parser.merge_statements(history, merged[:5]) is merged
+    assert len(merged) == len(naive_merge(existing, new))
+
+
+def test_transaction_store_merges_like_a_list():
+    parser = DummyParser()
+    history = make_history(200, seed=1)
+    expected = list(history)
+    store = TransactionStore(history, block_size=16)
+    
+    for seed in range(2, 6):
+        new = make_history(60, seed=seed) + expected[:5]
+        expected = naive_merge(expected, new)
+        assert parser.merge_statements(store, new) is store
+        assert [id(t) for t in store] == [id(t) for t in expected]
+    
+    assert store.block_count > len(store) // 32
+    assert [id(store[i]) for i in (0, 100, -1)] == [id(expected[i]) for i in (0, 100, -1)]
+    assert parser.get_date_range(store) == parser.get_date_range(expected)
+    assert parser.get_summary(store) == parser.get_summary(expected)
+
+
+def test_transaction_store_select_skips_blocks():
+    from instrumentation import PipelineStats
+    
+    transactions = make_history(300, seed=4)
+    for trans in transactions[:10]:
+        trans.category = 'Fuel'
+    for trans in transactions[10:15]:
+        trans.bank = 'Revolut'
+    store = TransactionStore(transactions, block_size=8)
+    store.stats = PipelineStats()
+    start, end = datetime(2024, 1, 3), datetime(2024, 1, 9)
+    
+    assert store.between(start, end) == [t for t in store if start <= t.date < end]
+    assert store.select(min_amount=0) == [t for t in store if t.amount >= 0]
+    assert store.select(start, end, max_amount=-1000, merchant='LIDL') == [
+        t for t in store if start <= t.date < end and t.amount <= -1000 and t.merchant == 'LIDL'
+    ]
+    
+    assert store.select(category='Fuel') == [t for t in store if t.category == 'Fuel']
+    assert store.select(bank='Revolut') == [t for t in store if t.bank == 'Revolut']
+    
+    # Rows re-categorized through the store are found in blocks that had no Fuel
+    for trans in transactions[100:110]:
+        store.set_category(trans, 'Fuel')
+    store.set_merchant(transactions[200], 'CORNER SHOP')
+    fuel = store.select(category='Fuel')
+    assert len(fuel) >= 20 and fuel == [t for t in store if t.category == 'Fuel']
+    assert store.select(merchant='CORNER SHOP') == [transactions[200]]
+    
+    # Categorizers update the store through set_category
+    CategoryMatcher([('TESCO', 'Groceries')], default=None).categorize(store)
+    assert store.select(category='Groceries') == [t for t in store if t.category == 'Groceries'] != []
+    
+    # Rows changed directly need the zone maps dropped
+    transactions[250].category = 'Fuel'
+    store.invalidate_zones()
+    assert store.select(category='Fuel') == [t for t in store if t.category == 'Fuel']
+    
+    store.stats.reset()
+    assert store.select(min_amount=1000) == [t for t in store if t.amount >= 1000]
+    assert store.select(category='Travel') == []
+    blocks = store.stats.snapshot()['stages']['store_blocks']
+    assert blocks['rejected'] > store.block_count and blocks['rows_in'] == 2 * store.block_count
+
+
+def test_transaction_index_lookup():
+    first = Transaction(date=datetime(2024, 3, 1), description="LIDL ARUHAZ BUDAPEST", amount=-2500.0)
+    index = TransactionIndex([first])
+    
+    near = Transaction(date=datetime(2024, 3, 2), description="LIDL ARUHAZ BUDAPEST", amount=-2500.0)
+    far = Transaction(date=datetime(2024, 3, 5), description="LIDL ARUHAZ BUDAPEST", amount=-2500.0)
+    
+    assert index.find_match(near) is first
+    assert index.contains(near)
+    assert not index.contains(far)
+
+
+def test_description_fingerprints_are_scoped_to_an_index(monkeypatch):
+    monkeypatch.setattr(TransactionIndex, 'GROUP_BUCKET_SIZE', 1)
+    day = datetime(2024, 3, 1)
+    TransactionIndex([Transaction(date=day, description=f"CARD PAYMENT SHOP {i}", amount=-100.0) for i in range(5)])
+    
+    index = TransactionIndex([Transaction(date=day, description="COFFEE BAR", amount=-100.0) for _ in range(3)])
+    
+    # Words of the first index are not interned by the second
+    assert index.fingerprints.token_ids == {'coffee': 0, 'bar': 1}
+    assert index.contains(Transaction(date=day, description="coffee bar", amount=-100.0))
+
+
+def test_merchant_is_extracted_lazily_and_memoized():
+    description = "SPAR MARKET 1234 BUDAPEST lazy-merchant-test"
+    before = merchant_cache_info()
+    
+    first = Transaction(date=datetime(2024, 3, 1), description=description, amount=-990.0)
+    second = Transaction(date=datetime(2024, 3, 2), description=description, amount=-990.0)
+    explicit = Transaction(date=datetime(2024, 3, 2), description=description, amount=-990.0, merchant="Spar Hungary")
+    
+    assert merchant_cache_info().misses == before.misses
+    assert first.merchant == "SPAR"
+    assert second.merchant == "SPAR"
+    assert explicit.merchant == "Spar Hungary"
+    
+    after = merchant_cache_info()
+    assert after.misses == before.misses + 1
+    assert after.hits == before.hits + 1
+
+
+def test_transaction_batch_round_trip():
+    transactions = make_history(100)
+    transactions.append(Transaction(date=datetime(2024, 2, 1, 13, 45), description="ATM", amount=0.1 + 0.2,
+                                    balance=12.5, category="Cash", bank="OTP Bank", hash="custom-hash"))
+    
+    batch = TransactionBatch.from_transactions(transactions)
+    restored = batch.to_transactions()
+    
+    assert restored == transactions
+    assert not batch.amounts_in_cents
+    assert batch[-1].date == datetime(2024, 2, 1, 13, 45)
+    assert batch[0].hash == transactions[0].hash
+
+
+@pytest.mark.parametrize('compression', [None, 'zlib'])
+def test_columnar_file_round_trip(tmp_path, compression):
+    transactions = make_history(100)
+    for index, trans in enumerate(transactions[:10]):
+        trans.raw_data = {'Dátum': trans.date.strftime('%Y.%m.%d'), 'Sor': str(index)}
+    # csv.DictReader puts surplus cells under the None key
+    transactions[0].raw_data[None] = ['extra']
+    transactions.append(Transaction(date=datetime(2024, 2, 1, 13, 45), description="ATM", amount=0.1 + 0.2,
+                                    balance=12.5, category="Cash", bank="OTP Bank", hash="custom-hash"))
+    path = str(tmp_path / 'history.txc')
+    
+    save_transactions(transactions, path, compression=compression)
+    restored = load_transactions(path)
+    
+    assert restored == transactions
+    assert [t.raw_data for t in restored] == [t.raw_data for t in transactions]
+    
+    # Only the columns that are used get decoded
+    batch = load_batch(path)
+    assert len(batch) == len(transactions)
+    assert batch.amount_at(len(batch) - 1) == 0.1 + 0.2
+    assert 'descriptions' not in vars(batch) and 'raw_data' not in vars(batch)
+    assert batch[3].description == transactions[3].description
+    batch.close()
+
+
+def test_mapped_columns_are_views_until_appended(tmp_path):
+    transactions = make_history(50)
+    path = str(tmp_path / 'history.txc')
+    save_transactions(transactions, path)
+    
+    batch = load_batch(path)
+    assert isinstance(batch.amounts, memoryview) and isinstance(batch.categories.codes, memoryview)
+    assert summary_engine.summarize(batch) == summary_engine.summarize(transactions)
+    
+    extra = Transaction(date=datetime(2024, 3, 1), description="LATE", amount=-99.0, bank="OTP Bank")
+    batch.append(extra)
+    assert not isinstance(batch.amounts, memoryview)
+    assert batch.to_transactions() == transactions + [extra]
+    batch.close()
+    
+    # Closing copies the loaded columns out of the map
+    batch = load_batch(path)
+    amounts = list(batch.amounts)
+    batch.close()
+    assert list(batch.amounts) == amounts
+
+
+def test_duplicates_detected_on_batch_rows():
+    transactions = make_history(150, seed=3)
+    batch = TransactionBatch.from_transactions(transactions)
+    
+    on_list = DummyParser().detect_duplicates(transactions)
+    on_batch = DummyParser().detect_duplicates(list(batch))
+    
+    assert [[t.hash for t in group] for group in on_batch] == [[t.hash for t in group] for group in on_list]
+
+
+def test_summary_engine_batch_matches_single_pass(monkeypatch):
+    transactions = [
+        Transaction(date=datetime(2024, 1, 31), description="LIDL", amount=-2500.0, bank="OTP Bank", category="Food"),
+        Transaction(date=datetime(2024, 2, 1, 9, 30), description="SALARY", amount=450000.0, bank="OTP Bank"),
+        Transaction(date=datetime(2024, 2, 3), description="Spotify", amount=-10.99, currency="EUR", bank="Revolut"),
+        Transaction(date=datetime(2023, 12, 24), description="Gift", amount=-15000.0, bank="OTP Bank", category="Gifts"),
+    ]
+    batch = TransactionBatch.from_transactions(transactions)
+    
+    single_pass = summary_engine.summarize(transactions, bank="OTP Bank")
+    vectorized = summary_engine.summarize(batch, bank="OTP Bank")
+    monkeypatch.setattr(summary_engine, 'np', None)
+    fallback = summary_engine.summarize(batch, bank="OTP Bank")
+    
+    assert single_pass == fallback
+    for key in ('total_transactions', 'total_income', 'total_expense', 'net_flow'):
+        assert vectorized[key] == pytest.approx(single_pass[key])
+    for key in ('date_range', 'by_bank', 'by_currency', 'by_category', 'by_month'):
+        assert vectorized[key].keys() == single_pass[key].keys()
+    assert vectorized['date_range'] == single_pass['date_range']
+    assert vectorized['total_expense'] == 17510.99
+    assert single_pass['total_income'] == 450000.0
+    assert single_pass['date_range'] == {'start': '2023-12-24T00:00:00', 'end': '2024-02-03T00:00:00'}
+    assert list(single_pass['by_month']) == ['2023-12', '2024-01', '2024-02']
+    assert single_pass['by_bank']['Revolut'] == {'count': 1, 'income': 0.0, 'expense': 10.99, 'net': -10.99}
+
+
+def test_transfers_pair_across_banks_and_leave_totals(monkeypatch):
+    def history():
+        return [
+            Transaction(date=datetime(2024, 1, 5), description="Revolut**9442*", amount=-40000.0, bank="OTP"),
+            Transaction(date=datetime(2024, 1, 6), description="Top-Up by *9442", amount=100.0,
+                        currency="EUR", category="Transfer In", bank="Revolut"),
+            # Same amount at the same bank is not a transfer
+            Transaction(date=datetime(2024, 1, 6), description="REFUND", amount=40000.0, bank="OTP"),
+            # Only one outgoing side for the two top-ups
+            Transaction(date=datetime(2024, 1, 7), description="Top-Up by *9442", amount=100.0,
+                        currency="EUR", category="Transfer In", bank="Revolut"),
+            Transaction(date=datetime(2024, 1, 8), description="LIDL", amount=-5000.0, bank="OTP"),
+            # A refund is income of the right size, but not a transfer
+            Transaction(date=datetime(2024, 1, 9), description="LIDL", amount=12.66,
+                        currency="EUR", category="Refund", bank="Revolut"),
+        ]
+    
+    pairer = TransferPairer(rates={'EUR': 395.0})
+    transactions = history()
+    pairs = pair_transfers(transactions, pairer)
+    
+    assert [(pair.outgoing.description, pair.incoming.date.day, pair.days_apart) for pair in pairs] == [
+        ("Revolut**9442*", 6, 1)
+    ]
+    assert [trans.category for trans in transactions] == [
+        INTERNAL_TRANSFER, INTERNAL_TRANSFER, None, "Transfer In", None, "Refund"
+    ]
+    
+    summary = summary_engine.summarize_transactions(transactions)
+    vectorized = summary_engine.summarize_batch(TransactionBatch.from_transactions(transactions))
+    for result in (summary, vectorized):
+        assert result['total_transactions'] == 6
+        assert result['internal_transfers'] == 2
+        assert result['total_income'] == pytest.approx(40112.66)
+        assert result['total_expense'] == pytest.approx(5000.0)
+        assert result['by_category'][INTERNAL_TRANSFER]['net'] == 0.0
+    
+    # Read from the columns of a batch and tagged in it
+    batch = TransactionBatch.from_transactions(history())
+    batch_pairs = pair_transfers(batch, pairer)
+    assert [(pair.outgoing.index, pair.incoming.index, pair.days_apart) for pair in batch_pairs] == [(0, 1, 1)]
+    assert [trans.category for trans in batch] == [trans.category for trans in transactions]
+    
+    monkeypatch.setattr(transfer_pairing, 'np', None)
+    fallback = history()
+    assert len(pair_transfers(fallback, pairer)) == 1
+    assert [trans.category for trans in fallback] == [trans.category for trans in transactions]
+
+
+@pytest.mark.parametrize('vectorized', [True, False])
+def test_transfers_pair_up_to_exactly_the_tolerance(monkeypatch, vectorized):
+    if not vectorized:
+        monkeypatch.setattr(transfer_pairing, 'np', None)
+    pairer = TransferPairer(rates={'EUR': 1.0, 'USD': 1.0}, base_currency='EUR', tolerance=0.02)
+    
+    def pairs(sent, received):
+        outgoing = Transaction(date=datetime(2024, 1, 5), description="OUT", amount=-sent,
+                               currency="EUR", bank="OTP")
+        incoming = Transaction(date=datetime(2024, 1, 5), description="IN", amount=received,
+                               currency="USD", bank="Revolut")
+        return len(pairer.pair([outgoing], [incoming]))
+    
+    # Two log buckets apart with buckets only 1 + tolerance wide
+    assert pairs(10.5573, 10.3465) == 1
+    assert pairs(100.0, 98.0) == 1 and pairs(98.0, 100.0) == 1
+    assert pairs(100.0, 97.99) == 0 and pairs(97.99, 100.0) == 0
+
+
+def test_get_summary_counts_duplicates_on_request():
+    transactions = make_history(80, seed=5)
+    parser = DummyParser()
+    
+    summary = parser.get_summary(transactions)
+    with_duplicates = parser.get_summary(TransactionBatch.from_transactions(transactions), include_duplicates=True)
+    
+    assert 'duplicates_found' not in summary
+    assert with_duplicates['duplicates_found'] == len(naive_duplicates(transactions))
+    assert with_duplicates['total_transactions'] == summary['total_transactions'] == len(transactions)
+
+
+def test_category_matcher_categorizes_batch_by_merchant():
+    matcher = CategoryMatcher([('LIDL', 'Food'), ('SHELL', 'Fuel')], default='Other')
+    matcher.add_rule('LID', 'Generic', priority=-1)
+    transactions = [
+        Transaction(date=datetime(2024, 1, 1), description="LIDL 0177 BUDAPEST", amount=-100.0),
+        Transaction(date=datetime(2024, 1, 2), description="SHELL 12 BUDAPEST", amount=-200.0),
+        Transaction(date=datetime(2024, 1, 3), description="LIDL 0177 BUDAPEST", amount=-300.0, category="Kept"),
+        Transaction(date=datetime(2024, 1, 4), description="POSTA 1 BUDAPEST", amount=-400.0),
+    ]
+    batch = TransactionBatch.from_transactions(transactions)
+    
+    assert matcher.categorize(batch) == ['Food', 'Fuel', 'Kept', 'Other']
+    assert batch[1].category == 'Fuel'
+    assert matcher.categorize(transactions, overwrite=True) == ['Food', 'Fuel', 'Food', 'Other']
+    assert transactions[2].category == 'Food'
+
+
+def test_category_matcher_falls_back_to_description_on_both_paths():
+    matcher = CategoryMatcher([('LIDL', 'Food'), ('SHELL', 'Fuel')], default='Other')
+    transactions = [
+        Transaction(date=datetime(2024, 1, 1), description="LIDL 0177 BUDAPEST", amount=-100.0),
+        Transaction(date=datetime(2024, 1, 2), description="SHELL 12 BUDAPEST", amount=-200.0),
+        Transaction(date=datetime(2024, 1, 3), description="POSTA 1 BUDAPEST", amount=-300.0),
+    ]
+    # Rows whose merchant was cleared are matched on the description
+    transactions[0].merchant = None
+    transactions[1].merchant = ''
+    batch = TransactionBatch.from_transactions(transactions)
+    
+    assert matcher.categorize(batch) == matcher.categorize(transactions) == ['Food', 'Fuel', 'Other']
+
+
+def test_date_converter_locks_format_and_memoizes():
+    converter = DateConverter(['%Y.%m.%d', '%d.%m.%Y'])
+    
+    assert converter('28.07.2025') == datetime(2025, 7, 28)
+    assert converter.format == '%d.%m.%Y'
+    assert converter('2025.07.29') == datetime(2025, 7, 29)
+    assert converter('28.07.2025') == datetime(2025, 7, 28)
+    assert converter('Könyvelve: 2025/7/30') == datetime(2025, 7, 30)
+    assert converter('31.02.2025') is None
+    assert converter.cache_info().hits == 1
+
+
+def test_amount_converter_detects_number_style():
+    hungarian = AmountConverter('hu')
+    assert hungarian('1.234,56') == 1234.56
+    assert hungarian('-1 234 567 Ft') == -1234567
+    assert hungarian('1.234') == 1234
+    assert hungarian('12,5') == 12.5
+    
+    # A dot decimal value makes ambiguous values dot decimal as well
+    dotted = AmountConverter('hu')
+    assert dotted('1234.56') == 1234.56
+    assert dotted('1.234') == 1.234
+    
+    english = AmountConverter('en')
+    assert english('1,234.56') == 1234.56
+    assert english('(1,234)') == -1234
+    assert english('garbage') == 0.0
@@ -1,6 +1,8 @@
 """Test script for OTP parser with real PDF content"""
 
 import re
+from datetime import datetime
+import parsers.otp_parser_enhanced as otp_enhanced
 from parsers.otp_parser_enhanced import OTPPDFParser
 
 # Real content from the PDF
@@ -117,6 +119,121 @@ def test_enhanced_parser():
     for t in transactions:
         print(f"  {t.booking_date}: {t.merchant} - {t.amount} HUF ({t.category})")
 
+def test_category_rules_take_priority():
+    """User category rules outrank the built-in mapping"""
+    
+    parser = OTPPDFParser()
+    assert parser._suggest_category("LIDL") == '🍔 Élelmiszer'
+    assert parser._suggest_category("Google Play") == '📱 Alkalmazások'
+    assert parser._suggest_category("ismeretlen bolt") == '📌 Egyéb'
+    
+    parser.load_category_rules([
+        {'merchant_pattern': 'lidl', 'category': 'Bevásárlás', 'priority': 0, 'created_at': '2025-01-01'},
+        {'merchant_pattern': 'lidl', 'category': 'Lidl only', 'priority': 5, 'created_at': '2024-01-01'},
+        {'merchant_pattern': 'bolt', 'category': 'Régi bolt', 'end_date': '2024-12-31'},
+    ])
+    
+    assert parser._suggest_category("LIDL") == 'Lidl only'
+    assert parser.category_matcher.match("ismeretlen bolt", when=datetime(2024, 6, 1)) == 'Régi bolt'
+    assert parser.category_matcher.match("ismeretlen bolt", when=datetime(2025, 6, 1)) == '📌 Egyéb'
+
+def test_lexer_consumes_continuation_lines():
+    """EUR rows adjust the card record above them, memo lines are skipped"""
+    
+    content = """FORGALMAK
+25.08.20 25.08.20 VÁSÁRLÁS KÁRTYÁVAL, 8460878289, 0000001, Tranzakció: 25.08.19, SPAR MARKET -GOOGLE -1.000
+12,50EUR 3, -4.500
+25.08.21 25.08.21 NAPKÖZBENI ÁTUTALÁS, F.3504, 13100007, MUNKABER, 448.599
+25/07MunkaberSALARY07, 131000070251142000043484,
+25.08.22 25.08.22 OTPdirekt HAVIDÍJ* -164
+ZÁRÓ EGYENLEG 6.065.300
+25.08.23 25.08.23 OTPdirekt HAVIDÍJ* -164"""
+    
+    parser = OTPPDFParser()
+    transactions = parser.parse_pdf_content(content)
+    
+    assert [t.booking_date for t in transactions] == ['2025-08-20', '2025-08-21', '2025-08-22']
+    assert transactions[0].amount == -4500
+    assert transactions[0].card_number == '8460878289'
+    assert transactions[1].card_number is None
+    assert transactions[2].description == 'OTPdirekt HAVIDÍJ*'
+
+def test_pages_parse_every_section_across_page_breaks():
+    """Records are stitched over page breaks and all sections are read, in or out of a pool"""
+    
+    pages = [
+        """FORGALMAK
+KÖNYVELÉS/ÉRTÉKNAP MEGNEVEZÉS ÖSSZEG
+25.07.28 25.07.28 VÁSÁRLÁS KÁRTYÁVAL, 8460878289, 0000001, Tranzakció: 25.07.24, GOOGLE *Google Play Ap -GOOGLE -2.714
+1/2 LAP/LAP""",
+        """OTP Bank Nyrt. Bankszámlakivonat
+11773016-12345678
+6,800EUR 0, -2.800
+25.07.30 25.07.30 OTPdirekt HAVIDÍJ* -164
+ZÁRÓ EGYENLEG 100.000""",
+        """FORGALMAK
+25.08.15 25.08.15 ÉRTÉKPAPÍR SZLADÍJ -500
+ZÁRÓ EGYENLEG 99.000""",
+    ]
+    
+    parser = OTPPDFParser()
+    transactions = list(parser.parse_pages(pages, workers=1))
+    
+    assert [(t.booking_date, t.amount) for t in transactions] == [
+        ('2025-07-28', -2800), ('2025-07-30', -164), ('2025-08-15', -500)
+    ]
+    assert transactions[0].merchant == 'Google Play'
+    assert [t.description for t in parser.parse_pages(pages, workers=2, pages_per_task=1)] == [
+        t.description for t in transactions
+    ]
+    # The single-blob parser still stops at the first page footer
+    assert len(parser.parse_pdf_content('\n'.join(pages))) == 1
+
+def test_pdf_pages_are_split_into_tasks_and_read_in_process(monkeypatch):
+    """Short statements are parsed without a pool, opening the PDF once"""
+    
+    texts = ["FORGALMAK"] + [f"25.08.{day:02d} 25.08.{day:02d} OTPdirekt HAVIDÍJ* -{day}" for day in range(1, 10)]
+    opened = []
+    
+    class StubPage:
+        def __init__(self, text):
+            self.text = text
+        
+        def extract_text(self):
+            return self.text
+    
+    class StubReader:
+        def __init__(self, file_path):
+            opened.append(file_path)
+            self.pages = [StubPage(text) for text in texts]
+    
+    def no_pool(*args, **kwargs):
+        raise AssertionError("pool started for a short statement")
+    
+    monkeypatch.setattr(otp_enhanced, 'pypdf', type('pypdf', (), {'PdfReader': StubReader}))
+    monkeypatch.setattr(otp_enhanced, '_classify_in_pool', no_pool)
+    parser = OTPPDFParser()
+    tasks = []
+    classify_pages = parser._classify_pages
+    monkeypatch.setattr(parser, '_classify_pages', lambda task, pdf_pages=None: tasks.append(task) or classify_pages(task, pdf_pages))
+    
+    transactions = list(parser.parse_pdf('statement.pdf', pages_per_task=4))
+    
+    assert opened == ['statement.pdf']
+    assert tasks == [(0, 4), (4, 8), (8, 10)]
+    assert [t.amount for t in transactions] == [-day for day in range(1, 10)]
+    assert [t.amount for t in parser.parse_pages(texts, pages_per_task=4)] == [t.amount for t in transactions]
+    
+    # Long statements go to a pool, whose workers open the PDF themselves
+    pooled = []
+    monkeypatch.setattr(otp_enhanced, 'POOL_MIN_PAGES', 8)
+    monkeypatch.setattr(otp_enhanced.os, 'cpu_count', lambda: 4)
+    monkeypatch.setattr(otp_enhanced, '_classify_in_pool',
+                        lambda tasks, workers, file_path=None: pooled.append((list(tasks), file_path)) or iter(()))
+    assert list(parser.parse_pdf('statement.pdf', pages_per_task=4)) == []
+    assert pooled == [([(0, 4), (4, 8), (8, 10)], 'statement.pdf')]
+    assert opened == ['statement.pdf'] * 2
+
 if __name__ == "__main__":
     test_regex_patterns()
     test_simple_parser()
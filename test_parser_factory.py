@@ -0,0 +1,413 @@
+"""Tests for ParserFactory and the CSV statement parsers"""
+
+import logging
+import sys
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent / 'parsers'))
+
+from encoding_sniffer import sniff_bytes, sniff_encoding
+import parser_factory
+from parser_factory import ParserFactory
+from worker_pool import TASKS_PER_WORKER, submit_bounded
+
+
+OTP_CSV = """Dátum;Közlemény;Összeg;Egyenleg
+2025.07.28;Kártyás vásárlás: LIDL ÁRUHÁZ 0177 BUDAPEST;-9472;6055828
+2025.08.04;OTPdirekt havidíj;-164;6055664
+2025.08.07;Átutalás: COGNIZANT TECHNOLOGY SOLUTIONS;448599;6504263
+"""
+
+REVOLUT_CSV = """Type,Product,Started Date,Completed Date,Description,Amount,Fee,Currency,State,Balance
+TOPUP,Current,2025-08-18 10:01:02,2025-08-18 10:01:05,Top-up by *9442,253.14,0.00,EUR,COMPLETED,300.00
+CARD_PAYMENT,Current,2025-08-19 12:00:00,2025-08-19 12:00:01,Spotify,-10.99,0.00,EUR,COMPLETED,289.01
+CARD_PAYMENT,Current,2025-08-20 12:00:00,,Pending shop,-5.00,0.00,EUR,PENDING,
+"""
+
+
+def write_statement(tmp_path, name, content, encoding='utf-8'):
+    path = tmp_path / name
+    path.write_bytes(content.encode(encoding))
+    return str(path)
+
+
+def test_iter_statement_streams_same_rows_as_parse(tmp_path):
+    factory = ParserFactory()
+    path = write_statement(tmp_path, 'otp.csv', OTP_CSV, 'windows-1250')
+    
+    streamed = list(factory.iter_statement(path))
+    parsed = factory.get_parser(path).parse(path)
+    
+    assert [t.hash for t in streamed] == [t.hash for t in parsed]
+    assert [t.amount for t in streamed] == [-9472.0, -164.0, 448599.0]
+    assert streamed[0].description == 'LIDL ÁRUHÁZ 0177 BUDAPEST'
+
+
+def test_revolut_statement_skips_pending_rows(tmp_path):
+    factory = ParserFactory()
+    path = write_statement(tmp_path, 'revolut.csv', REVOLUT_CSV)
+    
+    transactions = factory.parse_statement(path)
+    
+    assert factory.get_parser(path).bank_name == 'Revolut'
+    assert [t.amount for t in transactions] == [253.14, -10.99]
+    assert transactions[0].category == 'Transfer In'
+    
+    # A comma-looking value doesn't switch the column to Hungarian decimals
+    lines = REVOLUT_CSV.splitlines()
+    lines[1] = lines[1].replace(',253.14,', ',"12,5",')
+    lines[2] = lines[2].replace(',-10.99,', ',"-1,250",')
+    path = write_statement(tmp_path, 'revolut-grouped.csv', '\n'.join(lines) + '\n')
+    assert [t.amount for t in factory.parse_statement(path)] == [12.5, -1250.0]
+
+
+def test_sniff_encoding_detects_statement_codecs(tmp_path):
+    cp1250 = write_statement(tmp_path, 'cp1250.csv', OTP_CSV + 'Őrség Šped\n', 'windows-1250')
+    utf8 = write_statement(tmp_path, 'utf8.csv', OTP_CSV, 'utf-8')
+    latin2 = write_statement(tmp_path, 'latin2.csv', 'Dátum;Közlemény\nŚląsk ąś źĄ;1\n', 'iso-8859-2')
+    
+    assert sniff_encoding(cp1250) == 'windows-1250'
+    assert sniff_encoding(utf8) == 'utf-8-sig'
+    assert sniff_encoding(latin2) == 'iso-8859-2'
+    assert sniff_bytes(b'plain ascii header') is None
+    # A multi-byte character cut off at the end of a prefix is still UTF-8
+    assert sniff_bytes('Dátum'.encode('utf-8')[:2], complete=False) == 'utf-8-sig'
+
+
+def test_otp_parser_decodes_windows_1250_once(tmp_path, monkeypatch):
+    path = write_statement(tmp_path, 'otp.csv', OTP_CSV, 'windows-1250')
+    parser = ParserFactory().get_parser(path)
+    opened = []
+    real_open = open
+    
+    def tracking_open(file, mode='r', *args, **kwargs):
+        opened.append((mode, kwargs.get('encoding')))
+        return real_open(file, mode, *args, **kwargs)
+    
+    monkeypatch.setitem(parser.iter_parse.__globals__, 'open', tracking_open)
+    transactions = parser.parse(path)
+    
+    assert len(transactions) == 3
+    assert opened == [('r', 'windows-1250')]
+
+
+def test_detection_reads_each_file_once(tmp_path, monkeypatch):
+    import format_probe
+    factory = ParserFactory()
+    otp = write_statement(tmp_path, 'otp.csv', OTP_CSV, 'windows-1250')
+    revolut = write_statement(tmp_path, 'revolut.csv', REVOLUT_CSV)
+    opened = []
+    real_open = open
+    
+    def tracking_open(file, mode='r', *args, **kwargs):
+        opened.append(Path(file).name)
+        return real_open(file, mode, *args, **kwargs)
+    
+    monkeypatch.setitem(format_probe.__dict__, 'open', tracking_open)
+    
+    assert factory.detect(otp) == (factory.parsers[0], 'windows-1250')
+    assert factory.detect(revolut) == (factory.parsers[1], 'utf-8-sig')
+    assert factory.get_parser(otp).bank_name == 'OTP Bank'
+    assert factory.detect(str(tmp_path / 'statement.pdf')) == (None, None)
+    assert opened == ['otp.csv', 'revolut.csv']
+    
+    # A changed file is detected again
+    write_statement(tmp_path, 'otp.csv', REVOLUT_CSV + '\n')
+    assert factory.get_parser(otp).bank_name == 'Revolut'
+    assert opened == ['otp.csv', 'revolut.csv', 'otp.csv']
+
+
+def test_parse_many_matches_serial_merge(tmp_path):
+    paths = [
+        write_statement(tmp_path, 'otp.csv', OTP_CSV, 'windows-1250'),
+        write_statement(tmp_path, 'revolut.csv', REVOLUT_CSV),
+        write_statement(tmp_path, 'unknown.csv', 'foo,bar\n1,2\n'),
+        write_statement(tmp_path, 'otp-copy.txt', OTP_CSV + '2025.08.09;Új sor;-1;0\n'),
+    ]
+    
+    serial = []
+    factory = ParserFactory()
+    for path in paths:
+        serial = factory.merge_statements(serial, path) or serial
+    
+    merged, errors = ParserFactory().parse_many(paths, workers=2)
+    
+    assert [t.hash for t in merged] == [t.hash for t in serial]
+    assert len(merged) == 6
+    assert errors == {paths[2]: 'No suitable parser found'}
+
+
+def test_otp_decode_error_midway_is_not_a_truncated_success(tmp_path):
+    from diagnostics import READ_ERROR
+    from otp_parser import OTPParser
+    
+    # UTF-8 in the sniffed prefix, a Windows-1250 byte far past it
+    rows = [f"2025.08.{day % 28 + 1:02d};Kávé {index};-{index + 1};0" for index, day in enumerate(range(3000))]
+    content = ('datum;kozlemeny;osszeg;egyenleg\n' + '\n'.join(rows[:2500]) + '\n').encode('utf-8')
+    content += '2025.08.01;Caf\u00e9 bad byte;-5;0\n'.encode('windows-1250')
+    content += ('\n'.join(rows[2500:]) + '\n').encode('utf-8')
+    path = tmp_path / 'otp.csv'
+    path.write_bytes(content)
+    
+    parser = OTPParser()
+    streamed = []
+    with pytest.raises(UnicodeDecodeError):
+        for trans in parser.iter_parse(str(path)):
+            streamed.append(trans)
+    assert 0 < len(streamed) < 3001
+    assert parser.diagnostics.counts[READ_ERROR] == 1
+    
+    # parse() re-reads the whole file in the next encoding
+    transactions = parser.parse(str(path))
+    assert len(transactions) == 3001
+    assert transactions[2500].description.startswith('Café')
+    assert [d.kind for d in parser.diagnostics.samples] == [READ_ERROR]
+
+
+def test_iter_many_keeps_a_window_past_a_slow_file(tmp_path, monkeypatch):
+    submitted = []
+    held = []
+    
+    class HeldPool:
+        """Runs tasks when submitted, except the first file's, held until the test releases it"""
+        
+        def __init__(self, max_workers, initializer, initargs):
+            initializer(*initargs)
+        
+        def submit(self, fn, file_path, index):
+            submitted.append(index)
+            future = Future()
+            if index == 0:
+                held.append((future, lambda: fn(file_path, index)))
+            else:
+                future.set_result(fn(file_path, index))
+            return future
+        
+        def shutdown(self, cancel_futures=False):
+            pass
+    
+    monkeypatch.setattr(parser_factory, 'ProcessPoolExecutor', HeldPool)
+    monkeypatch.setattr(parser_factory, '_worker_factory', None)
+    paths = [write_statement(tmp_path, f'otp-{i}.csv', OTP_CSV) for i in range(8)]
+    
+    order = []
+    for result in ParserFactory().iter_many(paths, workers=2):
+        order.append(result.index)
+        if len(order) == 3:
+            # Two workers, two files each: nothing past file 3 while file 0 runs
+            assert submitted == [0, 1, 2, 3]
+            future, run = held.pop()
+            future.set_result(run())
+    
+    assert order == [1, 2, 3, 0, 4, 5, 6, 7]
+    assert submitted == list(range(8))
+
+
+def test_submit_bounded_in_task_order_reads_tasks_lazily():
+    from concurrent.futures import ThreadPoolExecutor
+    
+    read = []
+    
+    def tasks():
+        for index in range(12):
+            read.append(index)
+            yield (index,)
+    
+    def run(index):
+        # Every third task finishes last among its neighbours
+        time.sleep(0.02 if index % 3 == 0 else 0)
+        return index
+    
+    window = 2 * TASKS_PER_WORKER
+    results = []
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        for index, future in submit_bounded(pool, run, tasks(), workers=2, in_order=True):
+            assert len(read) <= index + window
+            results.append(future.result())
+    
+    assert results == list(range(12))
+
+
+def test_parse_cache_returns_identical_transactions(tmp_path):
+    from parse_cache import ParseCache
+    cache = ParseCache(str(tmp_path / 'cache'))
+    factory = ParserFactory(cache=cache)
+    path = write_statement(tmp_path, 'otp.csv', OTP_CSV, 'windows-1250')
+    copy = write_statement(tmp_path, 'otp-copy.csv', OTP_CSV, 'windows-1250')
+    
+    parsed = factory.parse_statement(path)
+    cached = factory.parse_statement(copy)
+    
+    assert cache.stats.hits == 1 and cache.stats.misses == 1
+    assert cache.stats.hit_rate == 0.5
+    fields = ('date', 'description', 'amount', 'currency', 'balance', 'category', 'merchant',
+              'transaction_type', 'bank', 'account_number', 'raw_data', 'hash')
+    assert [[getattr(t, name) for name in fields] for t in cached] == \
+        [[getattr(t, name) for name in fields] for t in parsed]
+    
+    # A new parser version doesn't see old entries
+    parser = factory.get_parser(path)
+    parser.VERSION += 1
+    assert cache.get(cache.key(path, parser)) is None
+    
+    # Least recently used entries are evicted to stay under the bound
+    small = ParseCache(str(tmp_path / 'small'), max_bytes=cache.size + 10)
+    small.put('a', parsed)
+    small.put('b', parsed)
+    assert small.stats.evictions == 1
+    assert small.get('a') is None and small.get('b') is not None
+    
+    # Also when another process (here another instance) stored entries meanwhile
+    shared = ParseCache(str(tmp_path / 'shared'), max_bytes=2 * cache.size + 10)
+    other = ParseCache(shared.directory, max_bytes=shared.max_bytes)
+    other.put('a', parsed)
+    other.put('b', parsed)
+    shared.put('c', parsed)
+    assert [shared.get(key) is not None for key in 'abc'] == [False, True, True]
+
+
+def test_parse_cache_write_failure_keeps_parse_result(tmp_path, monkeypatch):
+    import parse_cache
+    from diagnostics import CACHE_ERROR
+    
+    def fail(transactions, path):
+        raise OSError("disk full")
+    
+    monkeypatch.setattr(parse_cache, 'save_transactions', fail)
+    factory = ParserFactory(cache=parse_cache.ParseCache(str(tmp_path / 'cache')))
+    path = write_statement(tmp_path, 'otp.csv', OTP_CSV, 'windows-1250')
+    
+    transactions = factory.parse_statement(path)
+    
+    assert transactions and len(transactions) == len(ParserFactory().parse_statement(path))
+    assert factory.diagnostics.counts == {CACHE_ERROR: 1}
+    assert 'disk full' in factory.diagnostics.samples[0].message
+
+
+def test_otp_alternative_format_scanned_on_bytes(tmp_path):
+    from otp_parser import OTPParser
+    content = (
+        "OTP Bank számlakivonat\r\n"
+        "Könyvelés\tMegnevezés\tÖsszeg\r\n"
+        "\r\n"
+        "2025.07.28\tKártyás vásárlás: LIDL ÁRUHÁZ\t-9472\t6055828\r\n"
+        "2025.08.04   OTPdirekt havidíj  -164\xa0\r"
+        "2025.08.05\tNulla összeg\t0\n"
+        "\xa02025.08.07  Átutalás: COGNIZANT \xa0 448599  6504263\n"
+    )
+    parser = OTPParser()
+    
+    for encoding in ('windows-1250', 'iso-8859-2', 'utf-8-sig'):
+        path = write_statement(tmp_path, 'otp.txt', content, encoding)
+        transactions = list(parser._iter_alternative_format(path, encoding))
+        
+        assert [t.description for t in transactions] == ['LIDL ÁRUHÁZ', 'OTPdirekt havidíj', 'COGNIZANT']
+        assert [t.amount for t in transactions] == [-9472.0, -164.0, 448599.0]
+        assert [t.balance for t in transactions] == [6055828.0, None, 6504263.0]
+
+
+def test_generated_statements_parse_in_every_format(tmp_path):
+    sys.path.insert(0, str(Path(__file__).parent / 'benchmarks'))
+    from statement_generator import FORMATS, GeneratorConfig, generate_rows, generate_statement
+    
+    config = GeneratorConfig(rows=500, duplicate_rate=0.1)
+    rows = generate_rows(config)
+    assert rows == generate_rows(config)
+    
+    factory = ParserFactory()
+    for statement_format in FORMATS:
+        if statement_format == 'otp_pdf_text':
+            continue
+        path = str(generate_statement(str(tmp_path), statement_format, config, rows))
+        transactions = factory.parse_statement(path)
+        
+        assert len(transactions) == len(rows)
+        assert transactions[0].date == rows[0].date
+
+
+def test_instrumentation_counts_stages_and_caches(tmp_path, caplog):
+    from instrumentation import PipelineStats
+    
+    # The statement summary (and its duplicate scan) only runs when logged
+    caplog.set_level(logging.INFO, logger='parser_factory')
+    spans = []
+    stats = PipelineStats(hooks=[lambda name, span: spans.append(name)])
+    factory = ParserFactory(stats=stats)
+    otp = write_statement(tmp_path, 'otp.csv', OTP_CSV + 'nem dátum;Hibás sor;1;1\n', 'windows-1250')
+    revolut = write_statement(tmp_path, 'revolut.csv', REVOLUT_CSV)
+    
+    factory.parse_statement(otp)
+    factory.parse_statement(otp)
+    merged, errors = factory.parse_many([otp, revolut], workers=2)
+    
+    snapshot = stats.snapshot()
+    decode = snapshot['stages']['decode']
+    assert (decode['rows_in'], decode['rows_out'], decode['rejected']) == (3 * 4 + 3, 3 * 3 + 2, 3 + 1)
+    assert snapshot['stages']['parse']['calls'] == 4
+    assert snapshot['stages']['merge']['rows_out'] == len(merged) == 5
+    assert snapshot['caches']['detection']['hits'] == 1
+    assert {'detect', 'parse', 'decode', 'dedupe', 'merge'} <= set(spans)
+
+
+def test_diagnostics_count_and_sample_bad_rows(tmp_path, capsys):
+    reported = []
+    factory = ParserFactory(diagnostics_hook=reported.append)
+    bad_rows = ''.join(f"nem dátum {i};Hibás sor;1;1\n" for i in range(50))
+    path = write_statement(tmp_path, 'otp.csv', OTP_CSV + bad_rows, 'windows-1250')
+    
+    transactions = factory.parse_statement(path)
+    
+    diagnostics = factory.diagnostics
+    assert len(transactions) == 3
+    assert dict(diagnostics.counts) == {'invalid_date': 50}
+    assert len(diagnostics.samples) == len(reported) == diagnostics.max_samples
+    assert [d.line for d in diagnostics.samples[:2]] == [5, 6]
+    assert diagnostics.samples[0].source == path
+    assert capsys.readouterr().out == ''
+    
+    assert factory.parse_statement(str(tmp_path / 'missing.txt')) is None
+    assert dict(factory.diagnostics.counts) == {'no_parser': 1}
+
+
+def test_otp_rows_with_extra_cells_are_decoded_and_reported(tmp_path):
+    factory = ParserFactory()
+    path = write_statement(tmp_path, 'otp.csv', OTP_CSV + "2025.08.09;SPAR;-1200;6503063;megjegyzés;x\n",
+                           'windows-1250')
+    
+    transactions = factory.parse_statement(path)
+    
+    assert len(transactions) == 4
+    extra = transactions[-1]
+    assert (extra.description, extra.amount, extra.balance) == ('SPAR', -1200.0, 6503063.0)
+    assert extra.raw_data[None] == ['megjegyzés', 'x']
+    assert dict(factory.diagnostics.counts) == {'extra_cells': 1}
+    assert factory.diagnostics.samples[0].line == 5
+
+
+def test_diagnostics_survive_an_early_stop_or_a_parse_error(tmp_path, monkeypatch):
+    from diagnostics import READ_ERROR
+    
+    factory = ParserFactory()
+    lines = OTP_CSV.splitlines(keepends=True)
+    bad_rows = ''.join(f"nem dátum {i};Hibás sor;1;1\n" for i in range(3))
+    path = write_statement(tmp_path, 'otp.csv', lines[0] + bad_rows + ''.join(lines[1:]), 'windows-1250')
+    
+    stream = factory.iter_statement(path)
+    assert next(stream).amount == -9472.0
+    stream.close()
+    assert dict(factory.diagnostics.counts) == {'invalid_date': 3}
+    
+    def failing_rows(self, file_path, encoding=None):
+        self._start_diagnostics(file_path).report(READ_ERROR, "Read failed")
+        yield from ()
+        raise OSError("Read failed")
+    
+    parser = factory.get_parser(path)
+    monkeypatch.setattr(type(parser), 'iter_parse', failing_rows)
+    with pytest.raises(OSError):
+        factory.parse_batch(path)
+    assert dict(factory.diagnostics.counts) == {READ_ERROR: 1}
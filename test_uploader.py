@@ -0,0 +1,121 @@
+"""Tests for the asyncio upload pipeline against a local PostgREST stand-in"""
+
+import asyncio
+import json
+import sys
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent / 'parsers'))
+
+from base_parser import Transaction
+from uploader import PostgrestSink, UploadPipeline
+
+
+class FakePostgrest(BaseHTTPRequestHandler):
+    """Upserts posted rows by hash, failing the first request with 503"""
+    
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        server.requests.append((self.path, self.headers['Prefer'], len(body)))
+        
+        if len(server.requests) == 1:
+            self.send_response(503)
+            self.end_headers()
+            return
+        
+        for row in body:
+            server.table[row['hash']] = row
+        self.send_response(201)
+        self.end_headers()
+    
+    def log_message(self, *args):
+        pass
+
+
+def make_transactions(count):
+    start = datetime(2025, 1, 1)
+    return [
+        Transaction(date=start + timedelta(days=i % 60), description=f"SHOP {i % 7}", amount=-(i + 1), bank="OTP Bank")
+        for i in range(count)
+    ]
+
+
+def test_pipeline_upserts_all_rows_with_retry():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakePostgrest)
+    server.requests = []
+    server.table = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    
+    try:
+        sink = PostgrestSink(f"http://127.0.0.1:{server.server_port}", api_key='test')
+        pipeline = UploadPipeline(sink, user_id='user-1', batch_size=40, max_in_flight=2, retry_delay=0.01)
+        transactions = make_transactions(250)
+        # The repeated rows land in the first batch, which upserts each hash once
+        stats = asyncio.run(pipeline.run(transactions[:5] + transactions))
+    finally:
+        server.shutdown()
+    
+    assert stats.rows == 250
+    assert sum(size for _, _, size in server.requests[1:]) == 250
+    assert stats.failed_batches == 0
+    assert stats.retries == 1
+    assert set(server.table) == {t.hash for t in transactions}
+    assert all(row['user_id'] == 'user-1' for row in server.table.values())
+    assert all(size <= 40 for _, _, size in server.requests)
+    path, prefer, _ = server.requests[0]
+    assert path == '/rest/v1/transactions?on_conflict=user_id,hash'
+    assert 'resolution=merge-duplicates' in prefer
+
+
+def test_pipeline_applies_backpressure():
+    class BlockedSink:
+        """Holds every upsert until the test opens the gate"""
+        
+        def __init__(self):
+            self.active = self.peak = self.rows = 0
+            self.gate = asyncio.Event()
+        
+        async def upsert(self, rows):
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            await self.gate.wait()
+            self.rows += len(rows)
+            self.active -= 1
+    
+    pulled = []
+    
+    async def produce():
+        for trans in make_transactions(200):
+            pulled.append(trans)
+            yield trans
+    
+    async def run():
+        task = asyncio.create_task(pipeline.run(produce()))
+        # Everything runs on the loop, so after enough turns the producer
+        # has pulled all it can while both requests are held
+        for _ in range(1000):
+            await asyncio.sleep(0)
+        assert sink.active == 2
+        # Queue (2 batches) + batch waiting for a slot + in-flight batches
+        assert len(pulled) <= 10 * 5 + 1
+        sink.gate.set()
+        return await task
+    
+    sink = BlockedSink()
+    pipeline = UploadPipeline(sink, user_id='user-1', batch_size=10, max_in_flight=2)
+    
+    stats = asyncio.run(run())
+    assert sink.rows == 200 and stats.batches == 20
+    assert sink.peak == 2
+
+
+def test_pipeline_requires_a_user():
+    # transactions.user_id is NOT NULL, rows without it would all be rejected
+    with pytest.raises(ValueError):
+        UploadPipeline(PostgrestSink('http://127.0.0.1'), user_id=None)